@@ -0,0 +1,225 @@
+"""Write-behind history of task changes, stored in task_activity.
+
+The write queries return a jsonb snapshot of the task's ACTIVITY_FIELDS
+before and/or after the change (see activity_snapshot in task_queries.py),
+so a route builds the {field: [before, after]} diff from rows it already
+has. Once its transaction commits it hands the events to this process's
+ActivityWriter: a bounded in-memory queue drained by a background thread
+that inserts them in multi-row batches on its own connection. A task write
+costs the request no extra statement.
+
+What writing behind means:
+
+* History trails the change by up to ACTIVITY_FLUSH_INTERVAL seconds.
+* When the writer falls behind and the queue (ACTIVITY_QUEUE_SIZE) is full,
+  requests wait up to ACTIVITY_ENQUEUE_TIMEOUT for room, which slows
+  writers down to the rate the log can be written at. Events that still do
+  not fit are dropped and counted in
+  task_activity_events_total{outcome="dropped"}.
+* Queued events are flushed when the process exits (atexit, and gunicorn's
+  worker_exit hook); a worker that is killed outright loses them.
+"""
+import asyncio
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from metrics import record_activity_events
+from task_queries import ACTIVITY_FIELDS
+
+FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', '1'))
+BATCH_SIZE = int(os.environ.get('ACTIVITY_BATCH_SIZE', '500'))
+QUEUE_SIZE = int(os.environ.get('ACTIVITY_QUEUE_SIZE', '10000'))
+ENQUEUE_TIMEOUT = float(os.environ.get('ACTIVITY_ENQUEUE_TIMEOUT', '1'))
+WRITE_ATTEMPTS = 3
+
+INSERT_ACTIVITY_SQL = 'INSERT INTO task_activity (task_id, user_id, action, changes, created_at) VALUES %s'
+
+_STOP = object()
+
+
+def task_changes(previous, current):
+    """{field: [before, after]} for the tracked fields that differ"""
+    previous, current = previous or {}, current or {}
+    return {
+        field: [previous.get(field), current.get(field)]
+        for field in ACTIVITY_FIELDS
+        if previous.get(field) != current.get(field)
+    }
+
+
+def task_activity(user_id, action, tasks):
+    """Activity events for rows returned by a task write.
+
+    Pops the rows' `previous`/`current` snapshots, so the rows can be
+    returned to the client as they are. Updates that left every tracked
+    field as it was are not logged.
+    """
+    at = datetime.now(timezone.utc)
+    events = []
+    for task in tasks:
+        changes = task_changes(task.pop('previous', None), task.pop('current', None))
+        if changes or action != 'updated':
+            events.append((task['id'], user_id, action, json.dumps(changes), at))
+    return events
+
+
+class ActivityWriter(threading.Thread):
+    """Background thread that inserts queued activity events in batches.
+
+    Waits up to `flush_interval` after the first event of a batch for more
+    to arrive, then writes up to `batch_size` of them in one INSERT. Uses
+    its own connection, so it never competes with requests for the pool.
+    """
+
+    def __init__(self, dsn, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        super().__init__(name='activity-writer', daemon=True)
+        self.dsn = dsn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(queue_size)
+        self._conn = None
+
+    def record(self, events, timeout=ENQUEUE_TIMEOUT):
+        """Queue events, waiting up to `timeout` in all for room in the queue"""
+        deadline = None
+        for index, event in enumerate(events):
+            try:
+                self._queue.put_nowait(event)
+                continue
+            except queue.Full:
+                pass
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+                record_activity_events('delayed', len(events) - index)
+            try:
+                self._queue.put(event, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                dropped = len(events) - index
+                record_activity_events('queued', index)
+                record_activity_events('dropped', dropped)
+                print(f"Task activity queue full, dropped {dropped} events")
+                return
+        record_activity_events('queued', len(events))
+
+    async def record_async(self, events):
+        """record() for coroutines; only waits for room off the event loop"""
+        for index, event in enumerate(events):
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                record_activity_events('queued', index)
+                await asyncio.to_thread(self.record, events[index:])
+                return
+        record_activity_events('queued', len(events))
+
+    def close(self, timeout=10.0):
+        """Write everything queued so far and stop the thread"""
+        if not self.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self.join(timeout)
+
+    def stats(self):
+        return {'queued': self._queue.qsize()}
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            stopping = batch[-1] is _STOP
+            if stopping:
+                batch.pop()
+            if batch:
+                self._write(batch)
+            if stopping:
+                self._disconnect()
+                return
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, events):
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                if self._conn is None:
+                    self._conn = psycopg2.connect(self.dsn)
+                with self._conn, self._conn.cursor() as cur:
+                    execute_values(cur, INSERT_ACTIVITY_SQL, events, page_size=self.batch_size)
+                record_activity_events('written', len(events))
+                return
+            except (psycopg2.Error, OSError) as e:
+                print(f"Task activity write failed (attempt {attempt} of {WRITE_ATTEMPTS}): {e}")
+                self._disconnect()
+                if attempt < WRITE_ATTEMPTS:
+                    time.sleep(2 ** attempt)
+        record_activity_events('dropped', len(events))
+
+    def _disconnect(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+
+# --- Process-wide writer ---
+# Like the listener, one per worker process and started on first use
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_activity_writer():
+    global _writer, _writer_pid
+    pid = os.getpid()
+    with _writer_lock:
+        if _writer is None or _writer_pid != pid:
+            _writer = ActivityWriter(os.environ.get('DATABASE_URL'))
+            _writer_pid = pid
+            _writer.start()
+    return _writer
+
+
+def log_activity(events):
+    """Queue events from a committed write"""
+    if events:
+        get_activity_writer().record(events)
+
+
+async def log_activity_async(events):
+    if events:
+        await get_activity_writer().record_async(events)
+
+
+def activity_stats():
+    if _writer is None or _writer_pid != os.getpid():
+        return None
+    return _writer.stats()
+
+
+def flush_activity():
+    """Write out this process's queued events; called on shutdown"""
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.close()
+
+
+atexit.register(flush_activity)
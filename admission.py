@@ -0,0 +1,232 @@
+"""Admission control for the /api/ routes.
+
+Two checks run before a handler gets near the database:
+
+* Per-user token buckets, one per (user, endpoint). A user can make
+  `burst` requests at once and then `rate` per second; past that they get
+  429 with a Retry-After for when the next request would be allowed.
+* A concurrency limit. At most ADMISSION_MAX_CONCURRENT requests per
+  worker process run at once (by default the connection pool size). Up to
+  ADMISSION_MAX_QUEUE more wait for a slot; a request that would wait
+  longer than ADMISSION_QUEUE_TIMEOUT, or finds the queue full, is shed
+  with 503 instead of piling up on the pool.
+
+Limits are kept per worker process, like the connection pool, so a user's
+effective rate is up to `rate` times the number of workers.
+
+Rate limits are `rate/burst` specs, e.g. `2/10`, or `off`.
+RATE_LIMIT_DEFAULT applies to every endpoint not listed in RATE_LIMITS,
+which overrides the built-in per-endpoint limits below, e.g.
+`RATE_LIMITS=get_tasks=5/20,export_tasks=off`. RATE_LIMITS_ENABLED=false
+turns the buckets off entirely (the load tests in bench/ do this, since
+their few users make far more requests than any person would).
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+from metrics import record_admission
+
+RateLimit = namedtuple('RateLimit', ['rate', 'burst'])
+
+
+class RateLimited(Exception):
+    """The user has used up their requests to this endpoint for now"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Rate limited, retry in {retry_after:.1f}s')
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """No concurrency slot became free within the queue timeout"""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many requests in progress')
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+def parse_rate_limit(spec):
+    """RateLimit for a `rate/burst` spec (burst defaults to rate), or None for `off`"""
+    spec = spec.strip().lower()
+    if spec in ('off', '0', ''):
+        return None
+    rate, _, burst = spec.partition('/')
+    rate = float(rate)
+    burst = int(burst) if burst else max(1, math.ceil(rate))
+    if rate <= 0 or burst < 1:
+        raise ValueError(f'Invalid rate limit: {spec!r}')
+    return RateLimit(rate, burst)
+
+
+def parse_rate_limits(spec):
+    """{endpoint: RateLimit or None} from `endpoint=rate/burst,...`"""
+    limits = {}
+    for item in spec.split(','):
+        if item.strip():
+            endpoint, _, limit = item.partition('=')
+            limits[endpoint.strip()] = parse_rate_limit(limit)
+    return limits
+
+
+# Generous enough for any person clicking around; a client polling in a
+# tight loop runs out within seconds. Heavier endpoints get less.
+RATE_LIMITS = {
+    'get_weekly_report': RateLimit(2, 10),
+    'get_bootstrap': RateLimit(2, 10),
+    'export_tasks': RateLimit(0.5, 3),
+    'import_tasks': RateLimit(0.5, 3),
+    'stream_task_events': RateLimit(0.5, 5),
+}
+RATE_LIMITS.update(parse_rate_limits(os.environ.get('RATE_LIMITS', '')))
+DEFAULT_RATE_LIMIT = parse_rate_limit(os.environ.get('RATE_LIMIT_DEFAULT', '10/30'))
+RATE_LIMITS_ENABLED = os.environ.get('RATE_LIMITS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', os.environ.get('DB_POOL_MAX_SIZE', '10')))
+MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', str(MAX_CONCURRENT * 4)))
+QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '2'))
+
+# Long-lived event streams hold no database connection, so they would only
+# starve the other requests of slots
+UNLIMITED_CONCURRENCY = {'stream_task_events'}
+
+
+class TokenBuckets:
+    """Thread-safe token buckets, created on first use and dropped once full again"""
+
+    PRUNE_INTERVAL = 60
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated_at, full_at)
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def take(self, key, limit):
+        """Take a token for `key`; returns 0, or the seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (limit.burst, now, now))
+            tokens = min(limit.burst, tokens + (now - updated_at) * limit.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / limit.rate
+            self._buckets[key] = (tokens, now, now + (limit.burst - tokens) / limit.rate)
+
+            if now - self._pruned_at > self.PRUNE_INTERVAL:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+                self._pruned_at = now
+        return wait
+
+
+class ConcurrencyLimiter:
+    """Bounded number of in-flight requests, with a bounded, timed queue"""
+
+    def __init__(self, limit, max_queue, timeout):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._active = 0
+        self._waiting = 0
+        self._lock = threading.Condition()
+
+    def acquire(self, endpoint):
+        """Take a slot, waiting up to `timeout`; raises Overloaded instead"""
+        started = time.monotonic()
+        with self._lock:
+            if self._active < self.limit:
+                self._active += 1
+                record_admission(endpoint, 'admitted')
+                return
+            if self._waiting >= self.max_queue:
+                record_admission(endpoint, 'shed')
+                raise Overloaded(self.timeout)
+
+            self._waiting += 1
+            try:
+                deadline = started + self.timeout
+                while self._active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        record_admission(endpoint, 'shed', time.monotonic() - started)
+                        raise Overloaded(self.timeout)
+                    self._lock.wait(remaining)
+                self._active += 1
+            finally:
+                self._waiting -= 1
+        record_admission(endpoint, 'queued', time.monotonic() - started)
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            self._lock.notify()
+
+    def stats(self):
+        return {
+            'active': self._active,
+            'waiting': self._waiting,
+            'max_concurrent': self.limit,
+            'max_queue': self.max_queue,
+        }
+
+
+class AsyncConcurrencyLimiter(ConcurrencyLimiter):
+    """ConcurrencyLimiter for coroutines on one event loop"""
+
+    def __init__(self, limit, max_queue, timeout):
+        super().__init__(limit, max_queue, timeout)
+        self._slots = asyncio.Semaphore(limit)
+
+    async def acquire(self, endpoint):
+        started = time.monotonic()
+        if not self._slots.locked():
+            await self._slots.acquire()
+            self._active += 1
+            record_admission(endpoint, 'admitted')
+            return
+        if self._waiting >= self.max_queue:
+            record_admission(endpoint, 'shed')
+            raise Overloaded(self.timeout)
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            record_admission(endpoint, 'shed', time.monotonic() - started)
+            raise Overloaded(self.timeout)
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        record_admission(endpoint, 'queued', time.monotonic() - started)
+
+    def release(self):
+        self._active -= 1
+        self._slots.release()
+
+
+buckets = TokenBuckets()
+limiter = ConcurrencyLimiter(MAX_CONCURRENT, MAX_QUEUE, QUEUE_TIMEOUT)
+async_limiter = AsyncConcurrencyLimiter(MAX_CONCURRENT, MAX_QUEUE, QUEUE_TIMEOUT)
+
+
+def check_rate_limit(user_id, endpoint):
+    """Raise RateLimited if `user_id` has no requests left for `endpoint`"""
+    limit = RATE_LIMITS.get(endpoint, DEFAULT_RATE_LIMIT)
+    if not RATE_LIMITS_ENABLED or limit is None or user_id is None:
+        return
+    wait = buckets.take((user_id, endpoint), limit)
+    if wait:
+        record_admission(endpoint, 'rate_limited')
+        raise RateLimited(wait)
+
+
+def needs_slot(endpoint):
+    return endpoint not in UNLIMITED_CONCURRENCY
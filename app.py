@@ -1,16 +1,71 @@
+import csv
+import io
+import json
 import os
-from datetime import datetime, timedelta
-from flask import Flask, jsonify, request, session, redirect
-from flask_cors import CORS
+import time
+from datetime import datetime
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from flask import Flask, Response, g, jsonify, request, session, redirect, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask_cors import CORS
 from authlib.integrations.flask_client import OAuth
 from dotenv import load_dotenv
 
+from activity import activity_stats, log_activity, task_activity
+from admission import (
+    Overloaded, RateLimited, check_rate_limit, limiter, needs_slot, retry_after_header,
+)
+from cache import cached, invalidate
+from db import (
+    PoolTimeout, get_copy_connection, get_db_connection, get_read_connection, get_replicas,
+    pool_stats, replica_stats
+)
+from events import format_sse, get_broker, publish_task_events
+from metrics import (
+    METRICS_TOKEN, finish_request, render_metrics, start_request, update_activity_metrics,
+    update_admission_metrics, update_pool_metrics, update_replica_metrics,
+)
+from responses import (
+    COMPRESS_MIN_BYTES, choose_encoding, compress, compress_stream, content_etag, dumps,
+    is_compressible, loads,
+)
+from task_import import (
+    IMPORT_FORMATS, IMPORT_TOO_LARGE_ERROR, MAX_IMPORT_BYTES, copy_import_rows, decode_import,
+    parse_import_rows, validate_import_rows
+)
+from task_queries import (
+    BATCH_DELETE_QUERY, BATCH_INSERT_QUERY, BATCH_UPDATE_QUERY, BATCH_USERS_QUERY,
+    BATCH_VISIBLE_IDS_QUERY, SYNC_EXPIRED_ERROR, SYNC_XMIN_QUERY, TASK_DELETE_QUERY,
+    TASK_INSERT_QUERY, TASK_REPORT_QUERY, TASK_UPDATE_FIELDS, TASK_VISIBLE_QUERY,
+    TOMBSTONE_HORIZON_QUERY, as_task_id, batch_delete_results, batch_insert_params,
+    batch_update_assignees, batch_update_results, bootstrap_section_result, build_bootstrap_queries,
+    build_calendar_query, build_overdue_query, build_task_activity_query, build_task_changes_query,
+    build_task_query, build_task_update, build_tombstones_query, calendar_range, calendar_result,
+    decode_cursor, decode_sync_token, drop_unknown_assignees, drop_unknown_update_assignees,
+    encode_sync_token, get_batch_items, overdue_result, parse_batch_creates, parse_batch_updates,
+    parse_due_task_type, parse_fields, parse_limit, parse_sections, parse_task_etag,
+    parse_task_filters, report_range, sync_token_expired, task_activity_result, task_cursor_key,
+    task_etag, task_list_result, weekly_report_result,
+)
+
 # Load environment variables
 load_dotenv()
 
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() and request.get_json() through orjson (see responses.py)"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # CORS configuration - allow both local and production frontend
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
@@ -47,19 +102,176 @@ google = oauth.register(
 )
 
 # --- Database Connection ---
-def get_db_connection():
-    return psycopg2.connect(os.environ.get('DATABASE_URL'), cursor_factory=RealDictCursor)
+# Connections come from the per-process pool in db.py; always borrow them with
+# `with get_db_connection() as conn:` so they are returned even on errors.
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(error):
+    response = jsonify({'error': 'Database is busy, please retry'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+# --- Read replicas ---
+# Read-only routes borrow connections with read_connection(), which uses a
+# replica from DATABASE_REPLICA_URLS when one is configured and caught up.
+# After a successful write the user is kept on the primary for
+# READ_YOUR_WRITES_SECONDS, so they always see their own changes. The
+# deadline lives in the session cookie, so it holds on every worker.
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '10'))
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+def read_connection():
+    return get_read_connection(use_primary=session.get('primary_until', 0) > time.time())
+
+@app.after_request
+def keep_writers_on_primary(response):
+    if (request.method in WRITE_METHODS and response.status_code < 400
+            and 'user' in session and get_replicas()):
+        session['primary_until'] = time.time() + READ_YOUR_WRITES_SECONDS
+    return response
+
+# A saturated pool means the worker is busy, not dead: /health must not
+# wait out DB_POOL_TIMEOUT for a connection and get the worker pulled
+HEALTH_CHECKOUT_TIMEOUT = 0.5
+
+@app.route('/health')
+def health():
+    """Public liveness check: 200 when the database answers or every pooled
+    connection is in use, 503 when it cannot be reached. Pool, replica,
+    admission and activity internals are only exported on /metrics.
+    """
+    try:
+        with get_db_connection(HEALTH_CHECKOUT_TIMEOUT) as conn, conn.cursor() as cur:
+            cur.execute('SELECT 1')
+    except PoolTimeout:
+        return jsonify({'status': 'busy'})
+    except psycopg2.Error:
+        return jsonify({'status': 'unavailable'}), 503
+    return jsonify({'status': 'ok'})
+
+# --- Metrics ---
+# Per-endpoint latency, SQL statement count and DB time; the pooled cursors
+# report each statement they run to the current request
+@app.before_request
+def start_request_metrics():
+    start_request(request.endpoint)
+
+@app.after_request
+def record_request_metrics(response):
+    finish_request(request.method, response.status_code)
+    update_pool_metrics(pool_stats())
+    update_replica_metrics(replica_stats())
+    update_admission_metrics(limiter.stats())
+    update_activity_metrics(activity_stats())
+    return response
+
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Not authorized'}), 401
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+# --- Admission control ---
+# Per-user rate limits and a cap on concurrent /api/ requests, checked
+# before the handler runs (see admission.py). A streamed response (export)
+# keeps its slot until the WSGI server closes it, i.e. until it has been
+# sent in full, not just until the view returns.
+@app.before_request
+def admit_request():
+    if not request.path.startswith('/api/') or request.endpoint is None:
+        return
+    user = session.get('user')
+    check_rate_limit(user['id'] if user else None, request.endpoint)
+    if needs_slot(request.endpoint):
+        limiter.acquire(request.endpoint)
+        g.admission_slot = True
+
+@app.after_request
+def hold_admission_slot_while_streaming(response):
+    if response.is_streamed and g.pop('admission_slot', False):
+        response.call_on_close(limiter.release)
+    return response
+
+@app.teardown_request
+def release_admission_slot(error=None):
+    if g.pop('admission_slot', False):
+        limiter.release()
+
+@app.errorhandler(RateLimited)
+def handle_rate_limited(error):
+    response = jsonify({'error': 'Too many requests, please slow down'})
+    response.status_code = 429
+    response.headers['Retry-After'] = retry_after_header(error.retry_after)
+    return response
+
+@app.errorhandler(Overloaded)
+def handle_overloaded(error):
+    response = jsonify({'error': 'Server is busy, please retry'})
+    response.status_code = 503
+    response.headers['Retry-After'] = retry_after_header(error.retry_after)
+    return response
 
 # --- Middleware to prevent caching ---
 @app.after_request
 def add_no_cache_headers(response):
     """Add headers to prevent browser caching for authenticated pages"""
     if request.path.startswith('/api/') or request.path in ['/auth', '/logout']:
+        if 'ETag' in response.headers:
+            # Let the browser keep a private copy but revalidate it every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
     return response
 
+# --- Conditional GETs and compression ---
+# GET responses under /api/ without an ETag of their own get one from a hash
+# of the body, so revalidating an unchanged list costs a 304 and no body.
+# Bodies over COMPRESS_MIN_BYTES are then compressed with the client's
+# preferred encoding. GET ETags are weak because the same content may be
+# sent with different encodings; If-None-Match compares weakly anyway.
+@app.after_request
+def add_etag_and_compress(response):
+    if (request.method in ('GET', 'HEAD') and request.path.startswith('/api/')
+            and response.status_code == 200 and not response.is_streamed
+            and is_compressible(response.mimetype) and 'ETag' not in response.headers):
+        response.set_etag(content_etag(response.get_data()), weak=True)
+        response.make_conditional(request)
+    compress_response(response)
+    return response
+
+def compress_response(response):
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or not is_compressible(response.mimetype)):
+        return
+    if 'ETag' in response.headers and request.method not in ('GET', 'HEAD'):
+        # Write responses carry the task ETag clients send back in If-Match,
+        # which has to stay strong
+        return
+    if not response.is_streamed and response.content_length < COMPRESS_MIN_BYTES:
+        return
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+
+def conditional_json(value, etag):
+    """JSON response with an ETag, or an empty 304 if the client has it"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(value)
+    response.set_etag(etag, weak=True)
+    return response
+
 # --- Authentication Routes ---
 @app.route('/login')
 def login():
@@ -84,35 +296,33 @@ def auth():
     if not google_id or not email:
         return "Could not retrieve user information from Google.", 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        # Check if user exists
+        cur.execute('SELECT * FROM users WHERE google_id = %s', (google_id,))
+        user = cur.fetchone()
+        avatar_changed = user is not None and user['avatar_url'] != avatar_url
+
+        if not user:
+            # Create new user
+            cur.execute(
+                '''INSERT INTO users (google_id, email, name, avatar_url, is_profile_complete) 
+                   VALUES (%s, %s, %s, %s, FALSE) RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
+                (google_id, email, name, avatar_url)
+            )
+            user_record = cur.fetchone()
+            conn.commit()
+        else:
+            # Update avatar if changed
+            cur.execute(
+                '''UPDATE users SET avatar_url = %s WHERE google_id = %s 
+                   RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
+                (avatar_url, google_id)
+            )
+            user_record = cur.fetchone()
+            conn.commit()
+            if avatar_changed:
+                invalidate(conn, 'users')
 
-    # Check if user exists
-    cur.execute('SELECT * FROM users WHERE google_id = %s', (google_id,))
-    user = cur.fetchone()
-    
-    if not user:
-        # Create new user
-        cur.execute(
-            '''INSERT INTO users (google_id, email, name, avatar_url, is_profile_complete) 
-               VALUES (%s, %s, %s, %s, FALSE) RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
-            (google_id, email, name, avatar_url)
-        )
-        user_record = cur.fetchone()
-        conn.commit()
-    else:
-        # Update avatar if changed
-        cur.execute(
-            '''UPDATE users SET avatar_url = %s WHERE google_id = %s 
-               RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
-            (avatar_url, google_id)
-        )
-        user_record = cur.fetchone()
-        conn.commit()
-
-    cur.close()
-    conn.close()
-    
     session['user'] = {
         'id': user_record['id'],
         'name': user_record['name'],
@@ -161,22 +371,18 @@ def update_profile():
         return jsonify({'error': 'Name and designation are required'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute(
-            '''UPDATE users 
-               SET name = %s, designation = %s, is_profile_complete = TRUE, updated_at = CURRENT_TIMESTAMP
-               WHERE id = %s
-               RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
-            (name, designation, user_id)
-        )
-        
-        updated_user = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                '''UPDATE users 
+                   SET name = %s, designation = %s, is_profile_complete = TRUE, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = %s
+                   RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
+                (name, designation, user_id)
+            )
+            updated_user = cur.fetchone()
+            conn.commit()
+            invalidate(conn, 'users')
+
         if not updated_user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -191,37 +397,30 @@ def update_profile():
         }
         
         return jsonify(session['user'])
+    except PoolTimeout:
+        raise
     except Exception as e:
         print(f"Error updating profile: {e}")
         return jsonify({'error': 'Database error occurred'}), 500
-        'id': updated_user['id'],
-        'name': updated_user['name'],
-        'email': updated_user['email'],
-        'avatar_url': updated_user['avatar_url'],
-        'designation': updated_user['designation'],
-        'is_profile_complete': updated_user['is_profile_complete']
-    }
-    
-    return jsonify(session['user'])
 
 @app.route('/api/users')
 def get_all_users():
     if 'user' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT id, name, email, avatar_url, designation 
-        FROM users 
-        WHERE is_profile_complete = TRUE
-        ORDER BY name
-    ''')
-    users = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    return jsonify(users)
+    return conditional_json(*cached('users', load_users))
+
+def load_users():
+    # Cached copies are shared by every user, so they are always loaded
+    # from the primary; a lagging replica could pin a stale list for the TTL
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute('''
+            SELECT id, name, email, avatar_url, designation 
+            FROM users 
+            WHERE is_profile_complete = TRUE
+            ORDER BY name
+        ''')
+        return [dict(row) for row in cur.fetchall()]
 
 # --- Company API Routes ---
 @app.route('/api/companies')
@@ -229,14 +428,12 @@ def get_companies():
     if 'user' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT name FROM companies ORDER BY name')
-    companies = [row['name'] for row in cur.fetchall()]
-    cur.close()
-    conn.close()
-    
-    return jsonify(companies)
+    return conditional_json(*cached('companies', load_companies))
+
+def load_companies():
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute('SELECT name FROM companies ORDER BY name')
+        return [row['name'] for row in cur.fetchall()]
 
 # --- Task API Routes ---
 @app.route('/api/tasks', methods=['GET'])
@@ -244,65 +441,196 @@ def get_tasks():
     if 'user' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
 
+    user_id = session['user']['id']
+
+    # Passing `limit` or `cursor` switches to keyset pagination; without
+    # them the full list is returned as before
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    try:
+        filters = parse_task_filters(request.args)
+        fields = parse_fields(request.args.get('fields'))
+        limit = parse_limit(request.args.get('limit')) if paginate else None
+        cursor = decode_cursor(request.args.get('cursor'), task_cursor_key(filters))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, params = build_task_query(user_id, filters, fields, limit, cursor)
+
+    with read_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        tasks = cur.fetchall()
+
+    return jsonify(task_list_result(tasks, limit))
+
+@app.route('/api/tasks/changes')
+def get_task_changes():
+    """Delta sync: tasks changed since `since`, plus ids that left the view.
+
+    Without `since` this pages through every task in the view. Keep calling
+    with `next_token` while `has_more` is true, then save the last token for
+    the next sync. A token older than the tombstone retention (see
+    archive.py) gets a 410 with resync_required: start over without `since`.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
     user_id = session['user']['id']
     task_type = request.args.get('type', 'my')
-    status = request.args.get('status')
-    priority = request.args.get('priority')
-    company = request.args.get('company')
-    search = request.args.get('search', '')
+    try:
+        since = decode_sync_token(request.args.get('since'))
+        limit = parse_limit(request.args.get('limit'))
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, params = build_task_changes_query(user_id, task_type, since, limit, fields)
+
+    with get_db_connection() as conn, conn.cursor() as cur:
+        # One snapshot for the changes, the tombstones and the new token
+        cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        if since:
+            # Tombstones this token may still need could have been pruned
+            cur.execute(TOMBSTONE_HORIZON_QUERY)
+            if sync_token_expired(since, cur.fetchone()['pruned_before']):
+                return jsonify({'error': SYNC_EXPIRED_ERROR, 'resync_required': True}), 410
+        cur.execute(query, params)
+        changes = cur.fetchall()
+        removed = []
+        if since:
+            tombstones_query, tombstones_params = build_tombstones_query(user_id, task_type, since[0])
+            cur.execute(tombstones_query, tombstones_params)
+            removed = cur.fetchall()
+        cur.execute(SYNC_XMIN_QUERY)
+        sync = cur.fetchone()
+
+    has_more = len(changes) > limit
+    if has_more:
+        changes = changes[:limit]
+        next_token = encode_sync_token(changes[-1]['change_xid'], changes[-1]['id'], sync['issued_at'])
+    else:
+        next_token = encode_sync_token(sync['xmin'], 0, sync['issued_at'])
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    query = '''
-        SELECT 
-            t.id, t.title, t.description, t.company, t.priority, t.status, 
-            t.due_date, t.created_at, t.updated_at,
-            assigned_by.id as assigned_by_id, assigned_by.name as assigned_by_name, 
-            assigned_by.avatar_url as assigned_by_avatar,
-            assigned_to.id as assigned_to_id, assigned_to.name as assigned_to_name,
-            assigned_to.avatar_url as assigned_to_avatar, assigned_to.designation as assigned_to_designation
-        FROM tasks t
-        LEFT JOIN users assigned_by ON t.assigned_by_user_id = assigned_by.id
-        LEFT JOIN users assigned_to ON t.assigned_to_user_id = assigned_to.id
-        WHERE 1=1
-    '''
-    
-    params = []
-    
-    if task_type == 'my':
-        query += ' AND t.assigned_to_user_id = %s'
-        params.append(user_id)
-    elif task_type == 'assigned':
-        # Tasks I assigned to OTHERS (not to myself)
-        query += ' AND t.assigned_by_user_id = %s AND t.assigned_to_user_id != %s'
-        params.append(user_id)
-        params.append(user_id)
-    
-    if status:
-        query += ' AND t.status = %s'
-        params.append(status)
-    
-    if priority:
-        query += ' AND t.priority = %s'
-        params.append(priority)
-    
-    if company:
-        query += ' AND t.company = %s'
-        params.append(company)
-    
-    if search:
-        query += ' AND t.title ILIKE %s'
-        params.append(f'%{search}%')
-    
-    query += ' ORDER BY t.created_at DESC'
-    
-    cur.execute(query, params)
-    tasks = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    return jsonify(tasks)
+    changed_ids = {task['id'] for task in changes}
+    for task in changes:
+        del task['change_xid']
+
+    return jsonify({
+        'changes': changes,
+        'removed': [row for row in removed if row['id'] not in changed_ids],
+        'next_token': next_token,
+        'has_more': has_more
+    })
+
+# --- Due dates ---
+@app.route('/api/tasks/calendar')
+def get_task_calendar():
+    """Open tasks due between `from` and `to` (default: this week), grouped
+    by due date. `type` is my or assigned, as for get_tasks.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    try:
+        task_type = parse_due_task_type(request.args)
+        fields = parse_fields(request.args.get('fields'))
+        start, end = calendar_range(request.args, datetime.utcnow().date())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, params = build_calendar_query(user_id, task_type, start, end, fields)
+
+    with read_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        tasks = cur.fetchall()
+
+    return jsonify(calendar_result(tasks, start, end))
+
+@app.route('/api/tasks/overdue')
+def get_overdue_tasks():
+    """Open tasks due before today (UTC), most overdue first. Pages like
+    get_tasks when `limit` or `cursor` is passed.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    try:
+        task_type = parse_due_task_type(request.args)
+        fields = parse_fields(request.args.get('fields'))
+        limit = parse_limit(request.args.get('limit')) if paginate else None
+        cursor = decode_cursor(request.args.get('cursor'), 'due_date')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, params = build_overdue_query(user_id, task_type, datetime.utcnow().date(), fields, limit, cursor)
+
+    with read_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        tasks = cur.fetchall()
+
+    return jsonify(overdue_result(tasks, limit))
+
+# --- Task Export ---
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_BATCH_SIZE = 2000
+
+def export_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+@app.route('/api/tasks/export')
+def export_tasks():
+    """Stream tasks as CSV or NDJSON using the same filters as get_tasks.
+
+    Rows are read through a server-side (named) cursor EXPORT_BATCH_SIZE
+    at a time and written out as each batch arrives, so memory use does not
+    grow with the size of the export.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    try:
+        filters = parse_task_filters(request.args)
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, params = build_task_query(user_id, filters, fields)
+    # Chosen now, while the request (and its session) is still active
+    connection = read_connection()
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            writer.writerow(fields)
+            yield buffer.getvalue()
+
+        with connection as conn, conn.cursor(name='task_export') as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if export_format == 'ndjson':
+                    # Encoded like every other JSON body (responses.dumps)
+                    yield b''.join(dumps({name: row[name] for name in fields}) + b'\n' for row in rows)
+                    continue
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([export_value(row[name]) for name in fields] for row in rows)
+                yield buffer.getvalue()
+
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=tasks.{export_format}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/tasks', methods=['POST'])
 def create_task():
@@ -322,21 +650,17 @@ def create_task():
     if not title or not assigned_to_user_id:
         return jsonify({'error': 'Title and assignee are required'}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute(
-        '''INSERT INTO tasks 
-           (title, description, company, priority, status, assigned_by_user_id, assigned_to_user_id, due_date)
-           VALUES (%s, %s, %s, %s, 'TODO', %s, %s, %s)
-           RETURNING id''',
-        (title, description, company, priority, user_id, assigned_to_user_id, due_date)
-    )
-    
-    new_task_id = cur.fetchone()['id']
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            TASK_INSERT_QUERY,
+            (title, description, company, priority, user_id, assigned_to_user_id, due_date)
+        )
+        new_task = cur.fetchone()
+        new_task_id = new_task['id']
+        activity = task_activity(user_id, 'created', [new_task])
+        publish_task_events(cur, 'created', [new_task])
+        conn.commit()
+    log_activity(activity)
     
     return jsonify({'message': 'Task created successfully', 'id': new_task_id}), 201
 
@@ -347,60 +671,47 @@ def update_task(task_id):
 
     user_id = session['user']['id']
     data = request.get_json()
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute(
-        'SELECT * FROM tasks WHERE id = %s AND (assigned_to_user_id = %s OR assigned_by_user_id = %s)',
-        (task_id, user_id, user_id)
-    )
-    task = cur.fetchone()
-    
-    if not task:
-        cur.close()
-        conn.close()
-        return jsonify({'error': 'Task not found or permission denied'}), 404
-    
-    update_fields = []
-    params = []
-    
-    if 'status' in data:
-        update_fields.append('status = %s')
-        params.append(data['status'])
-    
-    if 'title' in data:
-        update_fields.append('title = %s')
-        params.append(data['title'])
-    
-    if 'description' in data:
-        update_fields.append('description = %s')
-        params.append(data['description'])
-    
-    if 'priority' in data:
-        update_fields.append('priority = %s')
-        params.append(data['priority'])
-    
-    if 'company' in data:
-        update_fields.append('company = %s')
-        params.append(data['company'])
-    
-    if 'due_date' in data:
-        update_fields.append('due_date = %s')
-        params.append(data['due_date'])
-    
-    if update_fields:
-        update_fields.append('updated_at = CURRENT_TIMESTAMP')
-        params.append(task_id)
-        
-        query = f"UPDATE tasks SET {', '.join(update_fields)} WHERE id = %s"
-        cur.execute(query, params)
-        conn.commit()
-    
-    cur.close()
-    conn.close()
-    
-    return jsonify({'message': 'Task updated successfully'})
+    changes = {field: data[field] for field in TASK_UPDATE_FIELDS if field in data}
+
+    # If-Match makes the update conditional on the version the client saw
+    expected_version = None
+    if request.if_match and not request.if_match.star_tag:
+        etags = request.if_match.as_set()
+        expected_version = parse_task_etag(etags.pop(), task_id) if len(etags) == 1 else None
+        if expected_version is None:
+            return jsonify({'error': 'If-Match does not match this task'}), 412
+
+    activity = []
+    with get_db_connection() as conn, conn.cursor() as cur:
+        if changes:
+            query, params = build_task_update(task_id, user_id, changes, expected_version)
+            cur.execute(query, params)
+            task = cur.fetchone()
+            if task:
+                activity = task_activity(user_id, 'updated', [task])
+                publish_task_events(cur, 'updated', [task])
+                conn.commit()
+        else:
+            cur.execute(TASK_VISIBLE_QUERY, (task_id, user_id, user_id))
+            task = cur.fetchone()
+            if task and expected_version is not None and task['version'] != expected_version:
+                task = None
+
+        if not task:
+            # Slow path only: was it missing/forbidden, or a version conflict?
+            cur.execute(TASK_VISIBLE_QUERY, (task_id, user_id, user_id))
+            current = cur.fetchone()
+            if not current:
+                return jsonify({'error': 'Task not found or permission denied'}), 404
+            response = jsonify({'error': 'Task was modified by someone else', 'task': current})
+            response.status_code = 412
+            response.set_etag(task_etag(current))
+            return response
+
+    log_activity(activity)
+    response = jsonify({'message': 'Task updated successfully', 'task': task})
+    response.set_etag(task_etag(task))
+    return response
 
 @app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
@@ -408,24 +719,241 @@ def delete_task(task_id):
         return jsonify({'error': 'Unauthorized'}), 401
 
     user_id = session['user']['id']
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute(
-        'DELETE FROM tasks WHERE id = %s AND assigned_by_user_id = %s RETURNING id',
-        (task_id, user_id)
-    )
-    
-    deleted_row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(TASK_DELETE_QUERY, (task_id, user_id))
+        deleted_row = cur.fetchone()
+        if deleted_row:
+            activity = task_activity(user_id, 'deleted', [deleted_row])
+            publish_task_events(cur, 'deleted', [deleted_row])
+        conn.commit()
     
     if deleted_row:
+        log_activity(activity)
         return jsonify({'message': 'Task deleted successfully'})
     else:
         return jsonify({'error': 'Task not found or permission denied'}), 404
 
+@app.route('/api/tasks/<int:task_id>/activity')
+def get_task_activity(task_id):
+    """The task's change history, newest first, paged like /api/tasks.
+
+    Events are written in the background (see activity.py), so a change
+    shows up here a moment after the write that made it.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = decode_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, params = build_task_activity_query(task_id, user_id, limit, cursor)
+    with read_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        activity = cur.fetchall()
+        if not activity:
+            cur.execute(TASK_VISIBLE_QUERY, (task_id, user_id, user_id))
+            if not cur.fetchone():
+                return jsonify({'error': 'Task not found or permission denied'}), 404
+
+    return jsonify(task_activity_result(activity, limit))
+
+# --- Task Import ---
+@app.route('/api/tasks/import', methods=['POST'])
+def import_tasks():
+    """Bulk-create tasks from CSV or NDJSON.
+
+    Columns: title, assignee_email (both required), description, company,
+    priority, status, due_date. The body can be the raw file or a multipart
+    upload named `file`; the format comes from `?format=` or the content
+    type. Valid rows are loaded with COPY and one INSERT in a single
+    transaction; invalid rows are reported by row number and skipped. The
+    body must be UTF-8 and at most MAX_IMPORT_BYTES long.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    # The upload is read whole, so its size must be known up front
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length is required'}), 411
+    if request.content_length > MAX_IMPORT_BYTES:
+        return jsonify({'error': IMPORT_TOO_LARGE_ERROR}), 413
+
+    user_id = session['user']['id']
+    upload = request.files.get('file')
+    try:
+        if upload:
+            text = decode_import(upload.read())
+            content_type = upload.mimetype
+        else:
+            text = decode_import(request.get_data())
+            content_type = request.mimetype
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    import_format = request.args.get('format') or ('ndjson' if 'ndjson' in content_type else 'csv')
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    with get_copy_connection() as conn, conn.cursor() as cur:
+        try:
+            valid, errors = validate_import_rows(cur, parse_import_rows(text, import_format))
+        except (ValueError, csv.Error) as e:
+            return jsonify({'error': str(e)}), 400
+
+        created = []
+        if valid:
+            created = copy_import_rows(cur, user_id, valid)
+            publish_task_events(cur, 'created', created)
+            conn.commit()
+
+    return jsonify({
+        'imported': len(created),
+        'failed': len(errors),
+        'errors': errors
+    }), 201 if created else 200
+
+# --- Task Event Stream ---
+SSE_HEARTBEAT_SECONDS = 15
+
+@app.route('/api/tasks/stream')
+def stream_task_events():
+    """Server-Sent Events feed of task created/updated/deleted events.
+
+    Only events for tasks the user is assigned to or assigned are sent. A
+    reconnecting client sends Last-Event-ID to resume; if that event is no
+    longer in the backlog it gets a `reset` event and should refetch.
+    Each open stream holds a worker thread for as long as it stays open.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = get_broker().subscribe(user_id, last_event_id)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield format_sse(event)
+        finally:
+            subscription.close()
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# --- Batch Task API Routes ---
+# Each batch runs in a single transaction with one set-based statement.
+# Items that fail validation or permission checks are reported per index
+# in `results` without aborting the rest of the batch.
+@app.route('/api/tasks/batch', methods=['POST'])
+def create_tasks_batch():
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    try:
+        items = get_batch_items(request.get_json(silent=True), 'tasks')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results, rows = parse_batch_creates(items)
+
+    activity = []
+    with get_db_connection() as conn, conn.cursor() as cur:
+        if rows:
+            cur.execute(BATCH_USERS_QUERY, (list({assignee for _, _, assignee in rows}),))
+            rows = drop_unknown_assignees(results, rows, {row['id'] for row in cur.fetchall()})
+
+        if rows:
+            cur.execute(BATCH_INSERT_QUERY, batch_insert_params(user_id, rows))
+            new_tasks = sorted(cur.fetchall(), key=lambda row: row['id'])
+            activity = task_activity(user_id, 'created', new_tasks)
+            publish_task_events(cur, 'created', new_tasks)
+            conn.commit()
+            for (index, _, _), new_task in zip(rows, new_tasks):
+                results[index] = {'index': index, 'id': new_task['id'], 'status': 'created'}
+    log_activity(activity)
+
+    return jsonify({'results': results})
+
+@app.route('/api/tasks/batch', methods=['PATCH'])
+def update_tasks_batch():
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    try:
+        items = get_batch_items(request.get_json(silent=True), 'updates')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results, updates, indexes_by_id = parse_batch_updates(items)
+
+    updated_ids = set()
+    conflict_ids = set()
+    activity = []
+    if updates:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            assignees = batch_update_assignees(updates)
+            if assignees:
+                cur.execute(BATCH_USERS_QUERY, (assignees,))
+                known_users = {row['id'] for row in cur.fetchall()}
+                updates = drop_unknown_update_assignees(results, updates, indexes_by_id, known_users)
+
+            if updates:
+                cur.execute(BATCH_UPDATE_QUERY, {'user_id': user_id, 'updates': json.dumps(updates)})
+                updated_tasks = cur.fetchall()
+                updated_ids = {row['id'] for row in updated_tasks}
+                activity = task_activity(user_id, 'updated', updated_tasks)
+                publish_task_events(cur, 'updated', updated_tasks)
+                conn.commit()
+
+            failed_ids = [task_id for task_id in indexes_by_id if task_id not in updated_ids]
+            if failed_ids:
+                cur.execute(BATCH_VISIBLE_IDS_QUERY, {'user_id': user_id, 'ids': failed_ids})
+                conflict_ids = {row['id'] for row in cur.fetchall()}
+    log_activity(activity)
+
+    return jsonify({'results': batch_update_results(results, indexes_by_id, updated_ids, conflict_ids)})
+
+@app.route('/api/tasks/batch', methods=['DELETE'])
+def delete_tasks_batch():
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    try:
+        items = get_batch_items(request.get_json(silent=True), 'ids')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    task_ids = [as_task_id(item) for item in items]
+    valid_ids = [task_id for task_id in task_ids if task_id is not None]
+
+    deleted_ids = set()
+    activity = []
+    if valid_ids:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(BATCH_DELETE_QUERY, {'user_id': user_id, 'ids': valid_ids})
+            deleted_tasks = cur.fetchall()
+            deleted_ids = {row['id'] for row in deleted_tasks}
+            activity = task_activity(user_id, 'deleted', deleted_tasks)
+            publish_task_events(cur, 'deleted', deleted_tasks)
+            conn.commit()
+    log_activity(activity)
+
+    return jsonify({'results': batch_delete_results(task_ids, deleted_ids)})
+
 # --- Reports API Routes ---
 @app.route('/api/reports/weekly')
 def get_weekly_report():
@@ -433,81 +961,60 @@ def get_weekly_report():
         return jsonify({'error': 'Unauthorized'}), 401
 
     user_id = session['user']['id']
-    
-    today = datetime.now().date()
-    start_of_week = today - timedelta(days=today.weekday())
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute('''
-        SELECT COUNT(*) as count 
-        FROM tasks 
-        WHERE assigned_to_user_id = %s 
-        AND created_at >= %s
-    ''', (user_id, start_of_week))
-    tasks_assigned_to_me = cur.fetchone()['count']
-    
-    cur.execute('''
-        SELECT COUNT(*) as count 
-        FROM tasks 
-        WHERE assigned_by_user_id = %s 
-        AND created_at >= %s
-    ''', (user_id, start_of_week))
-    tasks_i_assigned = cur.fetchone()['count']
-    
-    cur.execute('''
-        SELECT COUNT(*) as count 
-        FROM tasks 
-        WHERE assigned_to_user_id = %s 
-        AND status = 'DONE'
-        AND updated_at >= %s
-    ''', (user_id, start_of_week))
-    tasks_i_completed = cur.fetchone()['count']
-    
-    cur.execute('''
-        SELECT COUNT(*) as count 
-        FROM tasks 
-        WHERE created_at >= %s
-    ''', (start_of_week,))
-    total_tasks_created = cur.fetchone()['count']
-    
-    cur.execute('''
-        SELECT COUNT(*) as count 
-        FROM tasks 
-        WHERE status = 'DONE'
-        AND updated_at >= %s
-    ''', (start_of_week,))
-    total_tasks_completed = cur.fetchone()['count']
-    
-    cur.execute('''
-        SELECT status, COUNT(*) as count 
-        FROM tasks 
-        WHERE assigned_to_user_id = %s 
-        GROUP BY status
-    ''', (user_id,))
-    tasks_by_status = {row['status']: row['count'] for row in cur.fetchall()}
-    
-    cur.execute('''
-        SELECT priority, COUNT(*) as count 
-        FROM tasks 
-        WHERE assigned_to_user_id = %s 
-        GROUP BY priority
-    ''', (user_id,))
-    tasks_by_priority = {row['priority']: row['count'] for row in cur.fetchall()}
-    
-    cur.close()
-    conn.close()
-    
-    return jsonify({
-        'tasks_assigned_to_me_this_week': tasks_assigned_to_me,
-        'tasks_i_assigned_this_week': tasks_i_assigned,
-        'tasks_i_completed_this_week': tasks_i_completed,
-        'total_tasks_created_this_week': total_tasks_created,
-        'total_tasks_completed_this_week': total_tasks_completed,
-        'tasks_by_status': tasks_by_status,
-        'tasks_by_priority': tasks_by_priority
-    })
+
+    try:
+        start, end = report_range(request.args, datetime.utcnow().date())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with read_connection() as conn, conn.cursor() as cur:
+        cur.execute(TASK_REPORT_QUERY, {'user_id': user_id, 'from': start, 'to': end})
+        report = cur.fetchone()
+
+    return jsonify(weekly_report_result(report, start, end))
+
+# --- Dashboard bootstrap ---
+@app.route('/api/bootstrap')
+def get_bootstrap():
+    """Everything the dashboard shows on load in one request: the bodies of
+    /api/me, /api/users, /api/companies, /api/tasks?type=my and
+    ?type=assigned and /api/reports/weekly, keyed by section.
+
+    `sections` selects a comma separated subset. Task sections accept the
+    get_tasks `fields` and `limit` params (with `limit` they are pages with
+    a next_cursor), the report accepts `from` and `to`.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user']['id']
+    try:
+        sections = parse_sections(request.args.get('sections'))
+        fields = parse_fields(request.args.get('fields'))
+        limit = parse_limit(request.args.get('limit')) if 'limit' in request.args else None
+        start, end = report_range(request.args, datetime.utcnow().date())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    result = {}
+    if 'me' in sections:
+        result['me'] = session['user']
+    # Shared lists come from the cache, normally without a query
+    if 'users' in sections:
+        result['users'] = cached('users', load_users)[0]
+    if 'companies' in sections:
+        result['companies'] = cached('companies', load_companies)[0]
+
+    # psycopg2 has no pipeline mode, so the remaining statements run back
+    # to back on a single borrowed connection
+    queries = build_bootstrap_queries(user_id, sections, fields, limit, start, end)
+    if queries:
+        with read_connection() as conn, conn.cursor() as cur:
+            for section, query, params in queries:
+                cur.execute(query, params)
+                result[section] = bootstrap_section_result(section, cur.fetchall(), limit, start, end)
+
+    return jsonify(result)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
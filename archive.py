@@ -0,0 +1,143 @@
+"""Move long-completed tasks to cold storage.
+
+    python archive.py [--days 180] [--tombstone-days 30] [--batch-size 5000] [--dry-run]
+
+Tasks that have been DONE for more than --days are flagged archived, which
+moves them from tasks_hot into the yearly tasks_archive_YYYY partition for
+their created_at (see migrations/0003_partition_tasks.py). Those partitions
+are created here as needed. Rows move in small batches, each its own
+transaction, so the job never holds many row locks and can run while the
+app is serving traffic.
+
+Archived tasks drop out of /api/tasks unless include_archived=true is
+passed; editing one back out of DONE returns it to tasks_hot.
+
+The same run prunes task_tombstones older than --tombstone-days, also in
+batches. The cutoff is recorded in task_tombstone_horizon first, so
+/api/tasks/changes starts refusing sync tokens issued before it (clients
+then sync from scratch) before any tombstone they might need is gone.
+"""
+import argparse
+import os
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', '30'))
+
+CANDIDATES = """
+    FROM tasks
+    WHERE archived = FALSE AND status = 'DONE' AND created_at IS NOT NULL
+      AND updated_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+"""
+
+ARCHIVE_BATCH_QUERY = f"""
+    UPDATE tasks SET archived = TRUE
+    WHERE id IN (SELECT id {CANDIDATES} LIMIT %s FOR UPDATE SKIP LOCKED)
+      AND archived = FALSE
+"""
+
+TOMBSTONE_CUTOFF_QUERY = "SELECT CURRENT_TIMESTAMP - make_interval(days => %s)"
+
+RECORD_TOMBSTONE_HORIZON = """
+    INSERT INTO task_tombstone_horizon (pruned_before) VALUES (%(before)s)
+    ON CONFLICT (id) DO UPDATE
+    SET pruned_before = GREATEST(task_tombstone_horizon.pruned_before, EXCLUDED.pruned_before)
+"""
+
+PRUNE_TOMBSTONES_BATCH_QUERY = """
+    DELETE FROM task_tombstones
+    WHERE id IN (SELECT id FROM task_tombstones WHERE created_at < %(before)s LIMIT %(batch_size)s)
+"""
+
+
+def ensure_archive_partitions(cur, days):
+    """Create tasks_archive_YYYY for every year a candidate was created in"""
+    cur.execute(f"SELECT DISTINCT extract(year FROM created_at)::int {CANDIDATES}", (days,))
+    years = sorted(row[0] for row in cur.fetchall())
+    for year in years:
+        name = f'tasks_archive_{year}'
+        cur.execute("SELECT to_regclass(%s)", (name,))
+        if cur.fetchone()[0]:
+            continue
+        cur.execute(f"""
+            CREATE TABLE {name} PARTITION OF tasks_archive
+            FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01');
+            ALTER TABLE {name} ADD PRIMARY KEY (id);
+        """)
+        print(f"  ✓ Created partition '{name}'")
+    return years
+
+
+def prune_tombstones(cur, days, batch_size):
+    """Delete tombstones created more than `days` ago, recording the cutoff first"""
+    cur.execute(TOMBSTONE_CUTOFF_QUERY, (days,))
+    before = cur.fetchone()[0]
+    cur.execute(RECORD_TOMBSTONE_HORIZON, {'before': before})
+    total = 0
+    while True:
+        cur.execute(PRUNE_TOMBSTONES_BATCH_QUERY, {'before': before, 'batch_size': batch_size})
+        if not cur.rowcount:
+            break
+        total += cur.rowcount
+        print(f"  ✓ Pruned {total} tombstones")
+    print(f"Pruned {total} tombstones older than {days} days")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help='archive tasks completed more than this many days ago')
+    parser.add_argument('--tombstone-days', type=int, default=TOMBSTONE_RETENTION_DAYS,
+                        help='prune delta sync tombstones older than this many days')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only count the tasks and tombstones that would go')
+    args = parser.parse_args(argv)
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable is not set")
+
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = 'tasks'::regclass")
+        if cur.fetchone()[0] != 'p':
+            raise RuntimeError("'tasks' is not partitioned yet; run migrate.py first")
+
+        if args.dry_run:
+            cur.execute(f"SELECT count(*) {CANDIDATES}", (args.days,))
+            print(f"{cur.fetchone()[0]} tasks completed more than {args.days} days ago would be archived")
+            cur.execute(f"SELECT count(*) FROM task_tombstones WHERE created_at < ({TOMBSTONE_CUTOFF_QUERY})",
+                        (args.tombstone_days,))
+            print(f"{cur.fetchone()[0]} tombstones older than {args.tombstone_days} days would be pruned")
+            return
+
+        years = ensure_archive_partitions(cur, args.days)
+        total = 0
+        while years:
+            try:
+                cur.execute(ARCHIVE_BATCH_QUERY, (args.days, args.batch_size))
+            except psycopg2.errors.CheckViolation:
+                # A task from a new year became eligible since the partitions
+                # were created ("no partition of relation found for row")
+                ensure_archive_partitions(cur, args.days)
+                continue
+            if not cur.rowcount:
+                break
+            total += cur.rowcount
+            print(f"  ✓ Archived {total} tasks")
+        print(f"Archived {total} tasks completed more than {args.days} days ago")
+
+        prune_tombstones(cur, args.tombstone_days, args.batch_size)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1123 @@
+"""Async (ASGI) variant of the API in app.py.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5001 --workers 2
+
+Serves the same routes with the same request/response formats, session
+cookie and Google OAuth flow, so a client (or a load balancer splitting
+traffic) cannot tell the two apart. Requests wait on Postgres through
+psycopg 3's async pool instead of holding a worker thread, so one process
+can keep thousands of slow requests and /api/tasks/stream clients open.
+
+SQL and request parsing come from the modules shared with app.py
+(task_queries.py, task_import.py, events.py, cache.py); only the I/O is
+async here. Read-replica routing (db.py) is not used: every query goes to
+DATABASE_URL.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from authlib.integrations.starlette_client import OAuth
+from dotenv import load_dotenv
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+import psycopg
+from psycopg import AsyncClientCursor
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from starlette.applications import Starlette
+from starlette.datastructures import MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import HTTPConnection
+from starlette.responses import PlainTextResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import dump_cookie, parse_etags
+
+from activity import activity_stats, flush_activity, log_activity_async, task_activity
+from admission import Overloaded, RateLimited, async_limiter, check_rate_limit, needs_slot, retry_after_header
+from cache import cached_async, invalidate_async
+from events import AsyncSubscription, PUBLISH_TASK_EVENTS_QUERY, format_sse, get_broker, task_event_params
+from metrics import (
+    METRICS_TOKEN, finish_request, name_request, record_query, render_metrics, start_request,
+    update_activity_metrics, update_admission_metrics, update_pool_metrics,
+)
+from responses import (
+    COMPRESS_MIN_BYTES, choose_encoding, compress, compress_stream_async, content_etag, dumps,
+    is_compressible, loads,
+)
+from task_import import (
+    COPY_STAGING_SQL, CREATE_STAGING_TABLE, IMPORT_COMPANIES_QUERY, IMPORT_FORMATS,
+    IMPORT_TOO_LARGE_ERROR, IMPORT_USERS_QUERY, INSERT_FROM_STAGING, MAX_IMPORT_BYTES,
+    check_import_rows, collect_import_rows, decode_import, import_rows_csv, parse_import_rows,
+)
+from task_queries import (
+    BATCH_DELETE_QUERY, BATCH_INSERT_QUERY, BATCH_UPDATE_QUERY, BATCH_USERS_QUERY,
+    BATCH_VISIBLE_IDS_QUERY, SYNC_EXPIRED_ERROR, SYNC_XMIN_QUERY, TASK_DELETE_QUERY,
+    TASK_INSERT_QUERY, TASK_REPORT_QUERY, TASK_UPDATE_FIELDS, TASK_VISIBLE_QUERY,
+    TOMBSTONE_HORIZON_QUERY, as_task_id, batch_delete_results, batch_insert_params,
+    batch_update_assignees, batch_update_results, bootstrap_section_result, build_bootstrap_queries,
+    build_calendar_query, build_overdue_query, build_task_activity_query, build_task_changes_query,
+    build_task_query, build_task_update, build_tombstones_query, calendar_range, calendar_result,
+    decode_cursor, decode_sync_token, drop_unknown_assignees, drop_unknown_update_assignees,
+    encode_sync_token, get_batch_items, overdue_result, parse_batch_creates, parse_batch_updates,
+    parse_due_task_type, parse_fields, parse_limit, parse_sections, parse_task_etag,
+    parse_task_filters, report_range, sync_token_expired, task_activity_result, task_cursor_key,
+    task_etag, task_list_result, weekly_report_result,
+)
+
+load_dotenv()
+
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+BACKEND_URL = os.environ.get('BACKEND_URL', 'http://localhost:5001')
+SECRET_KEY = os.environ.get('FLASK_SECRET_KEY')
+
+
+# --- Flask-compatible session cookie ---
+class FlaskSessionMiddleware:
+    """Reads and writes the signed `session` cookie exactly like Flask's
+    default session interface (same signer, salt and tagged JSON), with the
+    cookie settings app.py configures. Sessions created by either app are
+    valid in the other.
+    """
+
+    def __init__(self, app, secret_key, cookie_name='session', max_age=31 * 24 * 3600):
+        interface = SecureCookieSessionInterface()
+        self.app = app
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        self.serializer = URLSafeTimedSerializer(
+            secret_key,
+            salt=interface.salt,
+            serializer=interface.serializer,
+            signer_kwargs={'key_derivation': interface.key_derivation, 'digest_method': interface.digest_method},
+        )
+
+    def load(self, scope):
+        value = HTTPConnection(scope).cookies.get(self.cookie_name)
+        if not value:
+            return SecureCookieSession()
+        try:
+            return SecureCookieSession(self.serializer.loads(value, max_age=self.max_age))
+        except BadSignature:
+            return SecureCookieSession()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        session = scope['session'] = self.load(scope)
+
+        async def send_with_cookie(message):
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                if session.accessed:
+                    headers.add_vary_header('Cookie')
+                if session.modified:
+                    cookie = dict(path='/', secure=True, httponly=True, samesite='None')
+                    if session:
+                        headers.append('Set-Cookie', dump_cookie(
+                            self.cookie_name, self.serializer.dumps(dict(session)), **cookie))
+                    else:
+                        headers.append('Set-Cookie', dump_cookie(
+                            self.cookie_name, '', expires=0, max_age=0, **cookie))
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+# --- Response headers and metrics ---
+class ApiHeadersMiddleware:
+    """The app.py after_request hooks: cache headers and request metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start_request(None)
+        path = scope['path']
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                if path.startswith('/api/') or path in ('/auth', '/logout'):
+                    if 'etag' in headers:
+                        headers['Cache-Control'] = 'private, no-cache'
+                    else:
+                        headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
+                        headers['Pragma'] = 'no-cache'
+                        headers['Expires'] = '0'
+                finish_request(scope['method'], message['status'])
+                update_pool_metrics(pool_stats())
+                update_admission_metrics(async_limiter.stats())
+                update_activity_metrics(activity_stats())
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+def jsonify(value, status_code=200, headers=None):
+    """JSON response encoded like app.py's jsonify (see responses.py)"""
+    return Response(dumps(value), status_code=status_code, headers=headers, media_type='application/json')
+
+
+def set_etag(response, etag, weak=False):
+    response.headers['ETag'] = f'W/"{etag}"' if weak else f'"{etag}"'
+    return response
+
+
+def conditional_json(request, value, etag):
+    """JSON response with an ETag, or an empty 304 if the client has it"""
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+        return set_etag(Response(status_code=304), etag, weak=True)
+    return set_etag(jsonify(value), etag, weak=True)
+
+
+def add_etag_and_compress(request, response):
+    """app.py's after_request hook of the same name: content-hash ETags on
+    GET responses under /api/, then gzip/brotli above COMPRESS_MIN_BYTES
+    """
+    streamed = isinstance(response, StreamingResponse)
+    mimetype = (response.headers.get('content-type') or '').split(';')[0]
+    if (request.method in ('GET', 'HEAD') and request.url.path.startswith('/api/')
+            and response.status_code == 200 and not streamed
+            and is_compressible(mimetype) and 'etag' not in response.headers):
+        etag = content_etag(response.body)
+        if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+            return set_etag(Response(status_code=304), etag, weak=True)
+        set_etag(response, etag, weak=True)
+
+    if (response.status_code != 200 or 'content-encoding' in response.headers
+            or not is_compressible(mimetype)):
+        return response
+    if 'etag' in response.headers and request.method not in ('GET', 'HEAD'):
+        # The task ETag sent back in If-Match has to stay strong
+        return response
+    if not streamed and len(response.body) < COMPRESS_MIN_BYTES:
+        return response
+    response.headers.add_vary_header('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('accept-encoding'))
+    if encoding is None:
+        return response
+    if streamed:
+        response.body_iterator = compress_stream_async(response.body_iterator, encoding)
+        del response.headers['content-length']
+    else:
+        response.body = compress(response.body, encoding)
+        response.headers['content-length'] = str(len(response.body))
+    response.headers['content-encoding'] = encoding
+    return response
+
+
+async def get_json(request, silent=False):
+    """request.get_json() semantics: 415 for non-JSON bodies, 400 for bad JSON"""
+    if request.headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+        if silent:
+            return None
+        raise HTTPException(415, 'Did not attempt to load JSON data because the request '
+                                 'Content-Type was not \'application/json\'.')
+    try:
+        return loads(await request.body())
+    except ValueError:
+        if silent:
+            return None
+        raise HTTPException(400, 'Failed to decode JSON object')
+
+
+def unauthorized():
+    return jsonify({'error': 'Unauthorized'}, 401)
+
+
+# --- Database ---
+class TimedAsyncCursor(AsyncClientCursor):
+    """Async cursor that reports each statement to metrics.py, like TimedCursor.
+
+    Binds parameters client-side, as psycopg2 does, so the SQL shared with
+    app.py runs unchanged (server-side binding rejects untyped parameters
+    such as `%s IS NULL`).
+    """
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+
+pool = AsyncConnectionPool(
+    os.environ.get('DATABASE_URL') or '',
+    min_size=int(os.environ.get('DB_POOL_MIN_SIZE', '1')),
+    max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', '5')),
+    kwargs={'row_factory': dict_row, 'cursor_factory': TimedAsyncCursor},
+    open=False,
+)
+
+
+def pool_stats():
+    """psycopg_pool stats under the names db.ConnectionPool.stats() uses"""
+    stats = pool.get_stats()
+    size = stats.get('pool_size', 0)
+    idle = stats.get('pool_available', 0)
+    return {
+        'size': size,
+        'idle': idle,
+        'in_use': size - idle,
+        'max_size': stats.get('pool_max', pool.max_size),
+        'checkouts': stats.get('requests_num', 0),
+        'checkout_failures': stats.get('requests_errors', 0),
+        'checkout_timeouts': stats.get('requests_errors', 0),
+        'connections_created': stats.get('connections_num', 0),
+        'connections_discarded': stats.get('connections_lost', 0),
+        'wait_time_total': stats.get('requests_wait_ms', 0) / 1000,
+        'requests_waiting': stats.get('requests_waiting', 0),
+    }
+
+
+async def publish_task_events(cur, event_type, tasks):
+    if tasks:
+        await cur.execute(PUBLISH_TASK_EVENTS_QUERY, task_event_params(event_type, tasks))
+
+
+async def handle_pool_timeout(request, exc):
+    return jsonify({'error': 'Database is busy, please retry'}, 503, {'Retry-After': '1'})
+
+
+async def handle_rate_limited(request, exc):
+    return jsonify({'error': 'Too many requests, please slow down'}, 429,
+                   {'Retry-After': retry_after_header(exc.retry_after)})
+
+
+async def handle_overloaded(request, exc):
+    return jsonify({'error': 'Server is busy, please retry'}, 503,
+                   {'Retry-After': retry_after_header(exc.retry_after)})
+
+
+# --- OAuth Configuration ---
+oauth = OAuth()
+google = oauth.register(
+    name='google',
+    client_id=os.environ.get('GOOGLE_CLIENT_ID'),
+    client_secret=os.environ.get('GOOGLE_CLIENT_SECRET'),
+    access_token_url='https://accounts.google.com/o/oauth2/token',
+    access_token_params=None,
+    authorize_url='https://accounts.google.com/o/oauth2/auth',
+    authorize_params=None,
+    api_base_url='https://www.googleapis.com/oauth2/v1/',
+    userinfo_endpoint='https://openidconnect.googleapis.com/v1/userinfo',
+    client_kwargs={'scope': 'openid email profile'},
+    jwks_uri='https://www.googleapis.com/oauth2/v3/certs',
+    server_metadata={'issuer': 'https://accounts.google.com'}
+)
+
+
+def session_user(record):
+    return {
+        'id': record['id'],
+        'name': record['name'],
+        'email': record['email'],
+        'avatar_url': record['avatar_url'],
+        'designation': record['designation'],
+        'is_profile_complete': record['is_profile_complete']
+    }
+
+
+# --- Routes ---
+# As in app.py: an exhausted pool reports busy rather than failing the check
+HEALTH_CHECKOUT_TIMEOUT = 0.5
+
+
+async def health(request):
+    try:
+        async with pool.connection(timeout=HEALTH_CHECKOUT_TIMEOUT) as conn:
+            await conn.execute('SELECT 1')
+    except PoolTimeout:
+        # psycopg_pool also times out while it cannot reconnect, so tell
+        # busy from down with a connection of our own
+        try:
+            conn = await psycopg.AsyncConnection.connect(pool.conninfo, connect_timeout=2)
+        except psycopg.Error:
+            return jsonify({'status': 'unavailable'}, 503)
+        await conn.close()
+        return jsonify({'status': 'busy'})
+    except psycopg.Error:
+        return jsonify({'status': 'unavailable'}, 503)
+    return jsonify({'status': 'ok'})
+
+
+async def metrics(request):
+    if METRICS_TOKEN and request.headers.get('authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Not authorized'}, 401)
+    body, content_type = render_metrics()
+    return Response(body, headers={'Content-Type': content_type})
+
+
+async def login(request):
+    return await google.authorize_redirect(request, f'{BACKEND_URL}/auth')
+
+
+async def auth(request):
+    token = await google.authorize_access_token(request)
+    user_info = token.get('userinfo')
+    if user_info:
+        user_info = dict(user_info)
+    else:
+        user_info = (await google.get('userinfo', token=token)).json()
+
+    google_id = user_info.get('sub') or user_info.get('id')
+    email = user_info.get('email')
+    name = user_info.get('name') or email
+    avatar_url = user_info.get('picture')
+
+    if not google_id or not email:
+        return PlainTextResponse('Could not retrieve user information from Google.', 400)
+
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute('SELECT * FROM users WHERE google_id = %s', (google_id,))
+        user = await cur.fetchone()
+        avatar_changed = user is not None and user['avatar_url'] != avatar_url
+
+        if not user:
+            await cur.execute(
+                '''INSERT INTO users (google_id, email, name, avatar_url, is_profile_complete)
+                   VALUES (%s, %s, %s, %s, FALSE) RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
+                (google_id, email, name, avatar_url)
+            )
+        else:
+            await cur.execute(
+                '''UPDATE users SET avatar_url = %s WHERE google_id = %s
+                   RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
+                (avatar_url, google_id)
+            )
+        user_record = await cur.fetchone()
+        await conn.commit()
+        if avatar_changed:
+            await invalidate_async(conn, 'users')
+
+    request.session['user'] = session_user(user_record)
+    return RedirectResponse(FRONTEND_URL, 302)
+
+
+async def logout(request):
+    request.session.clear()
+    return RedirectResponse(f'{FRONTEND_URL}/logged-out', 302)
+
+
+async def get_current_user(request):
+    if 'user' in request.session:
+        # Prevent caching
+        return jsonify(request.session['user'], headers={
+            'Cache-Control': 'no-cache, no-store, must-revalidate',
+            'Pragma': 'no-cache',
+            'Expires': '0',
+        })
+    return unauthorized()
+
+
+async def update_profile(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    data = await get_json(request)
+
+    name = data.get('name')
+    designation = data.get('designation')
+
+    if not name or not designation:
+        return jsonify({'error': 'Name and designation are required'}, 400)
+
+    try:
+        async with pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(
+                '''UPDATE users
+                   SET name = %s, designation = %s, is_profile_complete = TRUE, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = %s
+                   RETURNING id, name, email, avatar_url, designation, is_profile_complete''',
+                (name, designation, user_id)
+            )
+            updated_user = await cur.fetchone()
+            await conn.commit()
+            await invalidate_async(conn, 'users')
+
+        if not updated_user:
+            return jsonify({'error': 'User not found'}, 404)
+
+        request.session['user'] = session_user(updated_user)
+        return jsonify(request.session['user'])
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        print(f"Error updating profile: {e}")
+        return jsonify({'error': 'Database error occurred'}, 500)
+
+
+async def get_all_users(request):
+    if 'user' not in request.session:
+        return unauthorized()
+    return conditional_json(request, *await cached_async('users', load_users))
+
+
+async def load_users():
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute('''
+            SELECT id, name, email, avatar_url, designation
+            FROM users
+            WHERE is_profile_complete = TRUE
+            ORDER BY name
+        ''')
+        return await cur.fetchall()
+
+
+async def get_companies(request):
+    if 'user' not in request.session:
+        return unauthorized()
+    return conditional_json(request, *await cached_async('companies', load_companies))
+
+
+async def load_companies():
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute('SELECT name FROM companies ORDER BY name')
+        return [row['name'] for row in await cur.fetchall()]
+
+
+async def get_tasks(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    args = request.query_params
+    paginate = 'limit' in args or 'cursor' in args
+    try:
+        filters = parse_task_filters(args)
+        fields = parse_fields(args.get('fields'))
+        limit = parse_limit(args.get('limit')) if paginate else None
+        cursor = decode_cursor(args.get('cursor'), task_cursor_key(filters))
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    query, params = build_task_query(user_id, filters, fields, limit, cursor)
+
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(query, params)
+        tasks = await cur.fetchall()
+
+    return jsonify(task_list_result(tasks, limit))
+
+
+async def get_task_changes(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    args = request.query_params
+    task_type = args.get('type', 'my')
+    try:
+        since = decode_sync_token(args.get('since'))
+        limit = parse_limit(args.get('limit'))
+        fields = parse_fields(args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    query, params = build_task_changes_query(user_id, task_type, since, limit, fields)
+
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        if since:
+            # Tombstones this token may still need could have been pruned
+            await cur.execute(TOMBSTONE_HORIZON_QUERY)
+            if sync_token_expired(since, (await cur.fetchone())['pruned_before']):
+                return jsonify({'error': SYNC_EXPIRED_ERROR, 'resync_required': True}, 410)
+        await cur.execute(query, params)
+        changes = await cur.fetchall()
+        removed = []
+        if since:
+            tombstones_query, tombstones_params = build_tombstones_query(user_id, task_type, since[0])
+            await cur.execute(tombstones_query, tombstones_params)
+            removed = await cur.fetchall()
+        await cur.execute(SYNC_XMIN_QUERY)
+        sync = await cur.fetchone()
+
+    has_more = len(changes) > limit
+    if has_more:
+        changes = changes[:limit]
+        next_token = encode_sync_token(changes[-1]['change_xid'], changes[-1]['id'], sync['issued_at'])
+    else:
+        next_token = encode_sync_token(sync['xmin'], 0, sync['issued_at'])
+
+    changed_ids = {task['id'] for task in changes}
+    for task in changes:
+        del task['change_xid']
+
+    return jsonify({
+        'changes': changes,
+        'removed': [row for row in removed if row['id'] not in changed_ids],
+        'next_token': next_token,
+        'has_more': has_more
+    })
+
+
+async def get_task_calendar(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    args = request.query_params
+    try:
+        task_type = parse_due_task_type(args)
+        fields = parse_fields(args.get('fields'))
+        start, end = calendar_range(args, datetime.utcnow().date())
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    query, params = build_calendar_query(user_id, task_type, start, end, fields)
+
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(query, params)
+        tasks = await cur.fetchall()
+
+    return jsonify(calendar_result(tasks, start, end))
+
+
+async def get_overdue_tasks(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    args = request.query_params
+    paginate = 'limit' in args or 'cursor' in args
+    try:
+        task_type = parse_due_task_type(args)
+        fields = parse_fields(args.get('fields'))
+        limit = parse_limit(args.get('limit')) if paginate else None
+        cursor = decode_cursor(args.get('cursor'), 'due_date')
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    query, params = build_overdue_query(user_id, task_type, datetime.utcnow().date(), fields, limit, cursor)
+
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(query, params)
+        tasks = await cur.fetchall()
+
+    return jsonify(overdue_result(tasks, limit))
+
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_BATCH_SIZE = 2000
+
+
+def export_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+async def export_tasks(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    export_format = request.query_params.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}, 400)
+    try:
+        filters = parse_task_filters(request.query_params)
+        fields = parse_fields(request.query_params.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    query, params = build_task_query(user_id, filters, fields)
+
+    async def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            writer.writerow(fields)
+            yield buffer.getvalue()
+
+        async with pool.connection() as conn, conn.cursor(name='task_export') as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            await cur.execute(query, params)
+            while True:
+                rows = await cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if export_format == 'ndjson':
+                    # Encoded like every other JSON body (responses.dumps)
+                    yield b''.join(dumps({name: row[name] for name in fields}) + b'\n' for row in rows)
+                    continue
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([export_value(row[name]) for name in fields] for row in rows)
+                yield buffer.getvalue()
+
+    return StreamingResponse(generate(), media_type=EXPORT_FORMATS[export_format], headers={
+        'Content-Disposition': f'attachment; filename=tasks.{export_format}',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+async def create_task(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    data = await get_json(request)
+
+    title = data.get('title')
+    assigned_to_user_id = data.get('assigned_to_user_id')
+    if not title or not assigned_to_user_id:
+        return jsonify({'error': 'Title and assignee are required'}, 400)
+
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(TASK_INSERT_QUERY, (
+            title, data.get('description', ''), data.get('company'), data.get('priority', 'MEDIUM'),
+            user_id, assigned_to_user_id, data.get('due_date'),
+        ))
+        new_task = await cur.fetchone()
+        activity = task_activity(user_id, 'created', [new_task])
+        await publish_task_events(cur, 'created', [new_task])
+        await conn.commit()
+    await log_activity_async(activity)
+
+    return jsonify({'message': 'Task created successfully', 'id': new_task['id']}, 201)
+
+
+async def update_task(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    task_id = request.path_params['task_id']
+    user_id = request.session['user']['id']
+    data = await get_json(request)
+    changes = {field: data[field] for field in TASK_UPDATE_FIELDS if field in data}
+
+    expected_version = None
+    if_match = parse_etags(request.headers.get('if-match'))
+    if if_match and not if_match.star_tag:
+        etags = if_match.as_set()
+        expected_version = parse_task_etag(etags.pop(), task_id) if len(etags) == 1 else None
+        if expected_version is None:
+            return jsonify({'error': 'If-Match does not match this task'}, 412)
+
+    activity = []
+    async with pool.connection() as conn, conn.cursor() as cur:
+        if changes:
+            query, params = build_task_update(task_id, user_id, changes, expected_version)
+            await cur.execute(query, params)
+            task = await cur.fetchone()
+            if task:
+                activity = task_activity(user_id, 'updated', [task])
+                await publish_task_events(cur, 'updated', [task])
+                await conn.commit()
+        else:
+            await cur.execute(TASK_VISIBLE_QUERY, (task_id, user_id, user_id))
+            task = await cur.fetchone()
+            if task and expected_version is not None and task['version'] != expected_version:
+                task = None
+
+        if not task:
+            await cur.execute(TASK_VISIBLE_QUERY, (task_id, user_id, user_id))
+            current = await cur.fetchone()
+            if not current:
+                return jsonify({'error': 'Task not found or permission denied'}, 404)
+            response = jsonify({'error': 'Task was modified by someone else', 'task': current}, 412)
+            return set_etag(response, task_etag(current))
+
+    await log_activity_async(activity)
+    return set_etag(jsonify({'message': 'Task updated successfully', 'task': task}), task_etag(task))
+
+
+async def delete_task(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    task_id = request.path_params['task_id']
+    user_id = request.session['user']['id']
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(TASK_DELETE_QUERY, (task_id, user_id))
+        deleted_row = await cur.fetchone()
+        if deleted_row:
+            activity = task_activity(user_id, 'deleted', [deleted_row])
+            await publish_task_events(cur, 'deleted', [deleted_row])
+        await conn.commit()
+
+    if deleted_row:
+        await log_activity_async(activity)
+        return jsonify({'message': 'Task deleted successfully'})
+    return jsonify({'error': 'Task not found or permission denied'}, 404)
+
+
+async def get_task_activity(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    task_id = request.path_params['task_id']
+    user_id = request.session['user']['id']
+    try:
+        limit = parse_limit(request.query_params.get('limit'))
+        cursor = decode_cursor(request.query_params.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    query, params = build_task_activity_query(task_id, user_id, limit, cursor)
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(query, params)
+        activity = await cur.fetchall()
+        if not activity:
+            await cur.execute(TASK_VISIBLE_QUERY, (task_id, user_id, user_id))
+            if not await cur.fetchone():
+                return jsonify({'error': 'Task not found or permission denied'}, 404)
+
+    return jsonify(task_activity_result(activity, limit))
+
+
+async def import_tasks(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    # The upload is read whole, so its size must be known up front
+    content_length = request.headers.get('content-length')
+    if content_length is None:
+        return jsonify({'error': 'Content-Length is required'}, 411)
+    if not content_length.isdigit() or int(content_length) > MAX_IMPORT_BYTES:
+        return jsonify({'error': IMPORT_TOO_LARGE_ERROR}, 413)
+
+    user_id = request.session['user']['id']
+    content_type = request.headers.get('content-type', '')
+    upload = None
+    if content_type.startswith('multipart/form-data'):
+        upload = (await request.form()).get('file')
+    try:
+        if upload and hasattr(upload, 'read'):
+            text = decode_import(await upload.read())
+            content_type = upload.content_type or ''
+        else:
+            text = decode_import(await request.body())
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    import_format = request.query_params.get('format') or ('ndjson' if 'ndjson' in content_type else 'csv')
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}, 400)
+
+    async with pool.connection() as conn, conn.cursor() as cur:
+        try:
+            parsed, errors, emails = collect_import_rows(parse_import_rows(text, import_format))
+        except (ValueError, csv.Error) as e:
+            return jsonify({'error': str(e)}, 400)
+        await cur.execute(IMPORT_USERS_QUERY, (emails,))
+        users_by_email = {user['email']: user['id'] for user in await cur.fetchall()}
+        await cur.execute(IMPORT_COMPANIES_QUERY)
+        companies = {company['name'] for company in await cur.fetchall()}
+        valid, errors = check_import_rows(parsed, errors, users_by_email, companies)
+
+        created = []
+        if valid:
+            await cur.execute(CREATE_STAGING_TABLE)
+            async with cur.copy(COPY_STAGING_SQL) as copy:
+                await copy.write(import_rows_csv(valid))
+            await cur.execute(INSERT_FROM_STAGING, (user_id,))
+            created = await cur.fetchall()
+            await publish_task_events(cur, 'created', created)
+            await conn.commit()
+
+    return jsonify({
+        'imported': len(created),
+        'failed': len(errors),
+        'errors': errors
+    }, 201 if created else 200)
+
+
+SSE_HEARTBEAT_SECONDS = 15
+
+
+async def stream_task_events(request):
+    """Server-Sent Events feed, as in app.py, without holding a thread"""
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    last_event_id = request.headers.get('last-event-id') or request.query_params.get('last_event_id')
+    subscription = get_broker().subscribe(user_id, last_event_id, AsyncSubscription)
+
+    async def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                event = await subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield format_sse(event)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={'X-Accel-Buffering': 'no'})
+
+
+async def create_tasks_batch(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    try:
+        items = get_batch_items(await get_json(request, silent=True), 'tasks')
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    results, rows = parse_batch_creates(items)
+
+    activity = []
+    async with pool.connection() as conn, conn.cursor() as cur:
+        if rows:
+            await cur.execute(BATCH_USERS_QUERY, (list({assignee for _, _, assignee in rows}),))
+            rows = drop_unknown_assignees(results, rows, {row['id'] for row in await cur.fetchall()})
+
+        if rows:
+            await cur.execute(BATCH_INSERT_QUERY, batch_insert_params(user_id, rows))
+            new_tasks = sorted(await cur.fetchall(), key=lambda row: row['id'])
+            activity = task_activity(user_id, 'created', new_tasks)
+            await publish_task_events(cur, 'created', new_tasks)
+            await conn.commit()
+            for (index, _, _), new_task in zip(rows, new_tasks):
+                results[index] = {'index': index, 'id': new_task['id'], 'status': 'created'}
+    await log_activity_async(activity)
+
+    return jsonify({'results': results})
+
+
+async def update_tasks_batch(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    try:
+        items = get_batch_items(await get_json(request, silent=True), 'updates')
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    results, updates, indexes_by_id = parse_batch_updates(items)
+
+    updated_ids = set()
+    conflict_ids = set()
+    activity = []
+    if updates:
+        async with pool.connection() as conn, conn.cursor() as cur:
+            assignees = batch_update_assignees(updates)
+            if assignees:
+                await cur.execute(BATCH_USERS_QUERY, (assignees,))
+                known_users = {row['id'] for row in await cur.fetchall()}
+                updates = drop_unknown_update_assignees(results, updates, indexes_by_id, known_users)
+
+            if updates:
+                await cur.execute(BATCH_UPDATE_QUERY, {'user_id': user_id, 'updates': json.dumps(updates)})
+                updated_tasks = await cur.fetchall()
+                updated_ids = {row['id'] for row in updated_tasks}
+                activity = task_activity(user_id, 'updated', updated_tasks)
+                await publish_task_events(cur, 'updated', updated_tasks)
+                await conn.commit()
+
+            failed_ids = [task_id for task_id in indexes_by_id if task_id not in updated_ids]
+            if failed_ids:
+                await cur.execute(BATCH_VISIBLE_IDS_QUERY, {'user_id': user_id, 'ids': failed_ids})
+                conflict_ids = {row['id'] for row in await cur.fetchall()}
+    await log_activity_async(activity)
+
+    return jsonify({'results': batch_update_results(results, indexes_by_id, updated_ids, conflict_ids)})
+
+
+async def delete_tasks_batch(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    try:
+        items = get_batch_items(await get_json(request, silent=True), 'ids')
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    task_ids = [as_task_id(item) for item in items]
+    valid_ids = [task_id for task_id in task_ids if task_id is not None]
+
+    deleted_ids = set()
+    activity = []
+    if valid_ids:
+        async with pool.connection() as conn, conn.cursor() as cur:
+            await cur.execute(BATCH_DELETE_QUERY, {'user_id': user_id, 'ids': valid_ids})
+            deleted_tasks = await cur.fetchall()
+            deleted_ids = {row['id'] for row in deleted_tasks}
+            activity = task_activity(user_id, 'deleted', deleted_tasks)
+            await publish_task_events(cur, 'deleted', deleted_tasks)
+            await conn.commit()
+    await log_activity_async(activity)
+
+    return jsonify({'results': batch_delete_results(task_ids, deleted_ids)})
+
+
+async def get_weekly_report(request):
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    try:
+        start, end = report_range(request.query_params, datetime.utcnow().date())
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(TASK_REPORT_QUERY, {'user_id': user_id, 'from': start, 'to': end})
+        report = await cur.fetchone()
+
+    return jsonify(weekly_report_result(report, start, end))
+
+
+async def get_bootstrap(request):
+    """app.py's /api/bootstrap; the task and report statements are sent
+    together in pipeline mode, so they cost one round trip
+    """
+    if 'user' not in request.session:
+        return unauthorized()
+
+    user_id = request.session['user']['id']
+    args = request.query_params
+    try:
+        sections = parse_sections(args.get('sections'))
+        fields = parse_fields(args.get('fields'))
+        limit = parse_limit(args.get('limit')) if 'limit' in args else None
+        start, end = report_range(args, datetime.utcnow().date())
+    except ValueError as e:
+        return jsonify({'error': str(e)}, 400)
+
+    result = {}
+    if 'me' in sections:
+        result['me'] = request.session['user']
+    if 'users' in sections:
+        result['users'] = (await cached_async('users', load_users))[0]
+    if 'companies' in sections:
+        result['companies'] = (await cached_async('companies', load_companies))[0]
+
+    queries = build_bootstrap_queries(user_id, sections, fields, limit, start, end)
+    if queries:
+        async with pool.connection() as conn:
+            cursors = []
+            async with conn.pipeline():
+                for section, query, params in queries:
+                    cur = conn.cursor()
+                    await cur.execute(query, params)
+                    cursors.append((section, cur))
+            for section, cur in cursors:
+                result[section] = bootstrap_section_result(section, await cur.fetchall(), limit, start, end)
+                await cur.close()
+
+    return jsonify(result)
+
+
+def release_after(response, release):
+    """ASGI app that sends `response`, then calls `release`, even if the
+    client goes away mid-stream
+    """
+    async def send_response(scope, receive, send):
+        try:
+            await response(scope, receive, send)
+        finally:
+            release()
+    return send_response
+
+
+def route(path, handler, methods=('GET',), uses_session=True):
+    """Route that labels metrics with the handler name, like a Flask endpoint.
+
+    Flask sends `Vary: Cookie` whenever a view touches the session, which
+    every route except the probes does; uses_session=False opts out.
+    /api/ routes go through admission control (admission.py) first; the
+    concurrency slot is held until the response has been sent.
+    """
+    name = handler.__name__
+
+    async def endpoint(request):
+        name_request(name)
+        if uses_session:
+            request.session.accessed = True
+        if not request.url.path.startswith('/api/'):
+            return add_etag_and_compress(request, await handler(request))
+
+        user = request.session.get('user')
+        check_rate_limit(user['id'] if user else None, name)
+        if not needs_slot(name):
+            return add_etag_and_compress(request, await handler(request))
+        await async_limiter.acquire(name)
+        try:
+            response = add_etag_and_compress(request, await handler(request))
+        except BaseException:
+            async_limiter.release()
+            raise
+        return release_after(response, async_limiter.release)
+    return Route(path, endpoint, methods=list(methods), name=name)
+
+
+routes = [
+    route('/health', health, uses_session=False),
+    route('/metrics', metrics, uses_session=False),
+    route('/login', login),
+    route('/auth', auth),
+    route('/logout', logout),
+    route('/api/me', get_current_user),
+    route('/api/profile', update_profile, ['PUT']),
+    route('/api/users', get_all_users),
+    route('/api/companies', get_companies),
+    route('/api/tasks', get_tasks),
+    route('/api/tasks', create_task, ['POST']),
+    route('/api/tasks/changes', get_task_changes),
+    route('/api/tasks/calendar', get_task_calendar),
+    route('/api/tasks/overdue', get_overdue_tasks),
+    route('/api/tasks/export', export_tasks),
+    route('/api/tasks/import', import_tasks, ['POST']),
+    route('/api/tasks/stream', stream_task_events),
+    route('/api/tasks/batch', create_tasks_batch, ['POST']),
+    route('/api/tasks/batch', update_tasks_batch, ['PATCH']),
+    route('/api/tasks/batch', delete_tasks_batch, ['DELETE']),
+    route('/api/tasks/{task_id:int}', update_task, ['PUT']),
+    route('/api/tasks/{task_id:int}', delete_task, ['DELETE']),
+    route('/api/tasks/{task_id:int}/activity', get_task_activity),
+    route('/api/reports/weekly', get_weekly_report),
+    route('/api/bootstrap', get_bootstrap),
+]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await pool.open()
+    try:
+        yield
+    finally:
+        await pool.close()
+        await asyncio.to_thread(flush_activity)
+
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=[FRONTEND_URL, 'http://localhost:3000'],
+                   allow_credentials=True, allow_methods=['*'], allow_headers=['*']),
+        Middleware(ApiHeadersMiddleware),
+        Middleware(FlaskSessionMiddleware, secret_key=SECRET_KEY),
+    ],
+    exception_handlers={
+        PoolTimeout: handle_pool_timeout,
+        RateLimited: handle_rate_limited,
+        Overloaded: handle_overloaded,
+    },
+    lifespan=lifespan,
+)
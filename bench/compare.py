@@ -0,0 +1,162 @@
+"""Benchmark the sync (app.py) and async (asgi_app.py) servers side by side.
+
+    python -m bench.compare --workers 2 --concurrency 32 --duration 60
+    python -m bench.compare ... --streams 50 --save bench/baselines/compare.json
+
+Starts app:app under gunicorn in both of gunicorn.conf.py's worker modes
+(sync: gthread, gevent) and asgi_app:app under uvicorn (async), with the
+same worker count and database, runs bench.loadtest's scenario mix against
+each in turn, and prints their totals next to each other. --streams holds
+that many /api/tasks/stream connections open for the whole run, the
+slow-client load that ties up a sync worker thread per connection.
+
+Needs the same setup as bench.loadtest: FLASK_SECRET_KEY, DATABASE_URL and
+a database filled by bench.seed. Per-user rate limits are turned off in
+both servers; the concurrency limit stays.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+from bench.loadtest import run
+from bench.session import load_bench_users, session_cookie
+
+SERVERS = {
+    'sync': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers), 'app:app',
+    ],
+    'gevent': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers), 'app:app',
+    ],
+    'async': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--host', '127.0.0.1', '--port', str(port),
+        '--workers', str(workers), '--log-level', 'warning',
+    ],
+}
+SERVER_ENV = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'gthread'},
+    'gevent': {'GUNICORN_WORKER_CLASS': 'gevent'},
+}
+
+
+def start_server(name, port, workers, timeout=30):
+    # A handful of bench users make more requests than any real user would
+    env = dict(os.environ, RATE_LIMITS_ENABLED='false', **SERVER_ENV.get(name, {}))
+    process = subprocess.Popen(SERVERS[name](port, workers), env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{name} server exited with status {process.returncode}')
+        try:
+            if requests.get(base_url + '/health', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{name} server did not become healthy within {timeout}s')
+
+
+def hold_streams(base_url, cookie, count, stop):
+    """Open `count` event streams and keep reading them until `stop` is set"""
+    opened = []
+
+    def listen():
+        session = requests.Session()
+        session.cookies.set(*cookie)
+        try:
+            with session.get(base_url + '/api/tasks/stream', stream=True, timeout=(5, 30)) as response:
+                opened.append(response.ok)
+                for _ in response.iter_lines():
+                    if stop.is_set():
+                        break
+        except requests.RequestException:
+            opened.append(False)
+
+    threads = [threading.Thread(target=listen, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, opened
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='server processes for each app')
+    parser.add_argument('--port', type=int, default=5101, help='first of two ports to serve on')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds per server')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds first')
+    parser.add_argument('--users', type=int, default=100, help='bench users to log in as')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenario', action='append', help='only run these scenarios (repeatable)')
+    parser.add_argument('--streams', type=int, default=0, help='event streams to hold open during the run')
+    parser.add_argument('--server', action='append', choices=sorted(SERVERS), help='only benchmark these')
+    parser.add_argument('--save', help='write both result sets to this JSON file')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    os.environ.setdefault('FLASK_ENV', 'production')
+    from app import app
+
+    users = load_bench_users(os.environ.get('DATABASE_URL'), args.users)
+    if not users:
+        parser.error('no bench users found; run python -m bench.seed first')
+
+    results = {}
+    for offset, name in enumerate(args.server or sorted(SERVERS, reverse=True)):
+        process, base_url = start_server(name, args.port + offset, args.workers)
+        stop = threading.Event()
+        try:
+            companies = requests.Session()
+            companies.cookies.set(*session_cookie(app, users[0]))
+            company_names = companies.get(base_url + '/api/companies', timeout=30).json()
+
+            opened = []
+            if args.streams:
+                _, opened = hold_streams(base_url, session_cookie(app, users[0]), args.streams, stop)
+                time.sleep(1)
+            print(f'{name}: {args.concurrency} workers for {args.duration:.0f}s against {base_url}'
+                  + (f' with {args.streams} open streams' if args.streams else ''))
+            results[name] = run(base_url, users, company_names, app, args.concurrency, args.duration,
+                                args.warmup, args.seed, set(args.scenario or ()))
+            results[name]['streams_opened'] = sum(opened)
+        finally:
+            stop.set()
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                # gthread workers wait out the graceful timeout for the load
+                # test's still-open keep-alive connections
+                process.kill()
+                process.wait()
+
+    print(f"\n{'server':<10}{'count':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'streams':>9}")
+    for name, result in results.items():
+        total = result.get('total')
+        if total is None:
+            # Every request outlived the run, e.g. all workers held by streams
+            print(f"{name:<10}{'no requests completed':>50}{result['streams_opened']:>9}")
+            continue
+        print(f"{name:<10}{total['count']:>8}{total['errors']:>6}{total['rps']:>9.1f}{total['p50_ms']:>9.1f}"
+              f"{total['p95_ms']:>9.1f}{total['p99_ms']:>9.1f}{result['streams_opened']:>9}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f'\nSaved results to {args.save}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+"""Drive the /api routes at a fixed concurrency and record latency percentiles.
+
+    python -m bench.loadtest --base-url http://localhost:5001 --concurrency 16 \\
+        --duration 60 --save bench/baselines/main.json
+    python -m bench.loadtest ... --compare bench/baselines/main.json
+
+Run it against a server started with the same FLASK_SECRET_KEY, a
+database filled by bench.seed and RATE_LIMITS_ENABLED=false (see
+admission.py). Each worker thread logs in as a bench user
+(see bench/session.py) and picks weighted scenarios from SCENARIOS with
+its own seeded RNG. Writes only touch tasks the load test created itself.
+/api/tasks/stream is not driven: it is a long-lived connection, not a
+request with a latency.
+
+Results are per scenario count, error count, throughput and p50/p95/p99
+latency. --save writes them as a JSON baseline; --compare prints the
+change against a saved baseline and exits with status 1 when a
+scenario's p95, or the total throughput, is worse by more than
+--threshold percent. Scenarios with fewer than --min-samples requests in
+either run are shown but not judged, as their p95 is mostly noise.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import requests
+from dotenv import load_dotenv
+
+from bench.seed import WORDS
+from bench.session import load_bench_users, session_cookie
+
+TASK_TYPES = ('my', 'assigned', 'all')
+DUE_TASK_TYPES = ('my', 'assigned')
+STATUSES = ('TODO', 'IN_PROGRESS', 'DONE')
+PRIORITIES = ('HIGH', 'MEDIUM', 'LOW')
+
+
+class Worker:
+    def __init__(self, base_url, cookie, user, companies, rng):
+        self.base_url = base_url.rstrip('/')
+        self.http = requests.Session()
+        self.http.cookies.set(*cookie)
+        self.user = user
+        self.companies = companies
+        self.rng = rng
+        self.created = []  # ids of tasks this worker created and has not deleted
+        self.sync_token = None
+
+    def request(self, method, path, **kwargs):
+        return self.http.request(method, self.base_url + path, timeout=60, **kwargs)
+
+    def task_filters(self):
+        params = {'type': self.rng.choice(TASK_TYPES)}
+        if self.rng.random() < 0.4:
+            params['status'] = self.rng.choice(STATUSES)
+        if self.rng.random() < 0.2:
+            params['priority'] = self.rng.choice(PRIORITIES)
+        if self.companies and self.rng.random() < 0.2:
+            params['company'] = self.rng.choice(self.companies)
+        return params
+
+    def new_task(self):
+        return {
+            'title': f'Bench {self.rng.choice(WORDS)} {self.rng.choice(WORDS)}',
+            'description': 'Created by bench.loadtest',
+            'priority': self.rng.choice(PRIORITIES),
+            'assigned_to_user_id': self.user['id'],
+        }
+
+
+# --- Scenarios ---
+# Each takes a Worker and returns the response to time
+
+def me(w):
+    return w.request('GET', '/api/me')
+
+
+def update_profile(w):
+    return w.request('PUT', '/api/profile', json={
+        'name': w.user['name'], 'designation': w.user['designation'] or 'Engineer',
+    })
+
+
+def list_users(w):
+    return w.request('GET', '/api/users')
+
+
+def list_companies(w):
+    return w.request('GET', '/api/companies')
+
+
+def list_tasks_legacy(w):
+    return w.request('GET', '/api/tasks', params={'type': 'my', 'status': w.rng.choice(STATUSES)})
+
+
+def list_tasks_page(w):
+    params = w.task_filters()
+    params['limit'] = 50
+    response = w.request('GET', '/api/tasks', params=params)
+    # Follow the cursor now and then, like a client scrolling
+    if response.ok and w.rng.random() < 0.3 and response.json().get('next_cursor'):
+        params['cursor'] = response.json()['next_cursor']
+        return w.request('GET', '/api/tasks', params=params)
+    return response
+
+
+def search_tasks(w):
+    params = w.task_filters()
+    params.update(limit=50, search=w.rng.choice(WORDS))
+    return w.request('GET', '/api/tasks', params=params)
+
+
+def search_tasks_fulltext(w):
+    params = w.task_filters()
+    params.update(limit=50, search=w.rng.choice(WORDS), search_mode='fulltext')
+    return w.request('GET', '/api/tasks', params=params)
+
+
+def task_changes(w):
+    params = {'type': 'my', 'limit': 200}
+    if w.sync_token:
+        params['since'] = w.sync_token
+    response = w.request('GET', '/api/tasks/changes', params=params)
+    if response.ok:
+        w.sync_token = response.json()['next_token']
+    return response
+
+
+def export_tasks(w):
+    params = {'type': 'my', 'status': 'TODO', 'format': w.rng.choice(('csv', 'ndjson'))}
+    response = w.request('GET', '/api/tasks/export', params=params)
+    response.content  # read the whole stream
+    return response
+
+
+def create_task(w):
+    response = w.request('POST', '/api/tasks', json=w.new_task())
+    if response.ok:
+        w.created.append(response.json()['id'])
+    return response
+
+
+def update_task(w):
+    if not w.created:
+        return create_task(w)
+    task_id = w.rng.choice(w.created)
+    return w.request('PUT', f'/api/tasks/{task_id}', json={'status': w.rng.choice(STATUSES)})
+
+
+def task_activity(w):
+    if not w.created:
+        return create_task(w)
+    task_id = w.rng.choice(w.created)
+    response = w.request('GET', f'/api/tasks/{task_id}/activity', params={'limit': 20})
+    if response.ok and w.rng.random() < 0.3 and response.json().get('next_cursor'):
+        return w.request('GET', f'/api/tasks/{task_id}/activity',
+                         params={'limit': 20, 'cursor': response.json()['next_cursor']})
+    return response
+
+
+def delete_task(w):
+    if not w.created:
+        return create_task(w)
+    return w.request('DELETE', f'/api/tasks/{w.created.pop()}')
+
+
+def import_tasks(w):
+    lines = ['title,assignee_email,priority']
+    for _ in range(20):
+        lines.append(f"Imported {w.rng.choice(WORDS)},{w.user['email']},{w.rng.choice(PRIORITIES)}")
+    return w.request('POST', '/api/tasks/import', params={'format': 'csv'},
+                     data='\n'.join(lines), headers={'Content-Type': 'text/csv'})
+
+
+def batch_create(w):
+    response = w.request('POST', '/api/tasks/batch', json={'tasks': [w.new_task() for _ in range(20)]})
+    if response.ok:
+        w.created.extend(r['id'] for r in response.json()['results'] if 'id' in r)
+    return response
+
+
+def batch_update(w):
+    if len(w.created) < 20:
+        return batch_create(w)
+    ids = w.rng.sample(w.created, 20)
+    return w.request('PATCH', '/api/tasks/batch', json={
+        'updates': [{'id': task_id, 'status': w.rng.choice(STATUSES)} for task_id in ids],
+    })
+
+
+def batch_delete(w):
+    if len(w.created) < 20:
+        return batch_create(w)
+    ids = [w.created.pop() for _ in range(20)]
+    return w.request('DELETE', '/api/tasks/batch', json={'ids': ids})
+
+
+def weekly_report(w):
+    return w.request('GET', '/api/reports/weekly')
+
+
+def due_calendar(w):
+    # A week view, now and then a month, within a few weeks of today
+    today = date.today()
+    start = today - timedelta(days=today.weekday() + 7 * w.rng.randint(-4, 4))
+    days = 7 if w.rng.random() < 0.8 else 35
+    return w.request('GET', '/api/tasks/calendar', params={
+        'type': w.rng.choice(DUE_TASK_TYPES),
+        'from': start.isoformat(),
+        'to': (start + timedelta(days=days - 1)).isoformat(),
+    })
+
+
+def overdue_tasks(w):
+    params = {'type': w.rng.choice(DUE_TASK_TYPES), 'limit': 50}
+    response = w.request('GET', '/api/tasks/overdue', params=params)
+    if response.ok and w.rng.random() < 0.3 and response.json().get('next_cursor'):
+        params['cursor'] = response.json()['next_cursor']
+        return w.request('GET', '/api/tasks/overdue', params=params)
+    return response
+
+
+def bootstrap(w):
+    # A dashboard load: every section, task lists paged like the UI does
+    return w.request('GET', '/api/bootstrap', params={'limit': 50})
+
+
+# (name, weight, scenario): roughly the mix of a team using the UI
+SCENARIOS = [
+    ('me', 5, me),
+    ('update_profile', 1, update_profile),
+    ('users', 5, list_users),
+    ('companies', 5, list_companies),
+    ('tasks_legacy', 2, list_tasks_legacy),
+    ('tasks_page', 25, list_tasks_page),
+    ('tasks_search', 8, search_tasks),
+    ('tasks_search_fulltext', 4, search_tasks_fulltext),
+    ('tasks_changes', 5, task_changes),
+    ('tasks_export', 1, export_tasks),
+    ('task_create', 6, create_task),
+    ('task_update', 8, update_task),
+    ('task_activity', 3, task_activity),
+    ('task_delete', 3, delete_task),
+    ('tasks_import', 1, import_tasks),
+    ('tasks_batch_create', 1, batch_create),
+    ('tasks_batch_update', 1, batch_update),
+    ('tasks_batch_delete', 1, batch_delete),
+    ('weekly_report', 8, weekly_report),
+    ('bootstrap', 5, bootstrap),
+    ('tasks_calendar', 4, due_calendar),
+    ('tasks_overdue', 4, overdue_tasks),
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """samples: list of (scenario, seconds, ok) -> per-scenario and total stats"""
+    by_name = {}
+    for name, seconds, ok in samples:
+        by_name.setdefault(name, []).append((seconds, ok))
+    if samples:
+        by_name['total'] = [(seconds, ok) for _, seconds, ok in samples]
+
+    results = {}
+    for name, entries in sorted(by_name.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in entries)
+        results[name] = {
+            'count': len(entries),
+            'errors': sum(1 for _, ok in entries if not ok),
+            'rps': round(len(entries) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2),
+        }
+    return results
+
+
+def run(base_url, users, companies, app, concurrency, duration, warmup, seed, only):
+    scenarios = [s for s in SCENARIOS if not only or s[0] in only]
+    names = [name for name, _, _ in scenarios]
+    weights = [weight for _, weight, _ in scenarios]
+    samples = []
+    samples_lock = threading.Lock()
+    start_at = time.monotonic() + warmup
+    stop_at = start_at + duration
+
+    def work(index):
+        rng = random.Random(seed * 1000 + index)
+        user = users[index % len(users)]
+        worker = Worker(base_url, session_cookie(app, user), user, companies, rng)
+        local = []
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            name = rng.choices(names, weights)[0]
+            scenario = scenarios[names.index(name)][2]
+            started = time.perf_counter()
+            try:
+                ok = scenario(worker).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if now >= start_at:
+                local.append((name, elapsed, ok))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=work, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, duration)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None, threshold=None, min_samples=0):
+    regressions = []
+    header = f"{'scenario':<24}{'count':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+    if baseline:
+        header += f"{'p95 Δ':>9}{'rps Δ':>9}"
+    print(header)
+    for name, r in results.items():
+        line = (f"{name:<24}{r['count']:>8}{r['errors']:>6}{r['rps']:>9.1f}"
+                f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+        base = (baseline or {}).get(name)
+        if base:
+            p95_change = (r['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0.0
+            rps_change = (r['rps'] - base['rps']) / base['rps'] * 100 if base['rps'] else 0.0
+            line += f'{p95_change:>+8.1f}%{rps_change:>+8.1f}%'
+            # Per-scenario throughput just follows the random mix, so only
+            # the total is judged on it
+            judged = min(r['count'], base['count']) >= min_samples
+            if judged and (p95_change > threshold or (name == 'total' and rps_change < -threshold)):
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:5001')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds first')
+    parser.add_argument('--users', type=int, default=100, help='bench users to log in as')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenario', action='append', help='only run these scenarios (repeatable)')
+    parser.add_argument('--save', help='write results to this JSON baseline')
+    parser.add_argument('--compare', help='JSON baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed regression in percent')
+    parser.add_argument('--min-samples', type=int, default=50, help='fewest requests to judge a scenario')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    # The app is only imported to sign session cookies with its secret key
+    os.environ.setdefault('FLASK_ENV', 'production')
+    from app import app
+
+    dsn = os.environ.get('DATABASE_URL')
+    users = load_bench_users(dsn, args.users)
+    if not users:
+        parser.error('no bench users found; run python -m bench.seed first')
+    companies = requests.Session()
+    companies.cookies.set(*session_cookie(app, users[0]))
+    response = companies.get(args.base_url.rstrip('/') + '/api/companies', timeout=30)
+    response.raise_for_status()
+    company_names = response.json()
+
+    print(f'Running {args.concurrency} workers for {args.duration:.0f}s against {args.base_url}')
+    results = run(args.base_url, users, company_names, app, args.concurrency, args.duration,
+                  args.warmup, args.seed, set(args.scenario or ()))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    regressions = print_results(results, baseline, args.threshold, args.min_samples)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'recorded_at': datetime.now(timezone.utc).isoformat(),
+                    'git_revision': git_revision(),
+                    'base_url': args.base_url,
+                    'concurrency': args.concurrency,
+                    'duration': args.duration,
+                    'users': len(users),
+                    'seed': args.seed,
+                    'scenarios': sorted(args.scenario or ()),
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f'\nSaved baseline to {args.save}')
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
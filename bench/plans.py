@@ -0,0 +1,291 @@
+"""Query-plan regression check for the hot task queries.
+
+    python -m bench.seed --users 1000 --tasks 1000000 --reset
+    python -m bench.plans
+
+Builds every query shape the task routes can generate with the same
+builders the app uses (task_queries.py) and runs EXPLAIN (FORMAT JSON) on
+each, without executing it. Each shape has an expectation: the relations
+that must never be read with a Seq Scan, and a ceiling on the plan's total
+cost. Ceilings are fractions of the cost of a full scan of the table, so
+they stay meaningful as the dataset grows. Exits with status 1 if any
+shape breaks its expectation, so it can run in CI after bench.seed.
+
+Plans on small tables are not representative (the planner rightly prefers
+sequential scans there), hence --min-tasks. tasks is partitioned (see
+migrations/0003_partition_tasks.py); scans of its partitions count as
+scans of tasks, and a partition too small to index usefully is not
+flagged.
+"""
+import argparse
+import itertools
+import os
+import sys
+from datetime import date, timedelta
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+from task_queries import (
+    BATCH_DELETE_QUERY, BATCH_UPDATE_QUERY, BATCH_VISIBLE_IDS_QUERY, DEFAULT_PAGE_SIZE,
+    DUE_TASK_TYPES, TASK_DELETE_QUERY, TASK_REPORT_QUERY, TASK_VISIBLE_QUERY, build_calendar_query,
+    build_overdue_query, build_task_activity_query, build_task_changes_query, build_task_query,
+    build_task_update, build_tombstones_query,
+)
+
+TASK_TYPES = ('my', 'assigned', 'all')
+SEARCH_MODES = (None, 'title', 'fulltext')
+PAGES = ('all', 'first', 'next')
+
+# Cost ceilings as a fraction of a sequential scan of the table read, by
+# how much of it a shape inherently has to touch
+ROW_COST = 0.001     # one row by primary key
+BATCH_COST = 0.02    # a batch of ids
+PAGE_COST = 0.05     # one page of an index-ordered list
+SCOPED_COST = 0.1    # everything visible to one user
+SEARCH_COST = 1.0    # ranking/filtering every match; never worse than a full scan
+
+# Below this many rows a Seq Scan is the cheapest plan and is not flagged
+SMALL_TABLE_ROWS = 10000
+
+
+class Shape:
+    def __init__(self, name, query, params, no_seq_scan=('tasks',), max_cost=None, scan_table='tasks',
+                 by_id=False):
+        self.name = name
+        self.query = query
+        self.params = params
+        self.no_seq_scan = no_seq_scan
+        self.max_cost = max_cost  # fraction of a full scan of scan_table
+        self.scan_table = scan_table
+        # Lookups by id cannot be pruned (tasks is partitioned on archived),
+        # so they probe every partition's primary key and the ceiling scales
+        self.by_id = by_id
+
+
+def task_list_shapes(user_id, status, priority, company, search_word):
+    """get_tasks / export: every type x filter x search x page combination"""
+    # A page well into the list, not just the newest rows
+    cursor = ((date.today() - timedelta(days=180)).isoformat(), 2 ** 31 - 1)
+    for task_type, with_status, with_priority, with_company, search_mode, page, include_archived in itertools.product(
+            TASK_TYPES, (False, True), (False, True), (False, True), SEARCH_MODES, PAGES, (False, True)):
+        filters = {
+            'include_archived': include_archived,
+            'type': task_type,
+            'status': status if with_status else None,
+            'priority': priority if with_priority else None,
+            'company': company if with_company else None,
+            'search': search_word if search_mode else '',
+            'search_mode': search_mode or 'title',
+        }
+        limit = None if page == 'all' else DEFAULT_PAGE_SIZE
+        page_cursor = cursor if page == 'next' else None
+        if page_cursor and search_mode == 'fulltext':
+            page_cursor = ('0.05', 2 ** 31 - 1)
+        query, params = build_task_query(user_id, filters, None, limit, page_cursor)
+
+        name = '/'.join([
+            f'tasks type={task_type}',
+            *(f'{key}' for key in ('status', 'priority', 'company') if filters[key]),
+            f'search={search_mode}' if search_mode else 'no-search',
+            f'page={page}',
+            *(['include_archived'] if include_archived else []),
+        ])
+        if task_type != 'all':
+            yield Shape(name, query, params, max_cost=SCOPED_COST)
+        elif page == 'all':
+            # Unpaginated, unscoped lists return most of the table by
+            # design; a sequential scan is the right plan for them
+            yield Shape(name, query, params, no_seq_scan=())
+        elif search_mode:
+            yield Shape(name, query, params, max_cost=SEARCH_COST)
+        else:
+            yield Shape(name, query, params, max_cost=PAGE_COST)
+
+
+def task_sync_shapes(user_id, since_xid):
+    for task_type, since in itertools.product(TASK_TYPES, (None, (since_xid, 0))):
+        query, params = build_task_changes_query(user_id, task_type, since, DEFAULT_PAGE_SIZE)
+        name = f"changes type={task_type}/{'since' if since else 'initial'}"
+        yield Shape(name, query, params, max_cost=PAGE_COST if task_type == 'all' else SCOPED_COST)
+        if since:
+            query, params = build_tombstones_query(user_id, task_type, since_xid)
+            yield Shape(f'tombstones type={task_type}', query, params, no_seq_scan=('task_tombstones',),
+                        max_cost=SCOPED_COST, scan_table='task_tombstones')
+
+
+def task_write_shapes(user_id, task_id):
+    for changes, version in itertools.product(
+            ({'status': 'DONE'}, {'title': 'x', 'priority': 'HIGH', 'due_date': None}), (None, 3)):
+        query, params = build_task_update(task_id, user_id, changes, version)
+        name = f"update_task fields={','.join(changes)}/{'if-match' if version else 'unconditional'}"
+        yield Shape(name, query, params, max_cost=ROW_COST, by_id=True)
+    yield Shape('update_task no-changes', TASK_VISIBLE_QUERY, (task_id, user_id, user_id), max_cost=ROW_COST,
+                by_id=True)
+    yield Shape('delete_task', TASK_DELETE_QUERY, (task_id, user_id), max_cost=ROW_COST, by_id=True)
+
+    ids = list(range(task_id, task_id + 20))
+    updates = '[' + ','.join(f'{{"id": {i}, "status": "DONE"}}' for i in ids) + ']'
+    yield Shape('batch update', BATCH_UPDATE_QUERY, {'updates': updates, 'user_id': user_id}, max_cost=BATCH_COST,
+                by_id=True)
+    yield Shape('batch visible ids', BATCH_VISIBLE_IDS_QUERY, {'ids': ids, 'user_id': user_id}, max_cost=BATCH_COST,
+                by_id=True)
+    yield Shape('batch delete', BATCH_DELETE_QUERY, {'ids': ids, 'user_id': user_id}, max_cost=BATCH_COST,
+                by_id=True)
+
+
+def task_activity_shapes(user_id, task_id):
+    cursor = ((date.today() - timedelta(days=30)).isoformat(), 2 ** 62)
+    for page, page_cursor in (('first', None), ('next', cursor)):
+        query, params = build_task_activity_query(task_id, user_id, DEFAULT_PAGE_SIZE, page_cursor)
+        yield Shape(f'task activity page={page}', query, params, no_seq_scan=('task_activity', 'tasks'),
+                    max_cost=PAGE_COST, scan_table='task_activity')
+
+
+def due_date_shapes(user_id):
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+    cursor = ((today - timedelta(days=30)).isoformat(), 0)
+    for task_type in DUE_TASK_TYPES:
+        for name, (start, end) in (('week', (monday, monday + timedelta(days=6))),
+                                   ('quarter', (monday, monday + timedelta(days=90)))):
+            query, params = build_calendar_query(user_id, task_type, start, end)
+            yield Shape(f'calendar type={task_type}/{name}', query, params, max_cost=SCOPED_COST)
+        for page, limit, page_cursor in (('all', None, None), ('first', DEFAULT_PAGE_SIZE, None),
+                                         ('next', DEFAULT_PAGE_SIZE, cursor)):
+            query, params = build_overdue_query(user_id, task_type, today, None, limit, page_cursor)
+            yield Shape(f'overdue type={task_type}/page={page}', query, params,
+                        max_cost=SCOPED_COST if page == 'all' else PAGE_COST)
+
+
+def report_shapes(user_id):
+    # The team-wide totals read every user's rollup rows in the range, so
+    # the ceiling is only "cheaper than reading the whole rollup"
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+    ranges = {
+        'this week': (monday, today),
+        'last week': (monday - timedelta(days=7), monday - timedelta(days=1)),
+    }
+    for name, (start, end) in ranges.items():
+        yield Shape(f'weekly_report {name}', TASK_REPORT_QUERY, {'user_id': user_id, 'from': start, 'to': end},
+                    no_seq_scan=('task_daily_rollup',), max_cost=SEARCH_COST, scan_table='task_daily_rollup')
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def explain(cur, query, params):
+    cur.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+    return cur.fetchone()['QUERY PLAN'][0]['Plan']
+
+
+def partition_roots(cur, table):
+    """Leaf partition name -> `table`; a plain table maps to itself"""
+    cur.execute('SELECT relid::regclass::text AS name FROM pg_partition_tree(%s) WHERE isleaf', (table,))
+    return {row['name']: table for row in cur.fetchall()}
+
+
+def check_shape(cur, shape, scan_costs, table_rows, roots):
+    plan = explain(cur, shape.query, shape.params)
+    nodes = list(plan_nodes(plan))
+    problems = []
+    for node in nodes:
+        relation = node.get('Relation Name')
+        if (node['Node Type'] == 'Seq Scan' and roots.get(relation) in shape.no_seq_scan
+                and table_rows[relation] >= SMALL_TABLE_ROWS):
+            problems.append(f'Seq Scan on {relation}')
+    if shape.max_cost is not None:
+        ceiling = shape.max_cost * scan_costs[shape.scan_table]
+        if shape.by_id:
+            ceiling *= sum(1 for root in roots.values() if root == shape.scan_table)
+        if plan['Total Cost'] > ceiling:
+            problems.append(f"cost {plan['Total Cost']:.0f} > {ceiling:.0f}")
+    indexes = sorted({node['Index Name'] for node in nodes if 'Index Name' in node})
+    return plan, problems, indexes
+
+
+def pick_sample(cur):
+    """A typical user (median task count), the busiest company and one of the user's tasks"""
+    cur.execute('''
+        SELECT assigned_to_user_id AS user_id FROM tasks
+        WHERE assigned_to_user_id IS NOT NULL
+        GROUP BY assigned_to_user_id
+        ORDER BY count(*) DESC
+    ''')
+    users = [row['user_id'] for row in cur.fetchall()]
+    cur.execute('SELECT company FROM tasks WHERE company IS NOT NULL GROUP BY company ORDER BY count(*) DESC LIMIT 1')
+    company = cur.fetchone()['company']
+    user_id = users[len(users) // 2]
+    cur.execute('SELECT id FROM tasks WHERE assigned_by_user_id = %s LIMIT 1', (user_id,))
+    task_id = cur.fetchone()['id']
+    cur.execute('SELECT (pg_snapshot_xmin(pg_current_snapshot())::text::bigint - 1000)::text AS xid')
+    since_xid = cur.fetchone()['xid']
+    return user_id, company, task_id, since_xid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--min-tasks', type=int, default=500000,
+                        help='refuse to judge plans on a smaller tasks table')
+    parser.add_argument('--search', default='report', help='search term for search shapes')
+    parser.add_argument('--user-id', type=int, help='plan for this user instead of the median one')
+    parser.add_argument('--verbose', action='store_true', help='print every shape, not only failures')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    conn = psycopg2.connect(os.environ.get('DATABASE_URL'), cursor_factory=RealDictCursor)
+    cur = conn.cursor()
+
+    scan_costs = {}
+    table_rows = {}
+    roots = {}
+    for table in ('tasks', 'task_tombstones', 'task_daily_rollup', 'task_activity'):
+        # Floor for near-empty tables, whose ceilings would otherwise be ~0
+        plan = explain(cur, f'SELECT * FROM {table}', ())
+        scan_costs[table] = max(plan['Total Cost'], 1000.0)
+        table_rows[table] = plan['Plan Rows']
+        for partition, root in partition_roots(cur, table).items():
+            roots[partition] = root
+            table_rows[partition] = explain(cur, f'SELECT * FROM {partition}', ())['Plan Rows']
+    if table_rows['tasks'] < args.min_tasks:
+        parser.error(f"tasks has about {table_rows['tasks']} rows; seed at least {args.min_tasks} with bench.seed")
+
+    user_id, company, task_id, since_xid = pick_sample(cur)
+    user_id = args.user_id or user_id
+    shapes = itertools.chain(
+        task_list_shapes(user_id, 'TODO', 'HIGH', company, args.search),
+        task_sync_shapes(user_id, since_xid),
+        task_write_shapes(user_id, task_id),
+        task_activity_shapes(user_id, task_id),
+        due_date_shapes(user_id),
+        report_shapes(user_id),
+    )
+
+    failures = 0
+    total = 0
+    for shape in shapes:
+        total += 1
+        plan, problems, indexes = check_shape(cur, shape, scan_costs, table_rows, roots)
+        if problems:
+            failures += 1
+        if problems or args.verbose:
+            status = 'FAIL' if problems else 'ok'
+            print(f"{status:<5}{shape.name:<70}{plan['Total Cost']:>12.0f}  {', '.join(indexes) or '-'}")
+            for problem in problems:
+                print(f'       {problem}')
+    conn.rollback()
+    conn.close()
+
+    print(f'\n{total - failures}/{total} query shapes within expectations '
+          f"(user {user_id}, tasks seq scan cost {scan_costs['tasks']:.0f})")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
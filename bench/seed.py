@@ -0,0 +1,173 @@
+"""Create the schema and fill it with a synthetic, skewed dataset.
+
+    python -m bench.seed --users 1000 --tasks 5000000 --reset
+
+Runs migrate.py first, then generates users, companies and tasks inside
+Postgres with generate_series. random() is seeded with --seed, so the same
+arguments always produce the same data. Assignees, assigners and companies
+follow a power-law skew (a few very busy users and big clients, a long
+tail of quiet ones), recent tasks are more common than old ones, and old
+tasks are more likely to be DONE.
+
+--reset TRUNCATEs tasks and their history tables, so it refuses to run
+against a non-local database unless --allow-remote is given.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+import psycopg2
+from dotenv import load_dotenv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_USER_PREFIX = 'bench-'
+
+WORDS = (
+    'invoice onboarding report dashboard migration review contract audit budget '
+    'campaign release hotfix proposal meeting deadline pipeline customer vendor '
+    'design prototype roadmap payroll hiring training feedback analytics search '
+    'billing security backup deploy landing pricing survey newsletter partner'
+).split()
+DESIGNATIONS = ['Engineer', 'Designer', 'Manager', 'Analyst', 'Sales', 'Support', 'Operations']
+
+INSERT_USERS = '''
+    INSERT INTO users (google_id, email, name, designation, is_profile_complete)
+    SELECT %(prefix)s || g, 'bench' || g || '@example.com', 'Bench User ' || g,
+           (%(designations)s::text[])[1 + g %% cardinality(%(designations)s::text[])], TRUE
+    FROM generate_series(1, %(count)s) AS g
+    ON CONFLICT (google_id) DO NOTHING
+'''
+
+INSERT_COMPANIES = '''
+    INSERT INTO companies (name)
+    SELECT 'Bench Company ' || g FROM generate_series(1, %(count)s) AS g
+    ON CONFLICT (name) DO NOTHING
+'''
+
+# The OFFSET 0 keeps the subquery from being flattened, so each row's
+# random draws are made once and can be shared between columns
+INSERT_TASKS = '''
+    INSERT INTO tasks (title, description, company, priority, status, assigned_by_user_id,
+                       assigned_to_user_id, due_date, created_at, updated_at)
+    SELECT
+        initcap(w[1 + floor(r.w1 * nw)::int]) || ' ' || w[1 + floor(r.w2 * nw)::int] || ' '
+            || w[1 + floor(r.w3 * nw)::int],
+        'Follow up on the ' || w[1 + floor(r.w4 * nw)::int] || ' and ' || w[1 + floor(r.w5 * nw)::int]
+            || ' for the ' || w[1 + floor(r.w6 * nw)::int] || ' team',
+        CASE WHEN r.company < 0.1 THEN NULL
+             ELSE c[1 + floor(power((r.company - 0.1) / 0.9, 2) * nc)::int] END,
+        CASE WHEN r.priority < 0.2 THEN 'HIGH' WHEN r.priority < 0.75 THEN 'MEDIUM' ELSE 'LOW' END,
+        CASE WHEN r.status < 0.2 + 0.6 * r.age THEN 'DONE'
+             WHEN r.status < 0.45 + 0.45 * r.age THEN 'IN_PROGRESS'
+             ELSE 'TODO' END,
+        u[1 + floor(power(r.assigner, 2) * nu)::int],
+        u[1 + floor(power(r.assignee, 1.5) * nu)::int],
+        CASE WHEN r.due < 0.7 THEN (now() - r.age * %(days)s * interval '1 day')::date + (1 + floor(r.due * 40))::int END,
+        now() - r.age * %(days)s * interval '1 day',
+        now() - r.age * r.touched * %(days)s * interval '1 day'
+    FROM (
+        SELECT power(random(), 2) AS age, random() AS touched, random() AS status,
+               random() AS priority, random() AS company, random() AS assigner,
+               random() AS assignee, random() AS due, random() AS w1, random() AS w2,
+               random() AS w3, random() AS w4, random() AS w5, random() AS w6
+        FROM generate_series(1, %(count)s)
+        OFFSET 0
+    ) AS r,
+    (SELECT %(words)s::text[] AS w, cardinality(%(words)s::text[]) AS nw) AS words,
+    (SELECT array_agg(id ORDER BY id) AS u, count(*) AS nu FROM users
+     WHERE google_id LIKE %(prefix)s || '%%') AS users,
+    (SELECT array_agg(name ORDER BY id) AS c, count(*) AS nc FROM companies) AS companies
+'''
+
+
+def is_local(dsn):
+    if '://' not in dsn:
+        # key=value DSN; treat a missing host as local
+        params = dict(part.split('=', 1) for part in dsn.split() if '=' in part)
+        host = params.get('host', '')
+    else:
+        parsed = urlparse(dsn)
+        host = parsed.hostname or ''
+        if 'host=' in parsed.query:
+            host = parsed.query.split('host=', 1)[1].split('&', 1)[0]
+    return host in ('', 'localhost', '127.0.0.1', '::1') or host.startswith('/')
+
+
+def run_migrations(dsn):
+    print('--- Running migrate.py ---')
+    subprocess.run(
+        [sys.executable, os.path.join(REPO_ROOT, 'migrate.py')],
+        cwd=REPO_ROOT, env=dict(os.environ, DATABASE_URL=dsn), check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def seed(dsn, users, tasks, companies, days, batch_size, seed_value, reset):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    if reset:
+        print('--- Resetting task data ---')
+        cur.execute('TRUNCATE tasks, task_tombstones, task_daily_rollup RESTART IDENTITY')
+        cur.execute('DELETE FROM users WHERE google_id LIKE %s', (BENCH_USER_PREFIX + '%',))
+
+    cur.execute('SELECT setseed(%s)', (seed_value,))
+    cur.execute(INSERT_USERS, {'prefix': BENCH_USER_PREFIX, 'designations': DESIGNATIONS, 'count': users})
+    print(f'  ✓ {cur.rowcount} bench users')
+    cur.execute(INSERT_COMPANIES, {'count': companies})
+    print(f'  ✓ {cur.rowcount} bench companies')
+
+    print(f'--- Generating {tasks} tasks ---')
+    started = time.monotonic()
+    inserted = 0
+    while inserted < tasks:
+        count = min(batch_size, tasks - inserted)
+        cur.execute(INSERT_TASKS, {
+            'count': count, 'days': days, 'words': WORDS, 'prefix': BENCH_USER_PREFIX,
+        })
+        inserted += count
+        rate = inserted / (time.monotonic() - started)
+        print(f'  {inserted}/{tasks} ({rate:.0f} rows/s)')
+
+    # Sets hint bits and the visibility map so index-only scans behave as
+    # they would on a settled production table
+    print('--- VACUUM ANALYZE ---')
+    cur.execute('VACUUM (ANALYZE) tasks')
+    cur.execute('VACUUM (ANALYZE) users')
+    cur.execute('VACUUM (ANALYZE) task_daily_rollup')
+    cur.close()
+    conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--companies', type=int, default=50, help='bench companies added to the defaults')
+    parser.add_argument('--days', type=int, default=730, help='spread created_at over this many days')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--seed', type=float, default=0.42, help='random() seed, between -1 and 1')
+    parser.add_argument('--reset', action='store_true', help='truncate tasks and remove bench users first')
+    parser.add_argument('--skip-schema', action='store_true', help='do not run migrate.py')
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        parser.error('DATABASE_URL environment variable is not set')
+    if args.reset and not is_local(dsn) and not args.allow_remote:
+        parser.error('refusing to --reset a non-local database without --allow-remote')
+
+    if not args.skip_schema:
+        run_migrations(dsn)
+    seed(dsn, args.users, args.tasks, args.companies, args.days, args.batch_size, args.seed, args.reset)
+    print('\n=== Seed complete ===')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Test-only session injection for benchmarks.
+
+Builds the signed session cookie that /auth would set after a Google login,
+so load tests can call the API as any user without going through OAuth.
+Only works with the server's FLASK_SECRET_KEY; nothing in the app itself
+accepts unauthenticated logins.
+"""
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from bench.seed import BENCH_USER_PREFIX
+
+SESSION_USER_COLUMNS = ('id', 'name', 'email', 'avatar_url', 'designation', 'is_profile_complete')
+
+
+def session_cookie(app, user):
+    """(cookie name, value) for a session logged in as `user`"""
+    serializer = app.session_interface.get_signing_serializer(app)
+    if serializer is None:
+        raise RuntimeError('FLASK_SECRET_KEY must be set to sign session cookies')
+    session_user = {column: user.get(column) for column in SESSION_USER_COLUMNS}
+    return app.config['SESSION_COOKIE_NAME'], serializer.dumps({'user': session_user})
+
+
+def load_bench_users(dsn, limit):
+    """Bench users created by bench.seed, busiest assignees first"""
+    with psycopg2.connect(dsn, cursor_factory=RealDictCursor) as conn, conn.cursor() as cur:
+        cur.execute(f'''
+            SELECT {', '.join(SESSION_USER_COLUMNS)} FROM users
+            WHERE google_id LIKE %s
+            ORDER BY id
+            LIMIT %s
+        ''', (BENCH_USER_PREFIX + '%', limit))
+        users = cur.fetchall()
+    conn.close()
+    return users
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import threading
+import time
+
+from listener import get_listener
+from responses import content_etag, dumps
+
+# Channel used to tell every worker process to drop a cache key
+INVALIDATION_CHANNEL = 'cache_invalidation'
+
+
+def compute_etag(value):
+    """Strong (unquoted) ETag of `value`; the same as the response body's hash"""
+    return content_etag(dumps(value))
+
+
+class TTLCache:
+    """In-process read-through cache of (value, etag) pairs.
+
+    Entries expire after ``ttl`` seconds and can be dropped explicitly with
+    ``invalidate``. Each key carries a generation number, so a load that
+    started before an invalidation is never stored over the newer state.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}  # key -> (value, etag, expires_at)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._async_load_locks = {}
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry[2] > now:
+            return entry[0], entry[1]
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread per key goes to the database on a miss
+        with load_lock:
+            entry = self._entries.get(key)
+            if entry and entry[2] > time.monotonic():
+                return entry[0], entry[1]
+
+            generation = self._generations.get(key, 0)
+            value = loader()
+            etag = compute_etag(value)
+            with self._lock:
+                if self._generations.get(key, 0) == generation:
+                    self._entries[key] = (value, etag, time.monotonic() + self.ttl)
+            return value, etag
+
+    async def get_or_load_async(self, key, loader):
+        """get_or_load for coroutine loaders, one load per key per event loop"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry[2] > now:
+            return entry[0], entry[1]
+
+        with self._lock:
+            load_lock = self._async_load_locks.setdefault(key, asyncio.Lock())
+
+        async with load_lock:
+            entry = self._entries.get(key)
+            if entry and entry[2] > time.monotonic():
+                return entry[0], entry[1]
+
+            generation = self._generations.get(key, 0)
+            value = await loader()
+            etag = compute_etag(value)
+            with self._lock:
+                if self._generations.get(key, 0) == generation:
+                    self._entries[key] = (value, etag, time.monotonic() + self.ttl)
+            return value, etag
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
+
+
+cache = TTLCache(ttl=float(os.environ.get('CACHE_TTL_SECONDS', '300')))
+
+# When enabled, invalidations are broadcast with NOTIFY so every gunicorn
+# worker drops its copy, not only the one that handled the write
+CROSS_WORKER_INVALIDATION = os.environ.get('CACHE_INVALIDATION_NOTIFY', '').lower() in ('1', 'true', 'yes')
+
+_subscribed_pid = None
+_subscribe_lock = threading.Lock()
+
+
+def _ensure_subscribed():
+    global _subscribed_pid
+    if _subscribed_pid == os.getpid():
+        return
+    with _subscribe_lock:
+        if _subscribed_pid != os.getpid():
+            get_listener().add(
+                INVALIDATION_CHANNEL,
+                lambda key: cache.invalidate(key),
+                on_reconnect=cache.clear,
+            )
+            _subscribed_pid = os.getpid()
+
+
+def cached(key, loader):
+    """Return (value, etag) for `key`, calling `loader` on a miss"""
+    if CROSS_WORKER_INVALIDATION:
+        _ensure_subscribed()
+    return cache.get_or_load(key, loader)
+
+
+async def cached_async(key, loader):
+    """cached() for coroutine loaders"""
+    if CROSS_WORKER_INVALIDATION:
+        _ensure_subscribed()
+    return await cache.get_or_load_async(key, loader)
+
+
+def invalidate(conn, *keys):
+    """Drop `keys` after a committed write made with `conn`"""
+    cache.invalidate(*keys)
+    if CROSS_WORKER_INVALIDATION:
+        with conn.cursor() as cur:
+            for key in keys:
+                cur.execute('SELECT pg_notify(%s, %s)', (INVALIDATION_CHANNEL, key))
+        conn.commit()
+
+
+async def invalidate_async(conn, *keys):
+    """invalidate() for an async (psycopg 3) connection"""
+    cache.invalidate(*keys)
+    if CROSS_WORKER_INVALIDATION:
+        async with conn.cursor() as cur:
+            for key in keys:
+                await cur.execute('SELECT pg_notify(%s, %s)', (INVALIDATION_CHANNEL, key))
+        await conn.commit()
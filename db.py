@@ -0,0 +1,395 @@
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg
+import psycopg2
+from psycopg.rows import dict_row
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+from metrics import TimedCursor, record_query, record_read_route
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe Postgres connection pool with health checks on checkout.
+
+    Connections are created lazily up to ``maxconn`` and kept open between
+    requests. A connection that has been idle for longer than
+    ``health_check_after`` seconds is pinged before being handed out, and
+    any connection that comes back broken is discarded instead of reused.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=5.0,
+                 health_check_after=30.0, cursor_factory=RealDictCursor):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.cursor_factory = cursor_factory
+
+        self._idle = []  # list of (connection, returned_at)
+        self._size = 0
+        self._lock = threading.Condition()
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'checkout_timeouts': 0,
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=self.cursor_factory)
+        with self._lock:
+            self._stats['connections_created'] += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._stats['connections_discarded'] += 1
+            self._lock.notify()
+
+    def getconn(self, timeout=None):
+        """Check out a healthy connection, waiting up to ``timeout`` seconds
+        (the pool's own timeout unless given; 0 never waits)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn = None
+            idle_for = 0.0
+            create = False
+
+            with self._lock:
+                if self._closed:
+                    raise PoolTimeout('Connection pool is closed')
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['checkout_failures'] += 1
+                        self._stats['checkout_timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No database connection available after {timeout}s'
+                        )
+                    self._lock.wait(remaining)
+
+                if self._idle:
+                    # LIFO keeps the hottest connections in use and lets the
+                    # rest age out through the idle health check
+                    conn, returned_at = self._idle.pop()
+                    idle_for = time.monotonic() - returned_at
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    conn = self._connect()
+                except psycopg2.Error:
+                    with self._lock:
+                        self._size -= 1
+                        self._stats['checkout_failures'] += 1
+                        self._lock.notify()
+                    raise
+            elif not self._is_healthy(conn, idle_for):
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += waited
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            return conn
+
+    def putconn(self, conn):
+        """Return a connection, resetting any open transaction first"""
+        healthy = not conn.closed
+        if healthy:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+                healthy = conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+            except psycopg2.Error:
+                healthy = False
+
+        if not healthy:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            if self._closed:
+                self._size -= 1
+                conn.close()
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            for conn, _ in self._idle:
+                conn.close()
+            self._size -= len(self._idle)
+            self._idle = []
+            self._lock.notify_all()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.maxconn
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        return stats
+
+
+class ReplicaSet:
+    """Round-robin over read replicas, skipping any that lag too far behind.
+
+    Each replica has its own ConnectionPool. Replication lag is measured on
+    a checked-out connection at most every ``check_interval`` seconds; a
+    replica more than ``max_lag`` seconds behind, or one that cannot be
+    reached, is skipped until its next check. Checkouts never wait on a
+    replica whose pool is exhausted: the next replica, or the primary, is
+    used straight away.
+    """
+
+    LAG_QUERY = '''
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END AS lag
+    '''
+
+    def __init__(self, dsns, max_lag=5.0, check_interval=2.0, **pool_kwargs):
+        # No eager connections, so a replica that is down at startup does
+        # not stop the app from booting
+        self.pools = [ConnectionPool(dsn, minconn=0, **pool_kwargs) for dsn in dsns]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag = [None] * len(dsns)  # None: unreachable or not checked yet
+        self._checked_at = [None] * len(dsns)
+        self._next = itertools.count()
+
+    def _measure(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(self.LAG_QUERY)
+            return float(cur.fetchone()['lag'])
+
+    def checkout(self):
+        """(pool, connection) from the next usable replica, or None"""
+        start = next(self._next)
+        for offset in range(len(self.pools)):
+            index = (start + offset) % len(self.pools)
+            pool = self.pools[index]
+            checked_at = self._checked_at[index]
+            stale = checked_at is None or time.monotonic() - checked_at >= self.check_interval
+            if not stale and (self._lag[index] is None or self._lag[index] > self.max_lag):
+                continue
+
+            try:
+                conn = pool.getconn(timeout=0)
+            except PoolTimeout:
+                # Busy, not unhealthy: leave its lag alone
+                continue
+            except psycopg2.Error:
+                self._lag[index], self._checked_at[index] = None, time.monotonic()
+                continue
+            if stale:
+                try:
+                    self._lag[index] = self._measure(conn)
+                except psycopg2.Error:
+                    self._lag[index] = None
+                self._checked_at[index] = time.monotonic()
+                if self._lag[index] is None or self._lag[index] > self.max_lag:
+                    pool.putconn(conn)
+                    continue
+            return pool, conn
+        return None
+
+    def stats(self):
+        return [
+            dict(pool.stats(), lag=self._lag[index])
+            for index, pool in enumerate(self.pools)
+        ]
+
+
+# --- Process-wide pool ---
+# Each gunicorn worker builds its own pool on first use. The pid check makes
+# sure a pool inherited through fork (e.g. with --preload) is never shared
+# between processes.
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(
+                os.environ.get('DATABASE_URL'),
+                minconn=int(os.environ.get('DB_POOL_MIN_SIZE', '1')),
+                maxconn=int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+                timeout=float(os.environ.get('DB_POOL_TIMEOUT', '5')),
+                health_check_after=float(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', '30')),
+                cursor_factory=TimedCursor,
+            )
+            _pool_pid = pid
+    return _pool
+
+
+_replicas = None
+_replicas_pid = None
+
+
+def replica_urls():
+    return [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+
+def get_replicas():
+    """This process's ReplicaSet, or None when no replicas are configured"""
+    global _replicas, _replicas_pid
+    pid = os.getpid()
+    if _replicas_pid == pid:
+        return _replicas
+    with _pool_lock:
+        if _replicas_pid != pid:
+            urls = replica_urls()
+            _replicas = ReplicaSet(
+                urls,
+                max_lag=float(os.environ.get('DB_REPLICA_MAX_LAG', '5')),
+                check_interval=float(os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', '2')),
+                maxconn=int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+                timeout=float(os.environ.get('DB_POOL_TIMEOUT', '5')),
+                health_check_after=float(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', '30')),
+                cursor_factory=TimedCursor,
+            ) if urls else None
+            _replicas_pid = pid
+    return _replicas
+
+
+@contextmanager
+def get_db_connection(timeout=None):
+    """Borrow a pooled connection for the duration of a ``with`` block.
+
+    The connection always goes back to the pool, and any transaction left
+    open (including one aborted by an exception) is rolled back. `timeout`
+    overrides the pool's checkout timeout.
+    """
+    pool = get_pool()
+    conn = pool.getconn(timeout)
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+class TimedClientCursor(psycopg.ClientCursor):
+    """psycopg 3 cursor reporting to metrics.py like TimedCursor, with
+    psycopg2's client-side parameter binding so the same SQL runs unchanged
+    """
+
+    def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+
+@contextmanager
+def get_copy_connection():
+    """Like get_db_connection, for work that needs COPY.
+
+    Under gevent workers psycogreen's wait callback makes psycopg2 refuse
+    COPY, so this opens a dedicated psycopg 3 connection instead. It needs
+    no callback: gevent's monkey patching makes its socket waits
+    cooperative. Either connection is committed by the caller.
+    """
+    if extensions.get_wait_callback() is None:
+        with get_db_connection() as conn:
+            yield conn
+        return
+    with psycopg.connect(get_pool().dsn, row_factory=dict_row, cursor_factory=TimedClientCursor) as conn:
+        yield conn
+
+
+@contextmanager
+def get_read_connection(use_primary=False):
+    """Like get_db_connection, but served by a replica when one is usable.
+
+    Falls back to the primary when no replicas are configured, all of them
+    are lagging or unreachable, or `use_primary` is set (read-your-writes).
+    Only use it for read-only work.
+    """
+    replicas = None if use_primary else get_replicas()
+    checkout = replicas.checkout() if replicas else None
+    if checkout is None:
+        record_read_route('primary')
+        with get_db_connection() as conn:
+            yield conn
+        return
+
+    record_read_route('replica')
+    pool, conn = checkout
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    return _pool.stats()
+
+
+def replica_stats():
+    replicas = get_replicas()
+    return replicas.stats() if replicas else None
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+from collections import deque
+
+from listener import get_listener
+
+# --- Task change events ---
+# Write paths publish events with pg_notify inside their transaction, so an
+# event is delivered only if (and when) the write commits. Event ids come
+# from a database sequence, which makes them the same in every worker and
+# lets a client resume on any worker with Last-Event-ID. An update that
+# reassigned a task also carries the previous assignee, who has to hear
+# that the task left their view.
+TASK_EVENTS_CHANNEL = 'task_events'
+
+PUBLISH_TASK_EVENTS_QUERY = '''
+    SELECT pg_notify(%(channel)s, json_build_object(
+        'id', nextval('task_event_seq'),
+        'type', %(type)s,
+        'task_id', e.id,
+        'assigned_to_user_id', e.assigned_to_user_id,
+        'assigned_by_user_id', e.assigned_by_user_id,
+        'previous_assigned_to_user_id', e.previous_assigned_to_user_id,
+        'at', now()
+    )::text)
+    FROM jsonb_to_recordset(%(tasks)s::jsonb)
+         AS e(id INTEGER, assigned_to_user_id INTEGER, assigned_by_user_id INTEGER,
+              previous_assigned_to_user_id INTEGER)
+'''
+
+BACKLOG_SIZE = int(os.environ.get('TASK_EVENTS_BACKLOG', '1000'))
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+def task_event_params(event_type, tasks):
+    """PUBLISH_TASK_EVENTS_QUERY params for rows with id/assignee keys"""
+    payload = [
+        {
+            'id': task['id'],
+            'assigned_to_user_id': task.get('assigned_to_user_id'),
+            'assigned_by_user_id': task.get('assigned_by_user_id'),
+            'previous_assigned_to_user_id': task.get('previous_assigned_to_user_id'),
+        }
+        for task in tasks
+    ]
+    return {
+        'channel': TASK_EVENTS_CHANNEL,
+        'type': f'task.{event_type}',
+        'tasks': json.dumps(payload),
+    }
+
+
+def publish_task_events(cur, event_type, tasks):
+    """Queue `task.<event_type>` notifications for rows with id/assignee keys"""
+    if tasks:
+        cur.execute(PUBLISH_TASK_EVENTS_QUERY, task_event_params(event_type, tasks))
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def wants(self, event):
+        return self.user_id in (
+            event.get('assigned_to_user_id'),
+            event.get('assigned_by_user_id'),
+            event.get('previous_assigned_to_user_id'),
+        )
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A client this far behind has to resync anyway; replace its
+            # backlog with a single reset
+            self.reset()
+
+    def reset(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.queue.put_nowait({'type': 'reset'})
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within `timeout` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """Subscription for an asyncio stream (see asgi_app.py).
+
+    The broker pushes from the listener thread, so every queue operation
+    is handed to the subscriber's event loop.
+    """
+
+    def __init__(self, broker, user_id):
+        super().__init__(broker, user_id)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, event):
+        self.loop.call_soon_threadsafe(self._push, event)
+
+    def reset(self):
+        self.loop.call_soon_threadsafe(self._reset)
+
+    def _push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._reset()
+
+    def _reset(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({'type': 'reset'})
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """Fans task events from the shared LISTEN connection out to subscribers.
+
+    Keeps the last BACKLOG_SIZE events in arrival order. NOTIFY delivers in
+    commit order to every listener, so a Last-Event-ID seen by any worker
+    can be resumed from here as long as it is still in the backlog.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._backlog = deque(maxlen=BACKLOG_SIZE)
+        self._lock = threading.Lock()
+
+    def on_notify(self, payload):
+        event = json.loads(payload)
+        with self._lock:
+            self._backlog.append(event)
+            subscribers = [s for s in self._subscribers if s.wants(event)]
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def on_reconnect(self):
+        # Anything published while the listener was down is lost
+        with self._lock:
+            self._backlog.clear()
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.reset()
+
+    def subscribe(self, user_id, last_event_id=None, subscription_class=Subscription):
+        subscription = subscription_class(self, user_id)
+        with self._lock:
+            if last_event_id is not None:
+                ids = [str(event['id']) for event in self._backlog]
+                if str(last_event_id) in ids:
+                    start = ids.index(str(last_event_id)) + 1
+                    for event in list(self._backlog)[start:]:
+                        if subscription.wants(event):
+                            subscription.push(event)
+                else:
+                    subscription.reset()
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+_broker = None
+_broker_pid = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker, _broker_pid
+    pid = os.getpid()
+    with _broker_lock:
+        if _broker is None or _broker_pid != pid:
+            _broker = EventBroker()
+            _broker_pid = pid
+            get_listener().add(TASK_EVENTS_CHANNEL, _broker.on_notify, _broker.on_reconnect)
+    return _broker
+
+
+def format_sse(event):
+    if event.get('type') == 'reset':
+        return 'event: reset\ndata: {}\n\n'
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
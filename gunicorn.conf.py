@@ -0,0 +1,86 @@
+"""Gunicorn settings for app:app, picked up from the working directory.
+
+    gunicorn app:app
+    GUNICORN_WORKER_CLASS=gevent gunicorn app:app
+
+Worker modes (GUNICORN_WORKER_CLASS):
+
+* gthread (default): each worker process runs GUNICORN_THREADS request
+  threads, by default one per pooled connection (DB_POOL_MAX_SIZE). A
+  thread blocked on Postgres only holds up its own request.
+* gevent: requests run in greenlets, and psycopg2 is made cooperative with
+  psycogreen, so a worker overlaps up to GUNICORN_WORKER_CONNECTIONS
+  requests on a single thread. Waiting on the database or holding open an
+  /api/tasks/stream connection costs a greenlet instead of a thread.
+  psycopg2 cannot COPY in this mode, so /api/tasks/import runs on a
+  psycopg 3 connection of its own (db.get_copy_connection). Needs `gevent`
+  and `psycogreen`.
+
+WEB_CONCURRENCY sets the number of worker processes; the default is one
+per available core, since each process runs Python on one core at a time
+and the threads or greenlets cover the waiting. Every worker has its own
+connection pool, so keep WEB_CONCURRENCY * DB_POOL_MAX_SIZE below the
+database's max_connections.
+
+The app is preloaded: imported once in the master and shared
+copy-on-write with the forked workers, which start faster and use less
+memory. Nothing that holds a socket or a thread is created at import
+time. db.py's pools, listener.py's LISTEN thread, events.py's broker and
+activity.py's writer are created on first use and keyed by process id, so
+each worker opens its own after the fork. Sessions live in the signed cookie, so any
+worker can serve any request.
+
+Throughput for each mode is measured with bench.compare; see
+bench/baselines/README.md.
+"""
+import os
+import shutil
+import tempfile
+
+from prometheus_client import multiprocess
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'gthread'
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded, so the locks, sockets and threads
+    # it creates at import time are already cooperative
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+workers = int(os.environ.get('WEB_CONCURRENCY') or available_cores())
+threads = int(os.environ.get('GUNICORN_THREADS') or os.environ.get('DB_POOL_MAX_SIZE') or 10)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 1000)
+preload_app = True
+
+# Workers share metrics through files in this directory (see metrics.py).
+# It has to be set before the app is imported, and emptied on each start so
+# counters from a previous run are not added to the new one.
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'task-tracker-metrics')
+)
+
+
+def on_starting(server):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (pool connections)
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    # Write out the worker's queued task activity before it goes away
+    from activity import flush_activity
+    flush_activity()
@@ -0,0 +1,104 @@
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+
+class PgListener(threading.Thread):
+    """Background thread that LISTENs on Postgres channels for this process.
+
+    Uses its own dedicated connection (LISTEN needs a session that stays
+    open, so it cannot come from the request pool). If the connection drops
+    it reconnects with backoff and calls each channel's ``on_reconnect``
+    hook, since notifications sent while disconnected are lost.
+    """
+
+    def __init__(self, dsn, poll_interval=1.0):
+        super().__init__(name='pg-listener', daemon=True)
+        self.dsn = dsn
+        self.poll_interval = poll_interval
+        self._handlers = {}  # channel -> list of (on_notify, on_reconnect)
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, channel, on_notify, on_reconnect=None):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append((on_notify, on_reconnect))
+            self._pending.append(channel)
+
+    def _listen_pending(self, conn):
+        with self._lock:
+            channels, self._pending = self._pending, []
+        with conn.cursor() as cur:
+            for channel in channels:
+                cur.execute(f'LISTEN "{channel}"')
+
+    def _dispatch(self, channel, payload):
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for on_notify, _ in handlers:
+            try:
+                on_notify(payload)
+            except Exception as e:
+                print(f"Error handling notification on '{channel}': {e}")
+
+    def _reconnected(self):
+        with self._lock:
+            handlers = [h for hs in self._handlers.values() for h in hs]
+            self._pending = list(self._handlers)
+        for _, on_reconnect in handlers:
+            if on_reconnect:
+                try:
+                    on_reconnect()
+                except Exception as e:
+                    print(f"Error running listener reconnect hook: {e}")
+
+    def run(self):
+        backoff = 1.0
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                if connected_before:
+                    self._reconnected()
+                connected_before = True
+                backoff = 1.0
+                while True:
+                    self._listen_pending(conn)
+                    if select.select([conn], [], [], self.poll_interval)[0]:
+                        conn.poll()
+                        while conn.notifies:
+                            notify = conn.notifies.pop(0)
+                            self._dispatch(notify.channel, notify.payload)
+            except (psycopg2.Error, OSError) as e:
+                print(f"Postgres listener disconnected, retrying in {backoff:.0f}s: {e}")
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+# --- Process-wide listener ---
+# Like the connection pool, one per worker process and started on first use
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def get_listener():
+    global _listener, _listener_pid
+    pid = os.getpid()
+    with _listener_lock:
+        if _listener is None or _listener_pid != pid:
+            _listener = PgListener(os.environ.get('DATABASE_URL'))
+            _listener_pid = pid
+            _listener.start()
+    return _listener
@@ -0,0 +1,259 @@
+import os
+import re
+import time
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client import multiprocess
+from psycopg2.extras import RealDictCursor
+
+# --- Prometheus metrics ---
+# Under gunicorn every worker keeps its own values. When
+# PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py does this) they are
+# written to files in that directory and /metrics, whichever worker serves
+# it, reports the sum over all workers.
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+# Optional bearer token required to scrape /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Statements slower than this are logged with their normalized SQL
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_MS', '200')) / 1000
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time spent handling a request, by Flask endpoint',
+    ['endpoint', 'method', 'status'],
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Number of SQL statements executed per request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 25, 50, 100, float('inf')),
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds',
+    'Total time spent in SQL statements per request',
+    ['endpoint'],
+)
+SLOW_QUERIES = Counter(
+    'db_slow_queries_total',
+    'SQL statements slower than SLOW_QUERY_MS',
+    ['endpoint'],
+)
+
+POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Open pooled connections by state',
+    ['state'],
+    multiprocess_mode='livesum',
+)
+POOL_MAX_SIZE = Gauge(
+    'db_pool_max_size',
+    'Configured pool size limit, summed over live workers',
+    multiprocess_mode='livesum',
+)
+# Cumulative pool counters, fed from the deltas of ConnectionPool.stats()
+POOL_COUNTERS = {
+    'checkouts': Counter('db_pool_checkouts_total', 'Connections checked out of the pool'),
+    'checkout_timeouts': Counter('db_pool_checkout_timeouts_total', 'Checkouts that gave up waiting'),
+    'checkout_failures': Counter('db_pool_checkout_failures_total', 'Checkouts that failed for any reason'),
+    'connections_created': Counter('db_pool_connections_created_total', 'New database connections opened'),
+    'connections_discarded': Counter('db_pool_connections_discarded_total', 'Broken or closed connections dropped'),
+    'wait_time_total': Counter('db_pool_checkout_wait_seconds_total', 'Time spent waiting for a connection'),
+}
+READ_ROUTES = Counter(
+    'db_read_routes_total',
+    'Read-only connections by where they were served',
+    ['target'],
+)
+REPLICA_LAG = Gauge(
+    'db_replica_lag_seconds',
+    'Last measured replication lag per replica',
+    ['replica'],
+    multiprocess_mode='livemax',
+)
+# Admission control (admission.py). Outcomes: admitted (a slot was free),
+# queued (admitted after waiting), shed (503) and rate_limited (429)
+ADMISSION_REQUESTS = Counter(
+    'admission_requests_total',
+    'API requests by admission decision',
+    ['endpoint', 'outcome'],
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    'admission_queue_wait_seconds',
+    'Time spent waiting for a concurrency slot, by requests that had to wait',
+    ['endpoint'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, float('inf')),
+)
+ADMISSION_SLOTS = Gauge(
+    'admission_requests_in_progress',
+    'Requests holding (active) or waiting for (waiting) a concurrency slot',
+    ['state'],
+    multiprocess_mode='livesum',
+)
+# Write-behind task activity log (activity.py). Outcomes: queued, delayed
+# (the queue was full and the request waited for room), written, dropped
+ACTIVITY_EVENTS = Counter(
+    'task_activity_events_total',
+    'Task activity events by what happened to them',
+    ['outcome'],
+)
+ACTIVITY_QUEUE_DEPTH = Gauge(
+    'task_activity_queue_depth',
+    'Task activity events waiting to be written',
+    multiprocess_mode='livesum',
+)
+_pool_seen = {}
+_pool_seen_pid = None
+
+
+class RequestStats:
+    __slots__ = ('endpoint', 'started', 'queries', 'db_time')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_request_stats = ContextVar('request_stats', default=None)
+
+
+def start_request(endpoint):
+    _request_stats.set(RequestStats(endpoint or 'unmatched'))
+
+
+def name_request(endpoint):
+    """Set the endpoint label once routing has picked a handler"""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.endpoint = endpoint
+
+
+def finish_request(method, status):
+    """Record latency and DB usage for the request started with start_request"""
+    stats = _request_stats.get()
+    if stats is None:
+        return
+    _request_stats.set(None)
+    REQUEST_LATENCY.labels(stats.endpoint, method, str(status)).observe(time.perf_counter() - stats.started)
+    REQUEST_DB_QUERIES.labels(stats.endpoint).observe(stats.queries)
+    REQUEST_DB_SECONDS.labels(stats.endpoint).observe(stats.db_time)
+
+
+def update_pool_metrics(stats):
+    """Publish this worker's ConnectionPool.stats() snapshot"""
+    global _pool_seen, _pool_seen_pid
+    if stats is None:
+        return
+    if _pool_seen_pid != os.getpid():
+        _pool_seen, _pool_seen_pid = {}, os.getpid()
+    POOL_CONNECTIONS.labels('in_use').set(stats['in_use'])
+    POOL_CONNECTIONS.labels('idle').set(stats['idle'])
+    POOL_MAX_SIZE.set(stats['max_size'])
+    for key, counter in POOL_COUNTERS.items():
+        delta = stats[key] - _pool_seen.get(key, 0)
+        if delta > 0:
+            counter.inc(delta)
+        _pool_seen[key] = stats[key]
+
+
+def update_replica_metrics(stats):
+    for index, replica in enumerate(stats or ()):
+        if replica['lag'] is not None:
+            REPLICA_LAG.labels(str(index)).set(replica['lag'])
+
+
+def record_admission(endpoint, outcome, waited=None):
+    ADMISSION_REQUESTS.labels(endpoint, outcome).inc()
+    if waited is not None:
+        ADMISSION_QUEUE_WAIT.labels(endpoint).observe(waited)
+
+
+def update_admission_metrics(stats):
+    ADMISSION_SLOTS.labels('active').set(stats['active'])
+    ADMISSION_SLOTS.labels('waiting').set(stats['waiting'])
+
+
+def record_activity_events(outcome, count=1):
+    ACTIVITY_EVENTS.labels(outcome).inc(count)
+
+
+def update_activity_metrics(stats):
+    if stats is not None:
+        ACTIVITY_QUEUE_DEPTH.set(stats['queued'])
+
+
+def record_read_route(target):
+    READ_ROUTES.labels(target).inc()
+
+
+def render_metrics():
+    """Return (body, content_type) in the Prometheus text format"""
+    registry = REGISTRY
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# --- Query timing ---
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s')
+_WHITESPACE = re.compile(r'\s+')
+MAX_LOGGED_SQL = 1000
+
+
+def normalize_sql(sql):
+    """Collapse whitespace and replace literals and parameters with `?`"""
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors='replace')
+    sql = _PLACEHOLDER.sub('?', str(sql))
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    return sql[:MAX_LOGGED_SQL]
+
+
+def record_query(sql, elapsed):
+    stats = _request_stats.get()
+    endpoint = 'none'
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        endpoint = stats.endpoint
+    if elapsed >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.labels(endpoint).inc()
+        print(f"Slow query ({elapsed * 1000:.0f} ms) in {endpoint}: {normalize_sql(sql)}")
+
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that counts and times every statement it runs"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(sql, time.perf_counter() - started)
@@ -0,0 +1,295 @@
+"""Apply pending schema migrations.
+
+    python migrate.py            # apply everything not applied yet
+    python migrate.py --status   # list applied and pending migrations
+
+Migrations live in migrations/ as NNNN_name.py, applied in version order
+and recorded in schema_migrations, so one query tells which are still to
+run. Each module has a docstring (its first line is shown while it runs)
+and an `upgrade(cur)` function.
+
+By default a migration runs in a single transaction with its
+schema_migrations row: it applies completely or not at all. A module that
+sets TRANSACTIONAL = False runs in autocommit instead, for statements that
+cannot run inside a transaction block (CREATE INDEX CONCURRENTLY) and for
+work that commits in steps (backfill() below). Such a migration must be
+safe to re-run after being interrupted part way, since it is only recorded
+once it finishes.
+
+The whole run holds a Postgres advisory lock, so two deploys starting at
+once apply each migration exactly once: the second waits, then finds
+nothing left to do.
+
+Migrations 0001-0011 build the schema init_db.py used to create, and are
+written so they also bring any database it created up to date.
+"""
+import argparse
+import importlib.util
+import os
+import re
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from dotenv import load_dotenv
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'(\d{4})_(\w+)\.py$')
+
+# Arbitrary, but fixed: every deploy of this app must use the same key
+ADVISORY_LOCK_KEY = 7318202406
+LOCK_POLL_INTERVAL = 1.0
+
+BACKFILL_BATCH_SIZE = int(os.environ.get('MIGRATION_BACKFILL_BATCH_SIZE', '5000'))
+
+SETUP_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms INTEGER
+);
+CREATE TABLE IF NOT EXISTS schema_backfill_progress (
+    name TEXT PRIMARY KEY,
+    last_id BIGINT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(f'migrations.{self.name}', self.path)
+            self._module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self._module)
+        return self._module
+
+    @property
+    def label(self):
+        return f'{self.version:04d}_{self.name}'
+
+    @property
+    def description(self):
+        doc = (self.module.__doc__ or '').strip()
+        return doc.splitlines()[0] if doc else self.name
+
+    @property
+    def transactional(self):
+        return getattr(self.module, 'TRANSACTIONAL', True)
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    versions = [migration.version for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+        raise RuntimeError(f"Duplicate migration versions: {', '.join(map(str, duplicates))}")
+    return migrations
+
+
+@contextmanager
+def transaction(cur):
+    """One transaction inside a non-transactional (autocommit) migration"""
+    cur.execute('BEGIN')
+    try:
+        yield
+    except BaseException:
+        cur.execute('ROLLBACK')
+        raise
+    cur.execute('COMMIT')
+
+
+def backfill(cur, name, table, assignments, condition='TRUE', batch_size=None, skip_triggers=()):
+    """UPDATE `table` SET `assignments` WHERE `condition`, in batches.
+
+    Walks the table in id ranges of `batch_size`, committing each range with
+    its progress under `name`, so only use it from a TRANSACTIONAL = False
+    migration. A re-run after an interruption resumes after the last
+    committed range instead of starting over, and no batch scans rows an
+    earlier one already covered. Rows written while it runs must already
+    get the new value some other way (a default or trigger).
+
+    `skip_triggers` are disabled inside each batch's transaction, for
+    triggers that must not treat the backfill as a change to the rows.
+    Disabling one locks out other writers to `table` until the batch
+    commits, so keep batches short.
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    cur.execute('SELECT last_id FROM schema_backfill_progress WHERE name = %s', (name,))
+    row = cur.fetchone()
+    cur.execute(f'SELECT min(id), max(id) FROM {table}')
+    low, high = cur.fetchone()
+    if high is None:
+        return 0
+
+    position = row[0] if row else low - 1
+    if row:
+        print(f"  • Resuming '{name}' after id {position}")
+    total = 0
+    while position < high:
+        end = min(position + batch_size, high)
+        with transaction(cur):
+            for trigger in skip_triggers:
+                cur.execute(f'ALTER TABLE {table} DISABLE TRIGGER {trigger}')
+            cur.execute(f'UPDATE {table} SET {assignments} WHERE id > %s AND id <= %s AND ({condition})',
+                        (position, end))
+            total += cur.rowcount
+            for trigger in skip_triggers:
+                cur.execute(f'ALTER TABLE {table} ENABLE TRIGGER {trigger}')
+            cur.execute("""
+                INSERT INTO schema_backfill_progress (name, last_id) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = CURRENT_TIMESTAMP
+            """, (name, end))
+        position = end
+    print(f"  ✓ Backfilled {total} rows for '{name}'")
+    return total
+
+
+def index_is_valid(cur, index_name):
+    """True/False for an existing index, None if there is none"""
+    cur.execute("""
+        SELECT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    """, (index_name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def create_tasks_index(cur, index_name, index_definition):
+    """Build an idx_tasks_* index on the partitioned tasks table without
+    blocking writes (TRANSACTIONAL = False migrations only).
+
+    Postgres cannot build an index on a partitioned table concurrently, so
+    it is assembled from its partitions: built concurrently on tasks_hot,
+    built in place on tasks_archive (only archive.py writes there), and
+    attached to a parent index created ON ONLY tasks. The parent becomes
+    valid once both are attached, and is copied onto every archive
+    partition created later. An interrupted concurrent build leaves an
+    INVALID index behind, which IF NOT EXISTS would silently keep, so those
+    are dropped and rebuilt.
+    """
+    if index_is_valid(cur, index_name):
+        print(f"  • Index '{index_name}' already exists")
+        return
+
+    hot_name = index_name.replace('idx_tasks_', 'idx_tasks_hot_', 1)
+    archive_name = index_name.replace('idx_tasks_', 'idx_tasks_archive_', 1)
+    hot_valid = index_is_valid(cur, hot_name)
+    if hot_valid is False:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {hot_name};")
+        print(f"  ✓ Dropped invalid index '{hot_name}'")
+    if not hot_valid:
+        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {hot_name} ON tasks_hot {index_definition};")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {archive_name} ON tasks_archive {index_definition};")
+
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON ONLY tasks {index_definition};")
+    for child_name in (hot_name, archive_name):
+        cur.execute("SELECT 1 FROM pg_inherits WHERE inhrelid = %s::regclass", (child_name,))
+        if not cur.fetchone():
+            cur.execute(f"ALTER INDEX {index_name} ATTACH PARTITION {child_name};")
+    print(f"  ✓ Created index '{index_name}'")
+
+
+def acquire_lock(cur):
+    """Take the migration lock, polling while another run holds it.
+
+    Waiting inside pg_advisory_lock() would leave this session's statement
+    open, and CREATE INDEX CONCURRENTLY in the other run waits for every
+    open transaction to finish: a deadlock.
+    """
+    waiting = False
+    while True:
+        cur.execute('SELECT pg_try_advisory_lock(%s)', (ADVISORY_LOCK_KEY,))
+        if cur.fetchone()[0]:
+            return
+        if not waiting:
+            print("Another migration run holds the lock, waiting for it to finish...")
+            waiting = True
+        time.sleep(LOCK_POLL_INTERVAL)
+
+
+def applied_versions(cur):
+    cur.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply(conn, cur, migration):
+    started = time.monotonic()
+    if migration.transactional:
+        conn.autocommit = False
+        try:
+            migration.module.upgrade(cur)
+            record(cur, migration, started)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+    else:
+        migration.module.upgrade(cur)
+        record(cur, migration, started)
+
+
+def record(cur, migration, started):
+    cur.execute(
+        'INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)',
+        (migration.version, migration.name, int((time.monotonic() - started) * 1000)),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--status', action='store_true', help='list migrations and whether they are applied')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable is not set")
+
+    migrations = load_migrations()
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        acquire_lock(cur)
+        cur.execute(SETUP_SQL)
+        applied = applied_versions(cur)
+
+        if args.status:
+            for migration in migrations:
+                status = 'applied' if migration.version in applied else 'pending'
+                print(f'{status:<9}{migration.label}')
+            return
+
+        pending = [migration for migration in migrations if migration.version not in applied]
+        if not pending:
+            print(f"Schema is up to date ({len(applied)} migrations applied)")
+            return
+        for migration in pending:
+            print(f"--- {migration.label}: {migration.description} ---")
+            started = time.monotonic()
+            apply(conn, cur, migration)
+            print(f"  ✓ Applied in {time.monotonic() - started:.1f}s")
+        print(f"\nApplied {len(pending)} migrations")
+    finally:
+        # Closing the session also releases the advisory lock
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
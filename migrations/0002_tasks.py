@@ -0,0 +1,65 @@
+"""Create the tasks table"""
+
+
+def upgrade(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS tasks (
+        id SERIAL PRIMARY KEY,
+        title VARCHAR(500) NOT NULL,
+        description TEXT,
+        company VARCHAR(255),
+        priority VARCHAR(20) DEFAULT 'MEDIUM',
+        status VARCHAR(20) DEFAULT 'TODO',
+        assigned_by_user_id INTEGER,
+        assigned_to_user_id INTEGER,
+        due_date DATE,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        archived BOOLEAN NOT NULL DEFAULT FALSE,
+        CONSTRAINT fk_assigned_by FOREIGN KEY(assigned_by_user_id) REFERENCES users(id) ON DELETE SET NULL,
+        CONSTRAINT fk_assigned_to FOREIGN KEY(assigned_to_user_id) REFERENCES users(id) ON DELETE SET NULL
+    );
+
+    -- Columns missing from tables created by earlier versions
+    ALTER TABLE tasks
+        ADD COLUMN IF NOT EXISTS company VARCHAR(255),
+        ADD COLUMN IF NOT EXISTS priority VARCHAR(20) DEFAULT 'MEDIUM',
+        ADD COLUMN IF NOT EXISTS assigned_by_user_id INTEGER,
+        ADD COLUMN IF NOT EXISTS assigned_to_user_id INTEGER,
+        ADD COLUMN IF NOT EXISTS due_date DATE,
+        ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        -- Constant default, so existing rows are not rewritten; they all
+        -- sort before any real transaction id
+        ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT '0',
+        -- Full-text search document, kept current by trg_task_search_vector
+        ADD COLUMN IF NOT EXISTS search_vector tsvector,
+        -- Optimistic concurrency for updates (ETag / If-Match)
+        ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1,
+        -- Partition key: completed tasks moved to cold storage by archive.py
+        ADD COLUMN IF NOT EXISTS archived BOOLEAN NOT NULL DEFAULT FALSE;
+
+    ALTER TABLE tasks ALTER COLUMN status SET DEFAULT 'TODO';
+
+    -- Tasks used to belong to a single user
+    ALTER TABLE tasks DROP CONSTRAINT IF EXISTS fk_user;
+    ALTER TABLE tasks DROP COLUMN IF EXISTS user_id;
+
+    DO $$
+    BEGIN
+        -- Only when needed: even a no-op type change rebuilds every index
+        -- on the column
+        IF (SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = 'tasks'::regclass AND attname = 'status') <> 'character varying(20)' THEN
+            ALTER TABLE tasks ALTER COLUMN status TYPE VARCHAR(20);
+        END IF;
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'tasks'::regclass AND conname = 'fk_assigned_by') THEN
+            ALTER TABLE tasks ADD CONSTRAINT fk_assigned_by
+                FOREIGN KEY (assigned_by_user_id) REFERENCES users(id) ON DELETE SET NULL;
+        END IF;
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'tasks'::regclass AND conname = 'fk_assigned_to') THEN
+            ALTER TABLE tasks ADD CONSTRAINT fk_assigned_to
+                FOREIGN KEY (assigned_to_user_id) REFERENCES users(id) ON DELETE SET NULL;
+        END IF;
+    END
+    $$;
+    """)
@@ -0,0 +1,87 @@
+"""Partition tasks into hot and archive storage
+
+tasks is LIST partitioned on `archived`:
+  tasks_hot      archived = FALSE, everything the app lists by default
+  tasks_archive  archived = TRUE, RANGE partitioned by created_at into
+                 yearly tables (tasks_archive_YYYY, created by archive.py)
+Queries filtering on `archived = FALSE` are pruned to tasks_hot, so old
+completed work no longer sits in the indexes and heap of active tasks.
+
+The existing plain table is converted in place: it becomes tasks_hot
+as-is, with no copying. A CHECK constraint matching the partition bound is
+validated first, which only blocks schema changes, so ATTACH can skip its
+own scan. The swap itself is a catalog change in one short transaction.
+Ids are unique per partition and all come from the one sequence; Postgres
+cannot enforce a primary key on (id) across them.
+"""
+import psycopg2
+
+from migrate import transaction
+
+# Validation and the swap are separate transactions
+TRANSACTIONAL = False
+
+
+def upgrade(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = 'tasks'::regclass")
+    if cur.fetchone()[0] == 'p':
+        print("  • 'tasks' is already partitioned")
+        return
+
+    cur.execute("""
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'tasks'::regclass AND conname = 'tasks_hot_not_archived'
+    """)
+    if not cur.fetchone():
+        cur.execute("ALTER TABLE tasks ADD CONSTRAINT tasks_hot_not_archived CHECK (archived = FALSE) NOT VALID;")
+    cur.execute("ALTER TABLE tasks VALIDATE CONSTRAINT tasks_hot_not_archived;")
+    print("  ✓ Validated 'tasks_hot_not_archived'")
+
+    # Triggers, foreign keys and index names move from the old table to the
+    # partitioned parent in the same transaction, so no write is missed
+    cur.execute("SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = 'tasks'::regclass AND NOT tgisinternal")
+    triggers = cur.fetchall()
+    cur.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = 'tasks'::regclass AND contype = 'f'
+    """)
+    foreign_keys = cur.fetchall()
+    cur.execute("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'tasks'::regclass AND c.relname LIKE 'idx\\_tasks\\_%'
+    """)
+    index_names = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT pg_get_serial_sequence('tasks', 'id')")
+    id_sequence = cur.fetchone()[0]
+
+    for attempt in range(1, 11):
+        try:
+            with transaction(cur):
+                # Give up quickly rather than queue every other query behind
+                # the exclusive lock while a long transaction holds tasks
+                cur.execute("SET LOCAL lock_timeout = '2s';")
+                cur.execute("LOCK TABLE tasks IN ACCESS EXCLUSIVE MODE;")
+                for trigger_name, _ in triggers:
+                    cur.execute(f"DROP TRIGGER {trigger_name} ON tasks;")
+                cur.execute("ALTER TABLE tasks RENAME TO tasks_hot;")
+                cur.execute("ALTER INDEX IF EXISTS tasks_pkey RENAME TO tasks_hot_pkey;")
+                for index_name in index_names:
+                    hot_name = index_name.replace('idx_tasks_', 'idx_tasks_hot_', 1)
+                    cur.execute(f"ALTER INDEX {index_name} RENAME TO {hot_name};")
+                cur.execute("""
+                    CREATE TABLE tasks (LIKE tasks_hot INCLUDING DEFAULTS) PARTITION BY LIST (archived);
+                    ALTER TABLE tasks ATTACH PARTITION tasks_hot FOR VALUES IN (FALSE);
+                    CREATE TABLE tasks_archive PARTITION OF tasks FOR VALUES IN (TRUE) PARTITION BY RANGE (created_at);
+                """)
+                cur.execute(f"ALTER SEQUENCE {id_sequence} OWNED BY tasks.id;")
+                for constraint_name, definition in foreign_keys:
+                    # Matches the constraint already on tasks_hot, so no re-check
+                    cur.execute(f"ALTER TABLE tasks ADD CONSTRAINT {constraint_name} {definition};")
+                for _, trigger_def in triggers:
+                    cur.execute(trigger_def)
+            break
+        except psycopg2.errors.LockNotAvailable:
+            print(f"  ! 'tasks' is busy, retrying ({attempt}/10)")
+    else:
+        raise RuntimeError("Could not lock 'tasks' to partition it; retry when it is less busy")
+    print("  ✓ Converted 'tasks' into 'tasks_hot' + 'tasks_archive' partitions")
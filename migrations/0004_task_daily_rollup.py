@@ -0,0 +1,120 @@
+"""Create task_daily_rollup, the per-day counters behind /api/reports/weekly
+
+They are maintained by statement-level triggers on tasks. Each task
+contributes:
+  assigned_to_count  on (created day, assignee, status, priority)
+  assigned_by_count  on (created day, assigner, status, priority)
+  completed_count    on (updated day, assignee) while status is DONE
+An UPDATE subtracts the old rows' contributions and adds the new ones, so
+the table always matches what the old COUNT(*) queries returned. Days are
+UTC; user_id 0 stands in for a NULL (deleted) user.
+"""
+
+
+def upgrade(cur):
+    cur.execute("SELECT to_regclass('task_daily_rollup') IS NOT NULL")
+    rollup_exists = cur.fetchone()[0]
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS task_daily_rollup (
+        user_id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        priority VARCHAR(20) NOT NULL,
+        assigned_to_count INTEGER NOT NULL DEFAULT 0,
+        assigned_by_count INTEGER NOT NULL DEFAULT 0,
+        completed_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day, status, priority)
+    );
+    CREATE INDEX IF NOT EXISTS idx_task_daily_rollup_day ON task_daily_rollup (day);
+    """)
+
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION task_rollup_trigger() RETURNS trigger AS $$
+    DECLARE
+        changes TEXT;
+    BEGIN
+        -- Statement-level with transition tables: a multi-row write (batch
+        -- endpoints, imports) folds into one upsert per touched rollup row
+        -- instead of repeatedly updating the same hot rows once per task
+        changes := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT created_at, updated_at, assigned_to_user_id, assigned_by_user_id, status, priority, 1 AS delta FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT created_at, updated_at, assigned_to_user_id, assigned_by_user_id, status, priority, -1 AS delta FROM old_rows'
+            ELSE 'SELECT created_at, updated_at, assigned_to_user_id, assigned_by_user_id, status, priority, 1 AS delta FROM new_rows
+                  UNION ALL
+                  SELECT created_at, updated_at, assigned_to_user_id, assigned_by_user_id, status, priority, -1 FROM old_rows'
+        END;
+
+        EXECUTE format($sql$
+            WITH changes AS (%s), contributions AS (
+                SELECT COALESCE(assigned_to_user_id, 0) AS user_id, (created_at AT TIME ZONE 'UTC')::date AS day,
+                       COALESCE(status, '') AS status, COALESCE(priority, '') AS priority,
+                       delta AS assigned_to_count, 0 AS assigned_by_count, 0 AS completed_count
+                FROM changes
+                UNION ALL
+                SELECT COALESCE(assigned_by_user_id, 0), (created_at AT TIME ZONE 'UTC')::date,
+                       COALESCE(status, ''), COALESCE(priority, ''), 0, delta, 0
+                FROM changes
+                UNION ALL
+                SELECT COALESCE(assigned_to_user_id, 0), (updated_at AT TIME ZONE 'UTC')::date,
+                       status, COALESCE(priority, ''), 0, 0, delta
+                FROM changes WHERE status = 'DONE'
+            )
+            INSERT INTO task_daily_rollup AS r
+                (user_id, day, status, priority, assigned_to_count, assigned_by_count, completed_count)
+            SELECT user_id, day, status, priority,
+                   SUM(assigned_to_count), SUM(assigned_by_count), SUM(completed_count)
+            FROM contributions
+            GROUP BY user_id, day, status, priority
+            HAVING SUM(assigned_to_count) <> 0 OR SUM(assigned_by_count) <> 0 OR SUM(completed_count) <> 0
+            ON CONFLICT (user_id, day, status, priority) DO UPDATE SET
+                assigned_to_count = r.assigned_to_count + EXCLUDED.assigned_to_count,
+                assigned_by_count = r.assigned_by_count + EXCLUDED.assigned_by_count,
+                completed_count = r.completed_count + EXCLUDED.completed_count
+        $sql$, changes);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_task_rollup ON tasks;
+    DROP TRIGGER IF EXISTS trg_task_rollup_insert ON tasks;
+    DROP TRIGGER IF EXISTS trg_task_rollup_update ON tasks;
+    DROP TRIGGER IF EXISTS trg_task_rollup_delete ON tasks;
+    DROP FUNCTION IF EXISTS task_rollup_add(TIMESTAMPTZ, TIMESTAMPTZ, INTEGER, INTEGER, VARCHAR, VARCHAR, INTEGER);
+
+    CREATE TRIGGER trg_task_rollup_insert
+        AFTER INSERT ON tasks REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION task_rollup_trigger();
+    CREATE TRIGGER trg_task_rollup_update
+        AFTER UPDATE ON tasks REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION task_rollup_trigger();
+    CREATE TRIGGER trg_task_rollup_delete
+        AFTER DELETE ON tasks REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION task_rollup_trigger();
+    """)
+
+    if not rollup_exists:
+        # CREATE TRIGGER above holds a lock that blocks writes to tasks until
+        # commit, so the backfill cannot miss or double count concurrent changes
+        cur.execute("""
+        INSERT INTO task_daily_rollup
+            (user_id, day, status, priority, assigned_to_count, assigned_by_count, completed_count)
+        SELECT user_id, day, status, priority,
+               SUM(assigned_to_count), SUM(assigned_by_count), SUM(completed_count)
+        FROM (
+            SELECT COALESCE(assigned_to_user_id, 0) AS user_id, (created_at AT TIME ZONE 'UTC')::date AS day,
+                   COALESCE(status, '') AS status, COALESCE(priority, '') AS priority,
+                   1 AS assigned_to_count, 0 AS assigned_by_count, 0 AS completed_count
+            FROM tasks
+            UNION ALL
+            SELECT COALESCE(assigned_by_user_id, 0), (created_at AT TIME ZONE 'UTC')::date,
+                   COALESCE(status, ''), COALESCE(priority, ''), 0, 1, 0
+            FROM tasks
+            UNION ALL
+            SELECT COALESCE(assigned_to_user_id, 0), (updated_at AT TIME ZONE 'UTC')::date,
+                   status, COALESCE(priority, ''), 0, 0, 1
+            FROM tasks WHERE status = 'DONE'
+        ) contributions
+        GROUP BY user_id, day, status, priority;
+        """)
+        print(f"  ✓ Backfilled rollup with {cur.rowcount} rows")
@@ -0,0 +1,72 @@
+"""Track task changes for /api/tasks/changes
+
+Inserts and updates stamp change_xid with the writing transaction's id;
+deletes, reassignments and archival leave a tombstone for each user who
+could see the task before.
+"""
+
+
+def upgrade(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS task_tombstones (
+        id BIGSERIAL PRIMARY KEY,
+        task_id INTEGER NOT NULL,
+        user_id INTEGER,
+        reason VARCHAR(20) NOT NULL,
+        change_xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_task_tombstones_user_xid ON task_tombstones (user_id, change_xid);
+    CREATE INDEX IF NOT EXISTS idx_task_tombstones_xid ON task_tombstones (change_xid);
+
+    CREATE OR REPLACE FUNCTION task_change_stamp() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_xid := pg_current_xact_id();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION task_tombstone_trigger() RETURNS trigger AS $$
+    DECLARE
+        moved RECORD;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            -- An UPDATE that moves a task between the hot and archive
+            -- partitions fires DELETE here, while the task lives on in the other
+            SELECT archived, assigned_to_user_id, assigned_by_user_id INTO moved FROM tasks WHERE id = OLD.id;
+            IF NOT FOUND THEN
+                INSERT INTO task_tombstones (task_id, user_id, reason)
+                SELECT DISTINCT OLD.id, u, 'deleted'
+                FROM unnest(ARRAY[OLD.assigned_to_user_id, OLD.assigned_by_user_id]) AS u;
+            ELSIF moved.archived THEN
+                INSERT INTO task_tombstones (task_id, user_id, reason)
+                SELECT DISTINCT OLD.id, u, 'archived'
+                FROM unnest(ARRAY[OLD.assigned_to_user_id, OLD.assigned_by_user_id]) AS u;
+            ELSIF OLD.assigned_to_user_id IS DISTINCT FROM moved.assigned_to_user_id
+                  OR OLD.assigned_by_user_id IS DISTINCT FROM moved.assigned_by_user_id THEN
+                INSERT INTO task_tombstones (task_id, user_id, reason)
+                SELECT DISTINCT OLD.id, u, 'reassigned'
+                FROM unnest(ARRAY[OLD.assigned_to_user_id, OLD.assigned_by_user_id]) AS u
+                WHERE u IS NOT NULL;
+            END IF;
+        ELSIF OLD.assigned_to_user_id IS DISTINCT FROM NEW.assigned_to_user_id
+              OR OLD.assigned_by_user_id IS DISTINCT FROM NEW.assigned_by_user_id THEN
+            INSERT INTO task_tombstones (task_id, user_id, reason)
+            SELECT DISTINCT OLD.id, u, 'reassigned'
+            FROM unnest(ARRAY[OLD.assigned_to_user_id, OLD.assigned_by_user_id]) AS u
+            WHERE u IS NOT NULL;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_task_change_stamp ON tasks;
+    CREATE TRIGGER trg_task_change_stamp
+        BEFORE INSERT OR UPDATE ON tasks
+        FOR EACH ROW EXECUTE FUNCTION task_change_stamp();
+
+    DROP TRIGGER IF EXISTS trg_task_tombstone ON tasks;
+    CREATE TRIGGER trg_task_tombstone
+        AFTER UPDATE OF assigned_to_user_id, assigned_by_user_id OR DELETE ON tasks
+        FOR EACH ROW EXECUTE FUNCTION task_tombstone_trigger();
+    """)
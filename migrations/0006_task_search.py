@@ -0,0 +1,28 @@
+"""Keep tasks.search_vector current for full-text search
+
+Title (weight A) and description (weight B) for the full-text search mode
+of /api/tasks. A trigger rather than a generated column, so adding it to a
+large existing table does not rewrite it under an exclusive lock; existing
+rows are backfilled by 0010.
+"""
+
+
+def upgrade(cur):
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION task_search_vector(p_title TEXT, p_description TEXT) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('english', COALESCE(p_title, '')), 'A')
+            || setweight(to_tsvector('english', COALESCE(p_description, '')), 'B');
+    $$ LANGUAGE sql IMMUTABLE;
+
+    CREATE OR REPLACE FUNCTION task_search_vector_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := task_search_vector(NEW.title, NEW.description);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_task_search_vector ON tasks;
+    CREATE TRIGGER trg_task_search_vector
+        BEFORE INSERT OR UPDATE OF title, description ON tasks
+        FOR EACH ROW EXECUTE FUNCTION task_search_vector_trigger();
+    """)
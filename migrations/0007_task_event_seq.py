@@ -0,0 +1,5 @@
+"""Create the sequence for /api/tasks/stream event ids"""
+
+
+def upgrade(cur):
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS task_event_seq;")
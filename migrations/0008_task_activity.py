@@ -0,0 +1,19 @@
+"""Create task_activity, the per-task history behind /api/tasks/<id>/activity
+
+Written in batches by activity.py. No foreign key to tasks: a deleted task
+keeps its history.
+"""
+
+
+def upgrade(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS task_activity (
+        id BIGSERIAL PRIMARY KEY,
+        task_id INTEGER NOT NULL,
+        user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+        action VARCHAR(20) NOT NULL,
+        changes JSONB NOT NULL DEFAULT '{}',
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_task_activity_task ON task_activity (task_id, created_at DESC, id DESC);
+    """)
@@ -0,0 +1,16 @@
+"""Create the companies table with the default companies"""
+
+DEFAULT_COMPANIES = ['Tabhi', 'Pranik.ai', 'Client A', 'Internal', 'Other']
+
+
+def upgrade(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS companies (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) UNIQUE NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO companies (name) SELECT unnest(%s::text[]) ON CONFLICT (name) DO NOTHING;
+    """, (DEFAULT_COMPANIES,))
+    # Tell running app workers to drop their cached company list
+    cur.execute("SELECT pg_notify('cache_invalidation', 'companies');")
@@ -0,0 +1,16 @@
+"""Backfill tasks.search_vector for rows written before its trigger
+
+Only search_vector changes, so the backfill skips the triggers that treat
+an UPDATE as a change to the task: the change_xid stamp (otherwise every
+delta sync client would download every task again) and the rollup
+update, whose contributions it would add and subtract unchanged.
+"""
+from migrate import backfill
+
+TRANSACTIONAL = False
+
+
+def upgrade(cur):
+    backfill(cur, 'task_search_vector', 'tasks',
+             'search_vector = task_search_vector(title, description)', 'search_vector IS NULL',
+             skip_triggers=('trg_task_change_stamp', 'trg_task_rollup_update'))
@@ -0,0 +1,43 @@
+"""Create the tasks indexes
+
+Built without blocking writes (see create_tasks_index), so this can run
+against a live database.
+"""
+import psycopg2
+
+from migrate import create_tasks_index
+
+TRANSACTIONAL = False
+
+TASK_INDEXES = [
+    # type=my, optionally filtered by status, newest first
+    ("idx_tasks_assigned_to_created", "(assigned_to_user_id, created_at DESC, id DESC)"),
+    ("idx_tasks_assigned_to_status_created", "(assigned_to_user_id, status, created_at DESC, id DESC)"),
+    # type=assigned, optionally filtered by status, newest first
+    ("idx_tasks_assigned_by_created", "(assigned_by_user_id, created_at DESC, id DESC)"),
+    ("idx_tasks_assigned_by_status_created", "(assigned_by_user_id, status, created_at DESC, id DESC)"),
+    # type=all listing and "created this week" counts
+    ("idx_tasks_created", "(created_at DESC, id DESC)"),
+    # "completed this week" counts and archive.py's candidates
+    ("idx_tasks_status_updated", "(status, updated_at)"),
+    # /api/tasks/changes delta sync
+    ("idx_tasks_change_xid", "(change_xid, id)"),
+    ("idx_tasks_company_created", "(company, created_at DESC, id DESC)"),
+    ("idx_tasks_search_vector", "USING gin (search_vector)"),
+]
+
+
+def upgrade(cur):
+    indexes = list(TASK_INDEXES)
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        # title ILIKE '%term%' search
+        indexes.append(("idx_tasks_title_trgm", "USING gin (title gin_trgm_ops)"))
+    except psycopg2.Error as e:
+        print(f"  ! pg_trgm extension unavailable, skipping trigram index ({str(e).splitlines()[0]})")
+
+    for index_name, index_definition in indexes:
+        create_tasks_index(cur, index_name, index_definition)
+
+    # Refresh planner statistics so the new indexes are picked up right away
+    cur.execute("ANALYZE tasks;")
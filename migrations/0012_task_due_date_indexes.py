@@ -0,0 +1,22 @@
+"""Create partial indexes on the due dates of open tasks
+
+Serve /api/tasks/calendar and /api/tasks/overdue for type=my and
+type=assigned. Only tasks that are not DONE and have a due date are
+indexed, so the indexes stay as small as the open workload; archived tasks
+are all DONE, which leaves the tasks_archive side empty.
+"""
+from migrate import create_tasks_index
+
+TRANSACTIONAL = False
+
+OPEN_DUE_PREDICATE = "WHERE status <> 'DONE' AND due_date IS NOT NULL"
+
+DUE_DATE_INDEXES = [
+    ("idx_tasks_assigned_to_due_open", f"(assigned_to_user_id, due_date, id) {OPEN_DUE_PREDICATE}"),
+    ("idx_tasks_assigned_by_due_open", f"(assigned_by_user_id, due_date, id) {OPEN_DUE_PREDICATE}"),
+]
+
+
+def upgrade(cur):
+    for index_name, index_definition in DUE_DATE_INDEXES:
+        create_tasks_index(cur, index_name, index_definition)
@@ -0,0 +1,27 @@
+"""Support pruning old task tombstones
+
+archive.py deletes tombstones older than TOMBSTONE_RETENTION_DAYS, found
+through an index on created_at, and records the cutoff it used in
+task_tombstone_horizon. /api/tasks/changes refuses sync tokens issued
+before that cutoff, since their holders may have missed a pruned
+tombstone. The index is built concurrently: tombstones are written by the
+triggers on every task delete and reassignment.
+"""
+from migrate import index_is_valid
+
+TRANSACTIONAL = False
+
+
+def upgrade(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS task_tombstone_horizon (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        pruned_before TIMESTAMP WITH TIME ZONE NOT NULL
+    );
+    """)
+
+    if index_is_valid(cur, 'idx_task_tombstones_created') is False:
+        cur.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_task_tombstones_created;")
+        print("  ✓ Dropped invalid index 'idx_task_tombstones_created'")
+    cur.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_tombstones_created "
+                "ON task_tombstones (created_at);")
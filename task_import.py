@@ -0,0 +1,172 @@
+import csv
+import io
+import json
+
+from task_queries import MAX_TITLE_LENGTH, TASK_PRIORITIES, TASK_STATUSES, parse_date
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_COLUMNS = ('title', 'description', 'company', 'priority', 'status', 'assignee_email', 'due_date')
+MAX_IMPORT_ROWS = 100000
+# Uploads are read into memory whole before parsing
+MAX_IMPORT_BYTES = 50 * 1024 * 1024
+IMPORT_TOO_LARGE_ERROR = f'Imports are limited to {MAX_IMPORT_BYTES // (1024 * 1024)} MB'
+
+# Staging table the validated rows are COPYed into before one set-based
+# INSERT into tasks. Dropped automatically at commit.
+CREATE_STAGING_TABLE = '''
+    CREATE TEMP TABLE task_import (
+        ord INTEGER,
+        title TEXT,
+        description TEXT,
+        company TEXT,
+        priority TEXT,
+        status TEXT,
+        assigned_to_user_id INTEGER,
+        due_date DATE
+    ) ON COMMIT DROP
+'''
+
+INSERT_FROM_STAGING = '''
+    INSERT INTO tasks
+        (title, description, company, priority, status, assigned_by_user_id, assigned_to_user_id, due_date)
+    SELECT title, description, company, priority, status, %s, assigned_to_user_id, due_date
+    FROM task_import
+    ORDER BY ord
+    RETURNING id, assigned_to_user_id, assigned_by_user_id
+'''
+
+IMPORT_USERS_QUERY = 'SELECT id, lower(email) AS email FROM users WHERE lower(email) = ANY(%s)'
+IMPORT_COMPANIES_QUERY = 'SELECT name FROM companies'
+COPY_STAGING_SQL = 'COPY task_import FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (description))'
+
+
+def decode_import(data):
+    """The text of an uploaded file or body; ValueError unless it is UTF-8"""
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError('Import must be UTF-8 text')
+
+
+def parse_import_rows(text, import_format):
+    """Yield (row_number, dict) pairs from a CSV (with header) or NDJSON body"""
+    if import_format == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        missing = {'title', 'assignee_email'} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"CSV header is missing: {', '.join(sorted(missing))}")
+        # Row numbers match spreadsheet lines, with the header on line 1
+        for row_number, row in enumerate(reader, start=2):
+            yield row_number, row
+        return
+
+    for row_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row_number, row
+
+
+def clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def collect_import_rows(rows):
+    """Normalize parsed rows; returns (parsed, errors, assignee emails)"""
+    parsed = []
+    errors = []
+    for row_number, row in rows:
+        if not isinstance(row, dict):
+            errors.append({'row': row_number, 'error': 'Row must be a JSON object'})
+            continue
+        parsed.append((row_number, {column: clean(row.get(column)) for column in IMPORT_COLUMNS}))
+        if len(parsed) + len(errors) > MAX_IMPORT_ROWS:
+            raise ValueError(f'At most {MAX_IMPORT_ROWS} rows per import')
+
+    emails = list({row['assignee_email'].lower() for _, row in parsed if row['assignee_email']})
+    return parsed, errors, emails
+
+
+def validate_import_rows(cur, rows):
+    """Check rows against known users, companies, priorities and statuses.
+
+    Assignee emails and company names are resolved with one query each.
+    Returns (valid, errors) where valid rows are tuples in staging table
+    column order.
+    """
+    parsed, errors, emails = collect_import_rows(rows)
+
+    cur.execute(IMPORT_USERS_QUERY, (emails,))
+    users_by_email = {user['email']: user['id'] for user in cur.fetchall()}
+
+    cur.execute(IMPORT_COMPANIES_QUERY)
+    companies = {company['name'] for company in cur.fetchall()}
+
+    return check_import_rows(parsed, errors, users_by_email, companies)
+
+
+def check_import_rows(parsed, errors, users_by_email, companies):
+    valid = []
+    for row_number, row in parsed:
+        priority = (row['priority'] or 'MEDIUM').upper()
+        status = (row['status'] or 'TODO').upper()
+        assignee = users_by_email.get((row['assignee_email'] or '').lower())
+
+        error = None
+        if not row['title']:
+            error = 'title is required'
+        elif len(row['title']) > MAX_TITLE_LENGTH:
+            error = f'title is longer than {MAX_TITLE_LENGTH} characters'
+        elif not row['assignee_email']:
+            error = 'assignee_email is required'
+        elif assignee is None:
+            error = f"Unknown assignee: {row['assignee_email']}"
+        elif priority not in TASK_PRIORITIES:
+            error = f"priority must be one of: {', '.join(TASK_PRIORITIES)}"
+        elif status not in TASK_STATUSES:
+            error = f"status must be one of: {', '.join(TASK_STATUSES)}"
+        elif row['company'] and row['company'] not in companies:
+            error = f"Unknown company: {row['company']}"
+        elif row['due_date']:
+            try:
+                parse_date(row['due_date'], 'due_date')
+            except ValueError as e:
+                error = str(e)
+
+        if error:
+            errors.append({'row': row_number, 'error': error})
+            continue
+        valid.append((
+            row_number, row['title'], row['description'] or '', row['company'],
+            priority, status, assignee, row['due_date'],
+        ))
+
+    return valid, errors
+
+
+def import_rows_csv(valid):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(valid)
+    return buffer.getvalue()
+
+
+def copy_import_rows(cur, user_id, valid):
+    """COPY validated rows into the staging table and insert them into tasks.
+
+    `cur` is from db.get_copy_connection(): psycopg2, or psycopg 3 under
+    gevent workers.
+    """
+    cur.execute(CREATE_STAGING_TABLE)
+    if hasattr(cur, 'copy_expert'):
+        cur.copy_expert(COPY_STAGING_SQL, io.StringIO(import_rows_csv(valid)))
+    else:
+        with cur.copy(COPY_STAGING_SQL) as copy:
+            copy.write(import_rows_csv(valid))
+    cur.execute(INSERT_FROM_STAGING, (user_id,))
+    return cur.fetchall()
@@ -0,0 +1,987 @@
+import base64
+import json
+import math
+import re
+from datetime import date, datetime, timedelta
+
+# --- Task list columns ---
+# Output name -> SQL expression. The assigned_by_* / assigned_to_* columns
+# come from joins that are only added when one of them is requested.
+TASK_COLUMNS = {
+    'id': 't.id',
+    'title': 't.title',
+    'description': 't.description',
+    'company': 't.company',
+    'priority': 't.priority',
+    'status': 't.status',
+    'due_date': 't.due_date',
+    'created_at': 't.created_at',
+    'updated_at': 't.updated_at',
+    'version': 't.version',
+    'archived': 't.archived',
+    'assigned_by_id': 'assigned_by.id',
+    'assigned_by_name': 'assigned_by.name',
+    'assigned_by_avatar': 'assigned_by.avatar_url',
+    'assigned_to_id': 'assigned_to.id',
+    'assigned_to_name': 'assigned_to.name',
+    'assigned_to_avatar': 'assigned_to.avatar_url',
+    'assigned_to_designation': 'assigned_to.designation',
+}
+
+# Needed to build the next page cursor, so always selected
+KEYSET_FIELDS = ('id', 'created_at')
+
+TASK_PRIORITIES = ('HIGH', 'MEDIUM', 'LOW')
+TASK_STATUSES = ('TODO', 'IN_PROGRESS', 'DONE')
+# Column widths of tasks.title and tasks.company
+MAX_TITLE_LENGTH = 500
+MAX_COMPANY_LENGTH = 255
+
+SEARCH_MODES = ('title', 'fulltext')
+SEARCH_CONFIG = 'english'
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def parse_fields(value):
+    """Parse a comma separated `fields=` projection into column names"""
+    if not value:
+        return list(TASK_COLUMNS)
+
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in TASK_COLUMNS:
+            raise ValueError(f'Unknown field: {name}')
+        if name not in fields:
+            fields.append(name)
+
+    for name in KEYSET_FIELDS:
+        if name not in fields:
+            fields.insert(0, name)
+    return fields
+
+
+def parse_limit(value):
+    if value is None or value == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(row, key='created_at'):
+    """Opaque cursor pointing just after `row` in (key, id) DESC order"""
+    value = row[key]
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    payload = json.dumps([value, row['id']])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def parse_cursor_rank(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError('Invalid rank')
+    return float(value)
+
+
+# How the first value of a cursor is parsed, by the column it pages on
+CURSOR_KEYS = {
+    'created_at': datetime.fromisoformat,
+    'due_date': date.fromisoformat,
+    'search_rank': parse_cursor_rank,
+}
+
+
+def decode_cursor(token, key='created_at'):
+    """(value, id) from encode_cursor's token for the given key column.
+
+    The value is parsed here, so a tampered or truncated cursor is a
+    ValueError rather than a failed cast in the query.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, task_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(task_id, bool) or not isinstance(task_id, int):
+            raise ValueError('Invalid id')
+        return CURSOR_KEYS[key](value), task_id
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def task_cursor_key(filters):
+    """The column get_tasks pages on: relevance for full-text searches"""
+    if filters['search'] and filters.get('search_mode') == 'fulltext' and build_tsquery(filters['search']):
+        return 'search_rank'
+    return 'created_at'
+
+
+def task_list_result(tasks, limit=None):
+    """get_tasks body: the plain list, or a page and its next_cursor when
+    `limit` is set (tasks were fetched with limit + 1 rows)
+    """
+    if limit is None:
+        return tasks
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        # Full-text results are ordered by relevance, so page on the rank
+        next_cursor = encode_cursor(tasks[-1], 'search_rank' if 'search_rank' in tasks[-1] else 'created_at')
+    return {'tasks': tasks, 'next_cursor': next_cursor}
+
+
+def parse_bool(value, name):
+    if value is None or value.lower() in ('', '0', 'false', 'no'):
+        return False
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    raise ValueError(f'{name} must be true or false')
+
+
+def parse_task_filters(args):
+    """Pull the get_tasks filter parameters out of a request args mapping"""
+    search_mode = args.get('search_mode', 'title')
+    if search_mode not in SEARCH_MODES:
+        raise ValueError(f"search_mode must be one of: {', '.join(SEARCH_MODES)}")
+    return {
+        'include_archived': parse_bool(args.get('include_archived'), 'include_archived'),
+        'type': args.get('type', 'my'),
+        'status': args.get('status'),
+        'priority': args.get('priority'),
+        'company': args.get('company'),
+        'search': args.get('search', ''),
+        'search_mode': search_mode,
+    }
+
+
+def build_tsquery(search):
+    """Turn free text into a tsquery string matching every word as a prefix.
+
+    Only word characters are kept, so user input can never produce
+    tsquery syntax errors. Returns None when nothing searchable is left.
+    """
+    words = re.findall(r'\w+', search)
+    if not words:
+        return None
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def build_task_filters(user_id, filters):
+    """WHERE clauses and params shared by every task list query"""
+    clauses = []
+    params = []
+
+    # Archived tasks live in their own partitions (see
+    # migrations/0003_partition_tasks.py); this literal lets the planner
+    # skip them entirely
+    if not filters.get('include_archived'):
+        clauses.append('t.archived = FALSE')
+
+    if filters['type'] == 'my':
+        clauses.append('t.assigned_to_user_id = %s')
+        params.append(user_id)
+    elif filters['type'] == 'assigned':
+        # Tasks I assigned to OTHERS (not to myself)
+        clauses.append('t.assigned_by_user_id = %s AND t.assigned_to_user_id != %s')
+        params.append(user_id)
+        params.append(user_id)
+
+    if filters['status']:
+        clauses.append('t.status = %s')
+        params.append(filters['status'])
+
+    if filters['priority']:
+        clauses.append('t.priority = %s')
+        params.append(filters['priority'])
+
+    if filters['company']:
+        clauses.append('t.company = %s')
+        params.append(filters['company'])
+
+    if filters['search'] and filters.get('search_mode') == 'fulltext':
+        tsquery = build_tsquery(filters['search'])
+        if tsquery:
+            clauses.append(f"t.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)")
+            params.append(tsquery)
+    elif filters['search']:
+        clauses.append('t.title ILIKE %s')
+        params.append(f"%{filters['search']}%")
+
+    return clauses, params
+
+
+def build_task_select(fields=None):
+    """SELECT list and the user joins it needs for the given output fields"""
+    fields = fields or list(TASK_COLUMNS)
+    select = ',\n            '.join(f'{TASK_COLUMNS[name]} AS {name}' for name in fields)
+
+    joins = ''
+    if any(name.startswith('assigned_by_') for name in fields):
+        joins += '\n        LEFT JOIN users assigned_by ON t.assigned_by_user_id = assigned_by.id'
+    if any(name.startswith('assigned_to_') for name in fields):
+        joins += '\n        LEFT JOIN users assigned_to ON t.assigned_to_user_id = assigned_to.id'
+    return select, joins
+
+
+def build_task_query(user_id, filters, fields=None, limit=None, cursor=None):
+    """Build the task list query.
+
+    With a `limit` the query fetches one extra row so the caller can tell
+    whether there is a next page; `cursor` continues after a previous page
+    using the (created_at, id) keyset rather than OFFSET. Full-text searches
+    are ordered by relevance instead and page on (search_rank, id).
+    """
+    tsquery = None
+    if filters['search'] and filters.get('search_mode') == 'fulltext':
+        tsquery = build_tsquery(filters['search'])
+    if tsquery:
+        return build_task_search_query(user_id, filters, tsquery, fields, limit, cursor)
+
+    select, joins = build_task_select(fields)
+    clauses, params = build_task_filters(user_id, filters)
+
+    if cursor:
+        clauses.append('(t.created_at, t.id) < (%s::timestamptz, %s)')
+        params.extend(cursor)
+
+    query = f'''
+        SELECT
+            {select}
+        FROM tasks t{joins}
+        WHERE {' AND '.join(clauses) or 'TRUE'}
+        ORDER BY t.created_at DESC, t.id DESC'''
+
+    if limit is not None:
+        query += '\n        LIMIT %s'
+        params.append(limit + 1)
+
+    return query, params
+
+
+def build_task_search_query(user_id, filters, tsquery, fields=None, limit=None, cursor=None):
+    """Relevance-ranked full-text search with highlighted snippets.
+
+    Matching uses the GIN index on tasks.search_vector. Snippets are built
+    with ts_headline only for the rows on the returned page, by joining the
+    page back to tasks. Snippets wrap matches in <mark> but are otherwise
+    raw task text, so clients must escape them before rendering as HTML.
+    """
+    select, joins = build_task_select(fields)
+    clauses, params = build_task_filters(user_id, filters)
+    rank = f"ts_rank_cd(t.search_vector, to_tsquery('{SEARCH_CONFIG}', %s))"
+    params.insert(0, tsquery)
+
+    if cursor:
+        clauses.append(f'({rank}, t.id) < (%s::real, %s)')
+        params.extend([tsquery, *cursor])
+
+    query = f'''
+        WITH page AS (
+            SELECT
+                {select},
+                {rank} AS search_rank
+            FROM tasks t{joins}
+            WHERE {' AND '.join(clauses)}
+            ORDER BY search_rank DESC, t.id DESC'''
+    if limit is not None:
+        query += '\n            LIMIT %s'
+        params.append(limit + 1)
+    query += f'''
+        )
+        SELECT page.*,
+            ts_headline('{SEARCH_CONFIG}', concat_ws(' ', s.title, s.description),
+                        to_tsquery('{SEARCH_CONFIG}', %s),
+                        'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5') AS snippet
+        FROM page
+        JOIN tasks s ON s.id = page.id
+        ORDER BY page.search_rank DESC, page.id DESC'''
+    params.append(tsquery)
+    return query, params
+
+
+# --- Delta sync ---
+# Every insert/update stamps tasks.change_xid with the writing transaction's
+# id, and deletes/reassignments leave rows in task_tombstones (see
+# migrations/0005_task_change_tracking.py). A sync token is a
+# (change_xid, id) position. xids are not assigned in commit order, so a
+# read only returns changes and tombstones below the xmin of its snapshot:
+# every transaction not yet visible has an id >= xmin, so nothing can
+# commit behind a token taken from those rows. Newer changes wait for the
+# next page or sync. The final page hands out xmin itself.
+# Rows can be sent twice; clients apply them as upserts.
+#
+# archive.py prunes old tombstones and records the cutoff in
+# task_tombstone_horizon (see migrations/0013_task_tombstone_retention.py).
+# Tokens also carry the database time they were issued at, so a token
+# issued before that cutoff, whose holder may have missed a pruned
+# tombstone, is refused and the client must sync again from scratch.
+SNAPSHOT_XMIN = 'pg_snapshot_xmin(pg_current_snapshot())'
+
+
+def encode_sync_token(change_xid, task_id, issued_at):
+    payload = f'{change_xid}:{task_id}:{issued_at}'
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_sync_token(token):
+    """(change_xid, id, issued_at); issued_at is None for tokens handed out
+    before they carried it
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        if len(parts) == 2:
+            parts.append(None)
+        change_xid, task_id, issued_at = parts
+        return int(change_xid), int(task_id), int(issued_at) if issued_at is not None else None
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid sync token')
+
+
+def sync_token_expired(since, pruned_before):
+    """True when tombstones the holder of `since` may need have been pruned"""
+    if pruned_before is None:
+        return False
+    issued_at = since[2]
+    return issued_at is None or issued_at < pruned_before
+
+
+def build_task_changes_query(user_id, task_type, since, limit, fields=None):
+    """Tasks visible under `task_type` that changed after the `since` position"""
+    fields = list(fields or TASK_COLUMNS)
+    select, joins = build_task_select(fields)
+    filters = {'type': task_type, 'status': None, 'priority': None, 'company': None, 'search': '', 'search_mode': 'title'}
+    clauses, params = build_task_filters(user_id, filters)
+
+    if since:
+        clauses.append('(t.change_xid, t.id) > (%s::text::xid8, %s)')
+        params.extend(since[:2])
+    clauses.append(f't.change_xid < {SNAPSHOT_XMIN}')
+
+    query = f'''
+        SELECT
+            {select},
+            t.change_xid::text AS change_xid
+        FROM tasks t{joins}
+        WHERE {' AND '.join(clauses) or 'TRUE'}
+        ORDER BY t.change_xid, t.id
+        LIMIT %s'''
+    params.append(limit + 1)
+    return query, params
+
+
+def build_tombstones_query(user_id, task_type, since_xid):
+    """Task ids that left the user's `task_type` view at or after `since_xid`"""
+    if task_type in ('my', 'assigned'):
+        return f'''
+            SELECT DISTINCT task_id AS id, reason
+            FROM task_tombstones
+            WHERE user_id = %s AND change_xid >= %s::text::xid8 AND change_xid < {SNAPSHOT_XMIN}
+        ''', [user_id, since_xid]
+    return f'''
+        SELECT DISTINCT task_id AS id, reason
+        FROM task_tombstones
+        WHERE reason IN ('deleted', 'archived')
+          AND change_xid >= %s::text::xid8 AND change_xid < {SNAPSHOT_XMIN}
+    ''', [since_xid]
+
+
+SYNC_XMIN_QUERY = f'''
+    SELECT {SNAPSHOT_XMIN}::text AS xmin,
+           floor(extract(epoch FROM now()))::bigint AS issued_at
+'''
+
+TOMBSTONE_HORIZON_QUERY = '''
+    SELECT floor(extract(epoch FROM max(pruned_before)))::bigint AS pruned_before
+    FROM task_tombstone_horizon
+'''
+
+SYNC_EXPIRED_ERROR = 'Sync token has expired, sync again without since'
+
+
+# --- Single task writes ---
+# Columns returned after a write; the task's ETag is built from id + version
+TASK_ROW_COLUMNS = (
+    'id, title, description, company, priority, status, assigned_by_user_id, '
+    'assigned_to_user_id, due_date, created_at, updated_at, version, archived'
+)
+
+
+# Fields whose before and after values go into the task_activity log
+ACTIVITY_FIELDS = (
+    'title', 'description', 'company', 'priority', 'status', 'assigned_to_user_id', 'due_date',
+)
+
+
+def activity_snapshot(alias):
+    """jsonb object of a task row's ACTIVITY_FIELDS. Write queries return it
+    for the row as it was and/or is, so the change can be logged without
+    reading the task again (see activity.py).
+    """
+    pairs = ', '.join(f"'{field}', {alias}.{field}" for field in ACTIVITY_FIELDS)
+    return f'jsonb_build_object({pairs})'
+
+
+def task_etag(task):
+    return f"task-{task['id']}-v{task['version']}"
+
+
+def parse_task_etag(etag, task_id):
+    """Version number from one of our task ETags, or None if it is not one"""
+    match = re.fullmatch(rf'task-{task_id}-v(\d+)', etag or '')
+    return int(match.group(1)) if match else None
+
+
+def build_task_update(task_id, user_id, changes, expected_version=None):
+    """One conditional UPDATE covering permissions and the version check.
+
+    Returns no row if the task does not exist, the user may not edit it or
+    the version no longer matches; the caller tells those apart only on
+    that (rare) failure path.
+    """
+    assignments = [f'{field} = %s' for field in changes]
+    assignments += ['updated_at = CURRENT_TIMESTAMP', 'version = version + 1']
+    params = list(changes.values())
+    if 'status' in changes:
+        # Reopening an archived task moves it back to the hot partition
+        assignments.append("archived = archived AND %s = 'DONE'")
+        params.append(changes['status'])
+
+    # The row is locked and snapshotted in the subquery, so `previous` is
+    # exactly the version this statement replaces
+    query = f'''
+        UPDATE tasks t SET {', '.join(assignments)}
+        FROM (
+            SELECT id, {activity_snapshot('tasks')} AS snapshot FROM tasks
+            WHERE id = %s AND (assigned_to_user_id = %s OR assigned_by_user_id = %s)
+            FOR UPDATE
+        ) previous
+        WHERE t.id = previous.id'''
+    params += [task_id, user_id, user_id]
+    if expected_version is not None:
+        query += ' AND t.version = %s'
+        params.append(expected_version)
+    returning = ', '.join(f't.{column}' for column in TASK_ROW_COLUMNS.split(', '))
+    query += f'''
+        RETURNING {returning},
+                  previous.snapshot AS previous, {activity_snapshot('t')} AS current'''
+    return query, params
+
+
+TASK_VISIBLE_QUERY = f'''
+    SELECT {TASK_ROW_COLUMNS} FROM tasks
+    WHERE id = %s AND (assigned_to_user_id = %s OR assigned_by_user_id = %s)
+'''
+
+TASK_INSERT_QUERY = f'''
+    INSERT INTO tasks
+        (title, description, company, priority, status, assigned_by_user_id, assigned_to_user_id, due_date)
+    VALUES (%s, %s, %s, %s, 'TODO', %s, %s, %s)
+    RETURNING id, assigned_to_user_id, assigned_by_user_id, {activity_snapshot('tasks')} AS current
+'''
+
+# Only the user who assigned a task may delete it
+TASK_DELETE_QUERY = f'''
+    DELETE FROM tasks WHERE id = %s AND assigned_by_user_id = %s
+    RETURNING id, assigned_to_user_id, assigned_by_user_id, {activity_snapshot('tasks')} AS previous
+'''
+
+
+# --- Batch writes ---
+# Fields a task update may change, shared by the single and batch routes
+TASK_UPDATE_FIELDS = ('status', 'title', 'description', 'priority', 'company', 'due_date')
+# Batch updates can also reassign, checked against users like batch creates
+BATCH_UPDATE_FIELDS = TASK_UPDATE_FIELDS + ('assigned_to_user_id',)
+
+MAX_BATCH_SIZE = 500
+
+BATCH_USERS_QUERY = 'SELECT id FROM users WHERE id = ANY(%s)'
+
+# Rows are passed as parallel arrays. Ids come from the sequence in
+# ordinality order, so sorting the returned ids lines them up with the input.
+BATCH_INSERT_QUERY = f'''
+    INSERT INTO tasks
+        (title, description, company, priority, status, assigned_by_user_id, assigned_to_user_id, due_date)
+    SELECT title, description, company, priority, 'TODO', %(user_id)s, assigned_to, due_date
+    FROM unnest(%(titles)s::text[], %(descriptions)s::text[], %(companies)s::text[],
+                %(priorities)s::text[], %(assignees)s::int[], %(due_dates)s::date[])
+         WITH ORDINALITY AS v(title, description, company, priority, assigned_to, due_date, ord)
+    ORDER BY ord
+    RETURNING id, assigned_to_user_id, assigned_by_user_id, {activity_snapshot('tasks')} AS current
+'''
+
+# Each element of the jsonb array is {"id": ..., <field>: <value>, ...};
+# fields missing from an element keep their current value. An optional
+# "version" makes that item conditional, like If-Match on the single route.
+# Each row is locked and snapshotted first, as in build_task_update.
+BATCH_UPDATE_QUERY = f'''
+    UPDATE tasks t SET
+        status = CASE WHEN u.data ? 'status' THEN u.data->>'status' ELSE t.status END,
+        title = CASE WHEN u.data ? 'title' THEN u.data->>'title' ELSE t.title END,
+        description = CASE WHEN u.data ? 'description' THEN u.data->>'description' ELSE t.description END,
+        priority = CASE WHEN u.data ? 'priority' THEN u.data->>'priority' ELSE t.priority END,
+        company = CASE WHEN u.data ? 'company' THEN u.data->>'company' ELSE t.company END,
+        due_date = CASE WHEN u.data ? 'due_date' THEN (u.data->>'due_date')::date ELSE t.due_date END,
+        assigned_to_user_id = CASE WHEN u.data ? 'assigned_to_user_id'
+                                   THEN (u.data->>'assigned_to_user_id')::int ELSE t.assigned_to_user_id END,
+        updated_at = CURRENT_TIMESTAMP,
+        version = t.version + 1,
+        archived = t.archived AND (NOT u.data ? 'status' OR u.data->>'status' = 'DONE')
+    FROM jsonb_array_elements(%(updates)s::jsonb) AS u(data)
+         CROSS JOIN LATERAL (
+             SELECT id, {activity_snapshot('p')} AS snapshot FROM tasks p
+             WHERE p.id = (u.data->>'id')::int
+               AND (p.assigned_to_user_id = %(user_id)s OR p.assigned_by_user_id = %(user_id)s)
+             FOR UPDATE
+         ) previous
+    WHERE t.id = previous.id
+      AND (NOT u.data ? 'version' OR t.version = (u.data->>'version')::int)
+    RETURNING t.id, t.assigned_to_user_id, t.assigned_by_user_id,
+              NULLIF((previous.snapshot->>'assigned_to_user_id')::int, t.assigned_to_user_id)
+                  AS previous_assigned_to_user_id,
+              previous.snapshot AS previous, {activity_snapshot('t')} AS current
+'''
+
+# Which of the ids that failed a batch update exist and are editable, i.e.
+# failed on the version check
+BATCH_VISIBLE_IDS_QUERY = '''
+    SELECT id FROM tasks
+    WHERE id = ANY(%(ids)s::int[])
+      AND (assigned_to_user_id = %(user_id)s OR assigned_by_user_id = %(user_id)s)
+'''
+
+BATCH_DELETE_QUERY = f'''
+    DELETE FROM tasks
+    WHERE id = ANY(%(ids)s::int[]) AND assigned_by_user_id = %(user_id)s
+    RETURNING id, assigned_to_user_id, assigned_by_user_id, {activity_snapshot('tasks')} AS previous
+'''
+
+
+
+def get_batch_items(data, key):
+    items = (data or {}).get(key)
+    if not isinstance(items, list) or not items:
+        raise ValueError(f'{key} must be a non-empty list')
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'At most {MAX_BATCH_SIZE} items per batch')
+    return items
+
+
+def as_task_id(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def task_fields_error(fields):
+    """Why the client-supplied task fields present in `fields` would not
+    fit the tasks table, or None. Checked before writing, so one bad item
+    is reported on its own instead of failing the whole statement.
+    """
+    for name in ('title', 'description', 'company'):
+        if fields.get(name) is not None and not isinstance(fields[name], str):
+            return f'{name} must be a string'
+    if 'title' in fields:
+        if not fields['title']:
+            return 'title must not be empty'
+        if len(fields['title']) > MAX_TITLE_LENGTH:
+            return f'title is longer than {MAX_TITLE_LENGTH} characters'
+    if fields.get('company') and len(fields['company']) > MAX_COMPANY_LENGTH:
+        return f'company is longer than {MAX_COMPANY_LENGTH} characters'
+    if 'priority' in fields and fields['priority'] not in TASK_PRIORITIES:
+        return f"priority must be one of: {', '.join(TASK_PRIORITIES)}"
+    if 'status' in fields and fields['status'] not in TASK_STATUSES:
+        return f"status must be one of: {', '.join(TASK_STATUSES)}"
+    if fields.get('due_date'):
+        try:
+            parse_date(fields['due_date'], 'due_date')
+        except ValueError as e:
+            return str(e)
+    return None
+
+
+def parse_batch_creates(items):
+    """Validate batch create items.
+
+    Returns (results, rows): results holds an error for every rejected index
+    and None elsewhere; rows are (index, item, assignee id) to insert.
+    """
+    results = [None] * len(items)
+    rows = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'error': 'Item must be an object'}
+            continue
+        assigned_to_user_id = as_task_id(item.get('assigned_to_user_id'))
+        if not item.get('title') or not assigned_to_user_id:
+            results[index] = {'index': index, 'error': 'Title and assignee are required'}
+            continue
+        # Batch creates always start as TODO, so a status is not checked
+        error = task_fields_error({field: item[field] for field in TASK_UPDATE_FIELDS
+                                   if field in item and field != 'status'})
+        if error:
+            results[index] = {'index': index, 'error': error}
+            continue
+        rows.append((index, item, assigned_to_user_id))
+    return results, rows
+
+
+def drop_unknown_assignees(results, rows, known_users):
+    for index, _, assignee in rows:
+        if assignee not in known_users:
+            results[index] = {'index': index, 'error': 'Assignee not found'}
+    return [row for row in rows if row[2] in known_users]
+
+
+def batch_insert_params(user_id, rows):
+    return {
+        'user_id': user_id,
+        'titles': [item['title'] for _, item, _ in rows],
+        'descriptions': [item.get('description', '') for _, item, _ in rows],
+        'companies': [item.get('company') for _, item, _ in rows],
+        'priorities': [item.get('priority', 'MEDIUM') for _, item, _ in rows],
+        'assignees': [assignee for _, _, assignee in rows],
+        'due_dates': [item.get('due_date') or None for _, item, _ in rows],
+    }
+
+
+def parse_batch_updates(items):
+    """Validate batch update items.
+
+    Returns (results, updates, indexes_by_id): updates are the
+    BATCH_UPDATE_QUERY elements and indexes_by_id maps each of their ids
+    back to its position in the request.
+    """
+    results = [None] * len(items)
+    updates = []
+    indexes_by_id = {}
+    for index, item in enumerate(items):
+        task_id = as_task_id(item.get('id')) if isinstance(item, dict) else None
+        if task_id is None:
+            results[index] = {'index': index, 'error': 'A numeric task id is required'}
+            continue
+        if task_id in indexes_by_id:
+            results[index] = {'index': index, 'id': task_id, 'error': 'Duplicate task id in batch'}
+            continue
+        changes = {field: item[field] for field in BATCH_UPDATE_FIELDS if field in item}
+        if not changes:
+            results[index] = {'index': index, 'id': task_id, 'error': 'No fields to update'}
+            continue
+        if 'due_date' in changes and not changes['due_date']:
+            changes['due_date'] = None
+        error = task_fields_error(changes)
+        if 'assigned_to_user_id' in changes:
+            changes['assigned_to_user_id'] = as_task_id(changes['assigned_to_user_id'])
+            if not changes['assigned_to_user_id']:
+                error = error or 'assigned_to_user_id must be a user id'
+        if error:
+            results[index] = {'index': index, 'id': task_id, 'error': error}
+            continue
+        if 'version' in item:
+            changes['version'] = as_task_id(item['version'])
+            if changes['version'] is None:
+                results[index] = {'index': index, 'id': task_id, 'error': 'version must be an integer'}
+                continue
+        changes['id'] = task_id
+        updates.append(changes)
+        indexes_by_id[task_id] = index
+    return results, updates, indexes_by_id
+
+
+def batch_update_assignees(updates):
+    """Ids of the users a batch update reassigns tasks to"""
+    return list({update['assigned_to_user_id'] for update in updates if 'assigned_to_user_id' in update})
+
+
+def drop_unknown_update_assignees(results, updates, indexes_by_id, known_users):
+    """drop_unknown_assignees() for batch updates: reassignments to a user
+    who does not exist are reported and left out of the statement
+    """
+    kept = []
+    for update in updates:
+        if 'assigned_to_user_id' in update and update['assigned_to_user_id'] not in known_users:
+            index = indexes_by_id.pop(update['id'])
+            results[index] = {'index': index, 'id': update['id'], 'error': 'Assignee not found'}
+        else:
+            kept.append(update)
+    return kept
+
+
+def batch_update_results(results, indexes_by_id, updated_ids, conflict_ids):
+    for task_id, index in indexes_by_id.items():
+        if task_id in updated_ids:
+            results[index] = {'index': index, 'id': task_id, 'status': 'updated'}
+        elif task_id in conflict_ids:
+            results[index] = {'index': index, 'id': task_id, 'error': 'Task was modified by someone else'}
+        else:
+            results[index] = {'index': index, 'id': task_id, 'error': 'Task not found or permission denied'}
+    return results
+
+
+def batch_delete_results(task_ids, deleted_ids):
+    results = []
+    for index, task_id in enumerate(task_ids):
+        if task_id is None:
+            results.append({'index': index, 'error': 'A numeric task id is required'})
+        elif task_id in deleted_ids:
+            results.append({'index': index, 'id': task_id, 'status': 'deleted'})
+        else:
+            results.append({'index': index, 'id': task_id, 'error': 'Task not found or permission denied'})
+    return results
+
+
+# --- Task activity ---
+def build_task_activity_query(task_id, user_id, limit, cursor=None):
+    """A page of one task's activity log, newest first.
+
+    Pages on (created_at, id) like the task list, fetching one extra row to
+    tell whether there is a next page. No rows come back when the task does
+    not exist or the user may not see it; the caller tells that apart from
+    an empty log only when the page is empty.
+    """
+    clauses = ['a.task_id = %s']
+    params = [task_id]
+    if cursor:
+        clauses.append('(a.created_at, a.id) < (%s::timestamptz, %s)')
+        params.extend(cursor)
+
+    query = f'''
+        SELECT a.id, a.action, a.changes, a.created_at, a.user_id, u.name AS user_name
+        FROM task_activity a
+        LEFT JOIN users u ON u.id = a.user_id
+        WHERE {' AND '.join(clauses)}
+          AND EXISTS (
+              SELECT 1 FROM tasks
+              WHERE id = %s AND (assigned_to_user_id = %s OR assigned_by_user_id = %s)
+          )
+        ORDER BY a.created_at DESC, a.id DESC
+        LIMIT %s'''
+    params += [task_id, user_id, user_id, limit + 1]
+    return query, params
+
+
+def task_activity_result(activity, limit):
+    next_cursor = None
+    if len(activity) > limit:
+        activity = activity[:limit]
+        next_cursor = encode_cursor(activity[-1])
+    return {'activity': activity, 'next_cursor': next_cursor}
+
+
+# --- Due dates ---
+# The calendar and overdue lists only cover open (not DONE) tasks, so they
+# are read from the partial indexes on due date (see
+# migrations/0012_task_due_date_indexes.py): their cost grows with the
+# open tasks in the view, not with every task ever completed.
+DUE_TASK_TYPES = ('my', 'assigned')
+DEFAULT_CALENDAR_DAYS = 7
+MAX_CALENDAR_DAYS = 92
+
+
+def parse_due_task_type(args):
+    task_type = args.get('type', 'my')
+    if task_type not in DUE_TASK_TYPES:
+        raise ValueError(f"type must be one of: {', '.join(DUE_TASK_TYPES)}")
+    return task_type
+
+
+def calendar_range(args, today):
+    """Resolve `from`/`to` calendar params, defaulting to the current week"""
+    start = args.get('from')
+    end = args.get('to')
+    start = parse_date(start, 'from') if start else today - timedelta(days=today.weekday())
+    end = parse_date(end, 'to') if end else start + timedelta(days=DEFAULT_CALENDAR_DAYS - 1)
+    if start > end:
+        raise ValueError('from must not be after to')
+    if (end - start).days >= MAX_CALENDAR_DAYS:
+        raise ValueError(f'The calendar can span at most {MAX_CALENDAR_DAYS} days')
+    return start, end
+
+
+def build_due_task_query(user_id, task_type, due_clause, due_params, fields=None, limit=None, cursor=None):
+    """Open tasks in the user's view matching `due_clause`, soonest due first.
+
+    Pages on (due_date, id) like the task list pages on (created_at, id).
+    due_date is always selected, since results are grouped or paged on it.
+    """
+    fields = list(fields or TASK_COLUMNS)
+    if 'due_date' not in fields:
+        fields.append('due_date')
+    select, joins = build_task_select(fields)
+    clauses, params = build_task_filters(user_id, parse_task_filters({'type': task_type}))
+
+    # Must match the index predicate for the planner to use it
+    clauses.append("t.status <> 'DONE'")
+    clauses.append(due_clause)
+    params.extend(due_params)
+    if cursor:
+        clauses.append('(t.due_date, t.id) > (%s::date, %s)')
+        params.extend(cursor)
+
+    query = f'''
+        SELECT
+            {select}
+        FROM tasks t{joins}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY t.due_date, t.id'''
+
+    if limit is not None:
+        query += '\n        LIMIT %s'
+        params.append(limit + 1)
+
+    return query, params
+
+
+def build_calendar_query(user_id, task_type, start, end, fields=None):
+    return build_due_task_query(user_id, task_type, 't.due_date BETWEEN %s AND %s', [start, end], fields)
+
+
+def build_overdue_query(user_id, task_type, today, fields=None, limit=None, cursor=None):
+    return build_due_task_query(user_id, task_type, 't.due_date < %s', [today], fields, limit, cursor)
+
+
+def calendar_result(tasks, start, end):
+    """get_task_calendar body: the days in [from, to] that have tasks due,
+    in date order, each with its tasks
+    """
+    days = {}
+    for task in tasks:
+        days.setdefault(task['due_date'].isoformat(), []).append(task)
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': [{'date': day, 'tasks': day_tasks} for day, day_tasks in days.items()],
+    }
+
+
+def overdue_result(tasks, limit=None):
+    """get_overdue_tasks body, shaped like get_tasks: the plain list, or a
+    page and its next_cursor when `limit` is set
+    """
+    if limit is None:
+        return tasks
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1], 'due_date')
+    return {'tasks': tasks, 'next_cursor': next_cursor}
+
+
+# --- Reports ---
+# One read over the task_daily_rollup table maintained by triggers (see
+# migrations/0004_task_daily_rollup.py). Period counters cover [from, to]
+# in UTC days; the status and priority breakdowns are the user's current
+# workload, as before.
+TASK_REPORT_QUERY = '''
+    WITH period AS (
+        SELECT
+            COALESCE(SUM(assigned_to_count) FILTER (WHERE user_id = %(user_id)s), 0) AS assigned_to_me,
+            COALESCE(SUM(assigned_by_count) FILTER (WHERE user_id = %(user_id)s), 0) AS i_assigned,
+            COALESCE(SUM(completed_count) FILTER (WHERE user_id = %(user_id)s), 0) AS i_completed,
+            COALESCE(SUM(assigned_to_count), 0) AS total_created,
+            COALESCE(SUM(completed_count), 0) AS total_completed
+        FROM task_daily_rollup
+        WHERE day BETWEEN %(from)s AND %(to)s
+    ), workload AS (
+        SELECT status, priority, SUM(assigned_to_count) AS count
+        FROM task_daily_rollup
+        WHERE user_id = %(user_id)s
+        GROUP BY status, priority
+        HAVING SUM(assigned_to_count) > 0
+    )
+    SELECT
+        period.*,
+        (SELECT COALESCE(json_object_agg(status, count), '{}')
+         FROM (SELECT status, SUM(count) AS count FROM workload GROUP BY status) s) AS tasks_by_status,
+        (SELECT COALESCE(json_object_agg(priority, count), '{}')
+         FROM (SELECT priority, SUM(count) AS count FROM workload GROUP BY priority) p) AS tasks_by_priority
+    FROM period
+'''
+
+
+def parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def report_range(args, today):
+    """Resolve `from`/`to` report params, defaulting to the current week"""
+    start = args.get('from')
+    end = args.get('to')
+    start = parse_date(start, 'from') if start else today - timedelta(days=today.weekday())
+    end = parse_date(end, 'to') if end else today
+    if start > end:
+        raise ValueError('from must not be after to')
+    return start, end
+
+
+def weekly_report_result(report, start, end):
+    """get_weekly_report body for a TASK_REPORT_QUERY row"""
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'tasks_assigned_to_me_this_week': report['assigned_to_me'],
+        'tasks_i_assigned_this_week': report['i_assigned'],
+        'tasks_i_completed_this_week': report['i_completed'],
+        'total_tasks_created_this_week': report['total_created'],
+        'total_tasks_completed_this_week': report['total_completed'],
+        'tasks_by_status': report['tasks_by_status'],
+        'tasks_by_priority': report['tasks_by_priority']
+    }
+
+
+# --- Dashboard bootstrap ---
+# The sections /api/bootstrap can return, each matching the body of the
+# route the dashboard used to call for it
+BOOTSTRAP_SECTIONS = ('me', 'users', 'companies', 'my_tasks', 'assigned_tasks', 'weekly_report')
+BOOTSTRAP_TASK_TYPES = {'my_tasks': 'my', 'assigned_tasks': 'assigned'}
+
+
+def parse_sections(value):
+    """Comma separated `sections` param; every section when absent"""
+    if not value:
+        return BOOTSTRAP_SECTIONS
+    sections = [section.strip() for section in value.split(',') if section.strip()]
+    unknown = [section for section in sections if section not in BOOTSTRAP_SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown sections: {', '.join(unknown)}. "
+                         f"Choose from: {', '.join(BOOTSTRAP_SECTIONS)}")
+    return tuple(dict.fromkeys(sections))
+
+
+def build_bootstrap_queries(user_id, sections, fields, limit, start, end):
+    """(section, query, params) for the sections read from the database.
+
+    The statements are independent, so they can be sent together on one
+    connection.
+    """
+    queries = []
+    for section, task_type in BOOTSTRAP_TASK_TYPES.items():
+        if section in sections:
+            filters = parse_task_filters({'type': task_type})
+            queries.append((section, *build_task_query(user_id, filters, fields, limit)))
+    if 'weekly_report' in sections:
+        queries.append(('weekly_report', TASK_REPORT_QUERY, {'user_id': user_id, 'from': start, 'to': end}))
+    return queries
+
+
+def bootstrap_section_result(section, rows, limit, start, end):
+    if section == 'weekly_report':
+        return weekly_report_result(rows[0], start, end)
+    return task_list_result(rows, limit)
@@ -0,0 +1,109 @@
+"""Shared fixtures.
+
+Tests that touch Postgres run against DATABASE_URL, which must point at a
+database migrated with migrate.py, and are skipped when it is not set.
+Rows they create belong to users named test-*, removed again afterwards.
+"""
+import os
+import uuid
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'test')
+os.environ.setdefault('RATE_LIMITS_ENABLED', 'false')
+
+
+@pytest.fixture
+def db_url():
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        pytest.skip('DATABASE_URL is not set')
+    return url
+
+
+@pytest.fixture
+def connect(db_url):
+    """Open extra connections; each is rolled back and closed afterwards"""
+    connections = []
+
+    def _connect(autocommit=False):
+        conn = psycopg2.connect(db_url, cursor_factory=RealDictCursor)
+        conn.autocommit = autocommit
+        connections.append(conn)
+        return conn
+
+    def close_all():
+        while connections:
+            conn = connections.pop()
+            if not conn.closed:
+                conn.rollback()
+                conn.close()
+
+    _connect.close_all = close_all
+    yield _connect
+    close_all()
+
+
+@pytest.fixture
+def make_user(connect):
+    """Create users (as session dicts); they and their tasks go afterwards"""
+    conn = connect(autocommit=True)
+    ids = []
+
+    def _make_user():
+        key = f'test-{uuid.uuid4().hex[:12]}'
+        with conn.cursor() as cur:
+            cur.execute('''
+                INSERT INTO users (google_id, email, name) VALUES (%s, %s, %s)
+                RETURNING id, name, email, avatar_url, designation, is_profile_complete
+            ''', (key, f'{key}@example.com', key))
+            user = cur.fetchone()
+        ids.append(user['id'])
+        return dict(user)
+
+    yield _make_user
+    # Activity from the test's requests is written in the background; let
+    # it land before its users go, and start a fresh writer for the next test
+    import activity
+    activity.flush_activity()
+    activity._writer = None
+    # A failed test can leave a transaction holding locks on its tasks
+    connect.close_all()
+    conn = connect(autocommit=True)
+    with conn.cursor() as cur:
+        cur.execute('DELETE FROM tasks WHERE assigned_by_user_id = ANY(%(ids)s) OR assigned_to_user_id = ANY(%(ids)s)',
+                    {'ids': ids})
+        cur.execute('DELETE FROM users WHERE id = ANY(%s)', (ids,))
+
+
+@pytest.fixture
+def make_task(connect):
+    conn = connect(autocommit=True)
+
+    def _make_task(assigned_by, assigned_to, title='test task'):
+        with conn.cursor() as cur:
+            cur.execute('''
+                INSERT INTO tasks (title, assigned_by_user_id, assigned_to_user_id)
+                VALUES (%s, %s, %s) RETURNING id, version
+            ''', (title, assigned_by['id'], assigned_to['id']))
+            return dict(cur.fetchone())
+
+    return _make_task
+
+
+@pytest.fixture
+def flask_client(db_url):
+    """Flask test client; call .login(user) to act as a user"""
+    from app import app
+    from bench.session import session_cookie
+
+    client = app.test_client()
+
+    def login(user):
+        name, value = session_cookie(app, user)
+        client.set_cookie(name, value, domain='localhost')
+
+    client.login = login
+    return client
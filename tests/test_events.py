@@ -0,0 +1,64 @@
+import json
+import select
+import time
+
+from events import TASK_EVENTS_CHANNEL, Subscription
+
+
+def test_subscription_wants_previous_assignee():
+    subscription = Subscription(broker=None, user_id=3)
+    assert subscription.wants({'assigned_to_user_id': 2, 'assigned_by_user_id': 1,
+                               'previous_assigned_to_user_id': 3})
+    assert not subscription.wants({'assigned_to_user_id': 2, 'assigned_by_user_id': 1,
+                                   'previous_assigned_to_user_id': None})
+
+
+def received_events(conn, timeout=2.0):
+    events = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if select.select([conn], [], [], 0.1)[0]:
+            conn.poll()
+            while conn.notifies:
+                events.append(json.loads(conn.notifies.pop(0).payload))
+            if events:
+                return events
+    return events
+
+
+def test_batch_reassign_notifies_previous_assignee(connect, make_user, make_task, flask_client):
+    assigner, old_assignee, new_assignee = make_user(), make_user(), make_user()
+    task = make_task(assigner, old_assignee)
+    listener = connect(autocommit=True)
+    listener.cursor().execute(f'LISTEN {TASK_EVENTS_CHANNEL}')
+
+    flask_client.login(assigner)
+    response = flask_client.patch('/api/tasks/batch', base_url='https://localhost', json={
+        'updates': [{'id': task['id'], 'assigned_to_user_id': new_assignee['id']}],
+    })
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['status'] == 'updated'
+
+    events = [event for event in received_events(listener) if event['task_id'] == task['id']]
+    assert [event['type'] for event in events] == ['task.updated']
+    event = events[0]
+    assert event['assigned_to_user_id'] == new_assignee['id']
+    assert event['previous_assigned_to_user_id'] == old_assignee['id']
+    assert Subscription(None, old_assignee['id']).wants(event)
+    assert Subscription(None, new_assignee['id']).wants(event)
+
+
+def test_batch_update_without_reassign_has_no_previous_assignee(connect, make_user, make_task, flask_client):
+    assigner, assignee = make_user(), make_user()
+    task = make_task(assigner, assignee)
+    listener = connect(autocommit=True)
+    listener.cursor().execute(f'LISTEN {TASK_EVENTS_CHANNEL}')
+
+    flask_client.login(assigner)
+    response = flask_client.patch('/api/tasks/batch', base_url='https://localhost', json={
+        'updates': [{'id': task['id'], 'status': 'IN_PROGRESS', 'assigned_to_user_id': assignee['id']}],
+    })
+    assert response.status_code == 200
+
+    events = [event for event in received_events(listener) if event['task_id'] == task['id']]
+    assert events and events[0]['previous_assigned_to_user_id'] is None
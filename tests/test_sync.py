@@ -0,0 +1,70 @@
+def get_changes(client, since=None, limit=100):
+    query = f'/api/tasks/changes?type=my&limit={limit}'
+    if since:
+        query += f'&since={since}'
+    response = client.get(query, base_url='https://localhost')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def sync(client, since, changed, removed, limit=100):
+    """Page from `since` until has_more is false; returns the final token"""
+    while True:
+        page = get_changes(client, since, limit)
+        changed.update(task['id'] for task in page['changes'])
+        removed.update(row['id'] for row in page['removed'])
+        since = page['next_token']
+        if not page['has_more']:
+            return since
+
+
+def test_out_of_order_commit_across_page_boundary(connect, make_user, make_task, flask_client):
+    assigner, assignee, other = make_user(), make_user(), make_user()
+    reassigned, first, second = (make_task(assigner, assignee) for _ in range(3))
+    flask_client.login(assignee)
+    token = sync(flask_client, None, set(), set())
+
+    # The slow transaction takes its xid first but commits last
+    slow = connect()
+    with slow.cursor() as cur:
+        cur.execute('UPDATE tasks SET assigned_to_user_id = %s WHERE id = %s', (other['id'], reassigned['id']))
+    fast = connect(autocommit=True)
+    with fast.cursor() as cur:
+        cur.execute("UPDATE tasks SET title = 'changed' WHERE id = ANY(%s)", ([first['id'], second['id']],))
+
+    changed, removed = set(), set()
+    page = get_changes(flask_client, token, limit=1)
+    changed.update(task['id'] for task in page['changes'])
+    removed.update(row['id'] for row in page['removed'])
+    slow.commit()
+
+    token = page['next_token']
+    if page['has_more']:
+        token = sync(flask_client, token, changed, removed, limit=1)
+    sync(flask_client, token, changed, removed, limit=1)
+
+    assert {first['id'], second['id']} <= changed
+    assert reassigned['id'] in removed
+
+
+def test_page_tokens_do_not_pass_running_transactions(connect, make_user, make_task, flask_client):
+    assigner, assignee = make_user(), make_user()
+    tasks = [make_task(assigner, assignee) for _ in range(3)]
+    flask_client.login(assignee)
+    token = sync(flask_client, None, set(), set())
+
+    slow = connect()
+    with slow.cursor() as cur:
+        cur.execute("UPDATE tasks SET title = 'slow' WHERE id = %s", (tasks[0]['id'],))
+    fast = connect(autocommit=True)
+    with fast.cursor() as cur:
+        cur.execute("UPDATE tasks SET title = 'fast' WHERE id = %s", (tasks[1]['id'],))
+
+    # Changes made after the slow transaction started wait until it ends
+    page = get_changes(flask_client, token, limit=1)
+    assert page['changes'] == [] and not page['has_more']
+
+    slow.commit()
+    changed = set()
+    sync(flask_client, page['next_token'], changed, set(), limit=1)
+    assert {tasks[0]['id'], tasks[1]['id']} <= changed